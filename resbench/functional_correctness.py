@@ -2,12 +2,23 @@ import json
 import os
 import re
 import subprocess
+import tempfile
+import time
+from contextlib import nullcontext
 import math
+import sys
 from collections import defaultdict
-from tqdm import tqdm
 
-# 设置工作目录为当前文件所在目录
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+# 仓库根目录，用于导入tools/中的共用模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from tools.procstats import print_stage_summary, run_measured
+from tools.verilog_header import precheck_interface
+
+# 数据集名称（即脚本所在目录名）
+DATASET = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
 
 # ================== 配置文件路径 ==================
 SOLUTIONS_FILE = "pass1_gpt-3.5-turbo.json"  # 生成的解决方案文件
@@ -15,6 +26,17 @@ PROBLEMS_FILE = "problems_resbench.jsonl"                     # 问题数据集
 TEMP_VERILOG_FILE = "temp.v"                                 # 临时Verilog设计文件
 TEMP_TESTBENCH_FILE = "testbench.v"                          # 临时测试台文件
 VVP_OUTPUT_FILE = "test.vvp"                                 # 编译输出文件
+SHARD = None                                                 # 多机分片 "i/N"，结果写入 .shard{i}of{N} 文件
+SHARD_WEIGHTS = None                                         # 分片代价：None按哈希，"size"按记录大小，或JSON文件
+RESULTS_DB = None                                            # 可选的SQLite结果库路径，测试判定同时写入数据库
+METRICS = None                                               # 可选的运行指标导出，如 {"textfile": "eval.prom"} 或 {"http_port": 9109}
+COORDINATOR = None                                           # 可选的调度协调器套接字（tools/coordinator.py），多个任务公平共享仿真槽位
+JOB_WEIGHT = 1.0                                             # 向协调器注册的权重
+JOB_PRIORITY = 0                                             # 向协调器注册的优先级，越大越先分配
+INCREMENTAL = False                                          # 增量模式：只重新测试测试台、代码或工具链指纹变化的解决方案
+STAMP_FINGERPRINTS = False                                   # 为没有指纹的已有判定补记当前指纹（视为仍然有效），之后可增量测试
+INTERFACE_PRECHECK = False                                   # 编译前比对模块名和端口与module_header，必然编译失败的接口错误直接判定（默认关闭）
+RESOURCE_USAGE = None                                        # 可选的Yosys资源统计（tools/resource_usage.py），如 {"target": "xilinx", "workers": 8}
 
 def extract_testbench_module_name(testbench_content):
     """
@@ -71,15 +93,10 @@ def clean_up_simulation():
     清理仿真环境
     
     功能:
-        1. 终止所有挂起的仿真进程（iverilog和vvp）
-        2. 删除所有临时文件
+        删除工作目录中的临时文件
+        不终止iverilog / vvp进程：同一台机器上可能有其他测试任务或测试服务在运行，
+        本进程的子进程在超时时已由 run_measured 杀死
     """
-    print("正在终止所有挂起的仿真进程...")
-    
-    # 终止iverilog和vvp进程（Linux/Unix系统）
-    subprocess.run("pkill iverilog", shell=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    subprocess.run("pkill vvp", shell=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    
     # 清理临时文件
     temp_files = [TEMP_VERILOG_FILE, TEMP_TESTBENCH_FILE, VVP_OUTPUT_FILE]
     for file in temp_files:
@@ -87,6 +104,231 @@ def clean_up_simulation():
             os.remove(file)
             print(f"已删除临时文件: {file}")
 
+def check_solution(verilog_code, testbench_code, work_dir=".", timeout=5, stats=None, module_header=None):
+    """
+    对单个解决方案执行编译和仿真测试
+    
+    参数:
+        verilog_code (str): 待测试的Verilog代码
+        testbench_code (str): 对应的测试台代码
+        work_dir (str): 临时文件所在目录，并发测试时每个任务使用独立目录
+        timeout (int): 仿真超时时间（秒）
+        stats (dict): 可选，写入各阶段耗时 stats["timing"]（precheck/write/compile/simulate/parse，秒）、
+                      子进程资源 stats["resources"]（compile/simulate 的CPU时间与峰值RSS）
+                      和接口诊断 stats["interface"]（与module_header不一致的端口）
+        module_header (str): 可选，题目的模块声明，提供时先做接口预检查
+        
+    返回:
+        tuple: (测试结果字符串, 是否编译成功)
+               测试结果为"true"表示功能正确，否则为错误信息（与解决方案文件中的pass字段一致）
+    """
+    stats = {} if stats is None else stats
+    timing = stats.setdefault("timing", {})
+    resources = stats.setdefault("resources", {})
+
+    if not verilog_code:
+        return "错误: 解决方案为空", False
+
+    # ================== 接口预检查 ==================
+    # 缺少测试台实例化的模块或按名称连接的端口时必然编译失败，不再调用iverilog
+    if INTERFACE_PRECHECK and module_header:
+        stage_start = time.perf_counter()
+        interface = precheck_interface(verilog_code, module_header, testbench_code)
+        timing["precheck"] = time.perf_counter() - stage_start
+        if interface["issues"]:
+            stats["interface"] = interface["issues"]
+        if interface["reason"]:
+            return f"接口检查失败: {interface['reason']}", False
+
+    # ================== 准备测试文件 ==================
+    stage_start = time.perf_counter()
+    # 写入Verilog设计文件
+    try:
+        with open(os.path.join(work_dir, TEMP_VERILOG_FILE), "w", encoding="utf-8") as f:
+            f.write(verilog_code)
+    except IOError as e:
+        return f"文件写入错误: {str(e)}", False
+
+    # 写入测试台文件
+    try:
+        with open(os.path.join(work_dir, TEMP_TESTBENCH_FILE), "w", encoding="utf-8") as f:
+            f.write(testbench_code)
+    except IOError as e:
+        return f"测试台文件写入错误: {str(e)}", False
+    timing["write"] = time.perf_counter() - stage_start
+
+    # ================== 提取测试台模块名 ==================
+    # 动态提取测试台的顶层模块名
+    tb_module = extract_testbench_module_name(testbench_code)
+    if not tb_module:
+        return "错误: 无法从测试台中提取模块名", False
+
+    # ================== 编译阶段 ==================
+    # 构建iverilog编译命令
+    compile_cmd = [
+        "iverilog",                    # Icarus Verilog编译器
+        "-Wall",                       # 显示所有警告
+        "-Winfloop",                   # 检测无限循环
+        "-Wno-timescale",             # 忽略时间尺度警告
+        "-g2012",                     # 使用Verilog-2012标准
+        "-s", tb_module,              # 指定顶层模块（动态提取的）
+        "-o", VVP_OUTPUT_FILE,        # 指定输出可执行文件
+        TEMP_VERILOG_FILE,            # 设计文件
+        TEMP_TESTBENCH_FILE           # 测试台文件
+    ]
+
+    # 执行编译
+    resources["compile"] = {}
+    compile_process = run_measured(compile_cmd, cwd=work_dir, usage=resources["compile"])
+    timing["compile"] = resources["compile"]["wall"]
+
+    # 检查编译是否成功
+    if compile_process.returncode != 0:
+        # 编译失败 - 语法错误
+        compile_error = compile_process.stderr.strip()
+        return f"编译失败: {compile_error}", False
+
+    # ================== 仿真阶段 ==================
+    # 构建vvp仿真命令
+    sim_cmd = ["vvp", "-n", VVP_OUTPUT_FILE]  # -n: 非交互模式
+
+    try:
+        # 执行仿真（带超时）
+        resources["simulate"] = {}
+        sim_process = run_measured(sim_cmd, cwd=work_dir, timeout=timeout, usage=resources["simulate"])
+        output_log = sim_process.stdout
+        error_log = sim_process.stderr
+    except subprocess.TimeoutExpired:
+        # 仿真超时
+        output_log = "超时"
+        error_log = "仿真超时"
+    except Exception as e:
+        # 其他异常
+        output_log = "异常"
+        error_log = f"仿真异常: {str(e)}"
+    timing["simulate"] = resources.get("simulate", {}).get("wall", 0.0)
+
+    # ================== 结果分析 ==================
+    stage_start = time.perf_counter()
+    # 检查输出中是否包含成功标识
+    # ResBench数据集使用"All tests passed"或"Your Design Passed"作为成功标识
+    test_passed = ("All tests passed" in output_log or 
+                  "Your Design Passed" in output_log)
+
+    if test_passed:
+        # 测试通过 - 功能正确
+        status = "true"
+    else:
+        # 测试失败，记录详细错误信息
+        if error_log and error_log.strip() and "超时" not in error_log:
+            status = f"仿真错误: {error_log.strip()}"
+        elif "超时" in output_log or "超时" in error_log:
+            status = "测试失败: 仿真超时"
+        else:
+            status = "测试失败: 未通过测试用例"
+
+    timing["parse"] = time.perf_counter() - stage_start
+
+    # 编译成功 - 语法正确
+    return status, True
+
+def check_solution_isolated(verilog_code, testbench_code, timeout=5, stats=None, module_header=None):
+    """
+    在独立的临时目录中执行check_solution，测试结束后删除该目录
+    
+    说明:
+        供生成脚本等需要并发测试的调用方使用，互不覆盖临时文件
+    """
+    with tempfile.TemporaryDirectory(prefix="verilog_eval_") as work_dir:
+        return check_solution(verilog_code, testbench_code, work_dir=work_dir, timeout=timeout, stats=stats,
+                              module_header=module_header)
+
+def is_compiled_status(status):
+    """根据pass字段判断该解决方案是否编译成功（通过测试或进入仿真阶段）"""
+    return status == "true" or status.startswith(("测试失败", "仿真错误"))
+
+def collect_module_results(solutions_data):
+    """
+    从已测试的解决方案数据中统计每个模块的样本数、编译成功数和通过数
+    
+    说明:
+        只读取pass字段，不重新编译仿真，用于重新计算已有结果的指标
+    """
+    module_results = defaultdict(lambda: {"total": 0, "compiled": 0, "passed": 0})
+    for module_entry in solutions_data:
+        module_name = module_entry.get("module_name")
+        if not module_name:
+            continue
+        for solution_entry in module_entry.get("solutions", []):
+            status = solution_entry.get("pass", "")
+            module_results[module_name]["total"] += 1
+            if is_compiled_status(status):
+                module_results[module_name]["compiled"] += 1
+            if status == "true":
+                module_results[module_name]["passed"] += 1
+    return module_results
+
+def print_metrics(module_results, ks=None):
+    """
+    计算并输出syntax/functional pass@k等统计结果
+    
+    参数:
+        module_results (dict): 模块名 -> {"total", "compiled", "passed"}
+        ks (list): 需要计算的k值，默认取1、5、10、20、50、100中不超过最大样本数的值
+        
+    说明:
+        每个模块按自己的样本数n计算pass@k；n < k 的模块不计入该k的平均值。
+        平均值后的区间为对模块bootstrap重采样得到的95%置信区间。
+    """
+    import numpy as np
+    from tools.passk import summarize
+
+    names = sorted(name for name, result in module_results.items() if result["total"] > 0)
+    if not names:
+        print("错误: 没有找到任何解决方案，无法计算pass@k指标")
+        return
+
+    n = np.array([module_results[name]["total"] for name in names])
+    c_syntax = np.array([module_results[name]["compiled"] for name in names])
+    c_func = np.array([module_results[name]["passed"] for name in names])
+
+    # 各模块明细：k取该模块自己的样本数n（即n个样本中至少一个通过）
+    syntax_pass_at_n = np.where(c_syntax > 0, 1.0, 0.0)
+    functional_pass_at_n = np.where(c_func > 0, 1.0, 0.0)
+    single_n = len(set(n.tolist())) == 1
+    print(f"\n各模块详细结果 (k={n[0] if single_n else '各模块样本数n'}):")
+    print("-" * 90)
+    print(f"{'模块名':<20} {'编译/总数':<12} {'通过/编译':<12} {'语法pass@k':<12} {'功能pass@k':<12}")
+    print("-" * 90)
+    for i, module_name in enumerate(names):
+        print(f"{module_name:<20} {c_syntax[i]}/{n[i]:<11} {c_func[i]}/{c_syntax[i]:<11} "
+              f"{syntax_pass_at_n[i]:<12.4f} {functional_pass_at_n[i]:<12.4f}")
+    print("-" * 90)
+
+    # 平均指标：所有k值一次计算
+    syntax_summary = summarize(n, c_syntax, ks)
+    functional_summary = summarize(n, c_func, ks)
+    for label, summary in (("语法", syntax_summary), ("功能", functional_summary)):
+        for k, stats in summary.items():
+            print(f"平均{label}pass@{k} (共{stats['modules']}个模块): {stats['mean']:.4f} "
+                  f"[95% CI {stats['low']:.4f}, {stats['high']:.4f}]")
+    if not single_n:
+        print(f"注意: 各模块样本数不同（{n.min()}~{n.max()}），n < k 的模块不计入pass@k平均值")
+
+    # 额外的统计信息
+    total_solutions = int(n.sum())
+    total_compiled = int(c_syntax.sum())
+    total_passed = int(c_func.sum())
+
+    syntax_success_rate = total_compiled / total_solutions if total_solutions > 0 else 0
+    functional_success_rate = total_passed / total_solutions if total_solutions > 0 else 0
+    
+    print(f"\n总体统计:")
+    print(f"  语法正确率: {total_compiled}/{total_solutions} = {syntax_success_rate:.4f}")
+    print(f"  整体功能正确率: {total_passed}/{total_solutions} = {functional_success_rate:.4f}")
+    
+    print("="*60)
+
 def run_functional_correctness():
     """
     运行功能正确性测试
@@ -103,6 +345,8 @@ def run_functional_correctness():
         - 支持ResBench数据集格式
         - 新增syntax pass@1统计（编译成功率）
     """
+    from tqdm import tqdm
+
     print("开始加载数据文件...")
     
     # ================== 加载数据文件 ==================
@@ -119,30 +363,50 @@ def run_functional_correctness():
         print(f"错误: 解决方案文件 {SOLUTIONS_FILE} 格式错误")
         return
 
-    # 加载问题数据JSONL文件
-    problems_data = []
+    # 通过偏移索引加载问题数据，只解码解决方案文件中出现的模块的测试台
+    from tools.problem_index import ProblemIndex
+    from tools.fingerprint import is_current, make_fingerprint, testbench_fingerprint, toolchain_fingerprint
+    from tools.sharding import load_weights, parse_shard, select_shard, shard_path
+
+    # 分片时只测试本分片的模块，结果另存，不覆盖完整的解决方案文件
+    output_file = SOLUTIONS_FILE
+    shard = parse_shard(SHARD)
+    if shard is not None:
+        weights = load_weights(SHARD_WEIGHTS, PROBLEMS_FILE)
+        selected = set(select_shard([entry.get("module_name") for entry in solutions_data], shard, weights))
+        solutions_data = [entry for entry in solutions_data if entry.get("module_name") in selected]
+        output_file = shard_path(SOLUTIONS_FILE, shard)
+        print(f"分片 {shard[0]}/{shard[1]}: {len(solutions_data)} 个模块，结果保存到 {output_file}")
+
+    # 可选：判定同时写入SQLite结果库
+    results_db = run_id = None
+    if RESULTS_DB:
+        from tools.results_db import ResultsDB, model_from_path
+
+        results_db = ResultsDB(RESULTS_DB)
+        run_id = results_db.start_run(DATASET, model_from_path(output_file), output_file)
+
     try:
-        with open(PROBLEMS_FILE, "r", encoding="utf-8") as file:
-            for line_num, line in enumerate(file, 1):
-                try:
-                    problems_data.append(json.loads(line))
-                except json.JSONDecodeError:
-                    print(f"警告: 第{line_num}行数据格式错误，跳过")
-        print(f"成功加载问题数据文件: {PROBLEMS_FILE}，共{len(problems_data)}个问题")
+        index = ProblemIndex(PROBLEMS_FILE)
     except FileNotFoundError:
         print(f"错误: 找不到问题数据文件 {PROBLEMS_FILE}")
         return
-            
+    print(f"成功加载问题数据文件: {PROBLEMS_FILE}，共{len(index)}个问题")
+
     # 构建模块名到测试台的映射字典
     module_testbenches = {}
-    for problem in problems_data:
-        module_name = problem.get("module_name")
-        testbench = problem.get("testbench")
-        if module_name and testbench:
-            module_testbenches[module_name] = testbench
-        else:
-            print(f"警告: 问题数据缺少必要字段 - module_name: {module_name}")
-    
+    module_headers = {}
+    with index:
+        for module_name in {entry.get("module_name") for entry in solutions_data}:
+            if module_name not in index:
+                continue
+            testbench = index.testbench(module_name)
+            if testbench:
+                module_testbenches[module_name] = testbench
+                module_headers[module_name] = index.light(module_name).get("module_header")
+            else:
+                print(f"警告: 问题数据缺少必要字段 - testbench: {module_name}")
+
     print(f"成功构建测试台映射，共{len(module_testbenches)}个模块")
 
     # ================== 初始化测试环境 ==================
@@ -155,6 +419,36 @@ def run_functional_correctness():
     
     # 设置仿真超时时间（秒）
     timeout = 5
+
+    # 各阶段耗时与子进程资源，以及每次重写结果文件的耗时
+    stage_records = []
+    save_times = []
+
+    # 判定指纹：测试台 / 代码 / 工具链（iverilog、vvp版本、超时和接口预检查开关）都未变化的判定在增量模式下沿用
+    toolchain = toolchain_fingerprint(timeout, interface_precheck=INTERFACE_PRECHECK)
+    reused = stamped = 0
+
+    total_solutions = sum(len(entry.get("solutions", [])) for entry in solutions_data
+                          if entry.get("module_name") in module_testbenches)
+
+    # 可选：运行指标导出（Prometheus文本格式）
+    eval_metrics = exporter = None
+    if METRICS:
+        from tools.metrics import EvaluationMetrics, Registry, start_exporter
+
+        registry = Registry()
+        eval_metrics = EvaluationMetrics(registry, DATASET)
+        eval_metrics.remaining.set(total_solutions, dataset=DATASET)
+        exporter = start_exporter(registry, METRICS)
+
+    # 可选：向本机的调度协调器注册，每次编译仿真前申请槽位
+    coordinator = None
+    if COORDINATOR:
+        from tools.coordinator import CoordinatorClient
+
+        coordinator = CoordinatorClient.connect(
+            COORDINATOR, name=f"{DATASET}/{os.path.basename(output_file)}",
+            weight=JOB_WEIGHT, priority=JOB_PRIORITY, total=total_solutions)
     
     print("开始执行功能正确性测试...")
     print("-" * 50)
@@ -171,6 +465,7 @@ def run_functional_correctness():
             continue
 
         testbench_code = module_testbenches[module_name]
+        testbench_hash = testbench_fingerprint(testbench_code)
         solutions = module_entry.get("solutions", [])
         
         if not solutions:
@@ -183,177 +478,103 @@ def run_functional_correctness():
             module_results[module_name]["total"] += 1
 
             verilog_code = solution_entry.get("solution", "")
-            if not verilog_code:
-                solution_entry["pass"] = "错误: 解决方案为空"
-                continue
-
-            # ================== 准备测试文件 ==================
-            # 写入Verilog设计文件
-            try:
-                with open(TEMP_VERILOG_FILE, "w", encoding="utf-8") as f:
-                    f.write(verilog_code)
-            except IOError as e:
-                solution_entry["pass"] = f"文件写入错误: {str(e)}"
-                continue
-
-            # 写入测试台文件
-            try:
-                with open(TEMP_TESTBENCH_FILE, "w", encoding="utf-8") as f:
-                    f.write(testbench_code)
-            except IOError as e:
-                solution_entry["pass"] = f"测试台文件写入错误: {str(e)}"
-                continue
-
-            # ================== 提取测试台模块名 ==================
-            # 动态提取测试台的顶层模块名
-            tb_module = extract_testbench_module_name(testbench_code)
-            if not tb_module:
-                solution_entry["pass"] = "错误: 无法从测试台中提取模块名"
-                continue
-
-            # ================== 编译阶段 ==================
-            # 构建iverilog编译命令
-            compile_cmd = [
-                "iverilog",                    # Icarus Verilog编译器
-                "-Wall",                       # 显示所有警告
-                "-Winfloop",                   # 检测无限循环
-                "-Wno-timescale",             # 忽略时间尺度警告
-                "-g2012",                     # 使用Verilog-2012标准
-                "-s", tb_module,              # 指定顶层模块（动态提取的）
-                "-o", VVP_OUTPUT_FILE,        # 指定输出可执行文件
-                TEMP_VERILOG_FILE,            # 设计文件
-                TEMP_TESTBENCH_FILE           # 测试台文件
-            ]
-
-            # 执行编译
-            compile_process = subprocess.run(compile_cmd, capture_output=True, text=True)
-
-            # 检查编译是否成功
-            if compile_process.returncode != 0:
-                # 编译失败 - 语法错误
-                compile_error = compile_process.stderr.strip()
-                solution_entry["pass"] = f"编译失败: {compile_error}"
-                # 注意：编译失败时不增加compiled计数，但total已经计数了
-                continue
+            fingerprint = make_fingerprint(testbench_hash, verilog_code, toolchain)
+            if STAMP_FINGERPRINTS and solution_entry.get("pass") and "fingerprint" not in solution_entry:
+                solution_entry["fingerprint"] = fingerprint
+                stamped += 1
+            reuse = (INCREMENTAL or STAMP_FINGERPRINTS) and is_current(solution_entry, fingerprint)
+            if reuse:
+                status = solution_entry["pass"]
+                compiled = is_compiled_status(status)
+                reused += 1
+                if eval_metrics is not None:
+                    eval_metrics.remaining.dec(dataset=DATASET)
             else:
-                # 编译成功 - 语法正确
+                stats = {}
+                with coordinator.slot() if coordinator is not None else nullcontext():
+                    status, compiled = check_solution(verilog_code, testbench_code, timeout=timeout, stats=stats,
+                                                      module_header=module_headers.get(module_name))
+                solution_entry["pass"] = status
+                solution_entry["fingerprint"] = fingerprint
+                solution_entry["timing"] = stats["timing"]
+                solution_entry["resources"] = stats["resources"]
+                if "interface" in stats:
+                    solution_entry["interface"] = stats["interface"]
+                else:
+                    solution_entry.pop("interface", None)
+                stage_records.append({"module_name": module_name, **stats})
+                if eval_metrics is not None:
+                    eval_metrics.record_solution(status, compiled, stats)
+            if results_db is not None:
+                results_db.add_verdict(run_id, DATASET, module_name, solution_idx, verilog_code, status,
+                                       solution_entry.get("fingerprint"))
+            if compiled:
                 module_results[module_name]["compiled"] += 1
-
-            # ================== 仿真阶段 ==================
-            # 构建vvp仿真命令
-            sim_cmd = ["vvp", "-n", VVP_OUTPUT_FILE]  # -n: 非交互模式
-            
-            try:
-                # 执行仿真（带超时）
-                sim_process = subprocess.run(sim_cmd, capture_output=True, text=True, timeout=timeout)
-                output_log = sim_process.stdout
-                error_log = sim_process.stderr
-            except subprocess.TimeoutExpired:
-                # 仿真超时
-                output_log = "超时"
-                error_log = "仿真超时"
-            except Exception as e:
-                # 其他异常
-                output_log = "异常"
-                error_log = f"仿真异常: {str(e)}"
-
-            # ================== 结果分析 ==================
-            # 检查输出中是否包含成功标识
-            # ResBench数据集使用"All tests passed"或"Your Design Passed"作为成功标识
-            test_passed = ("All tests passed" in output_log or 
-                          "Your Design Passed" in output_log)
-
-            if test_passed:
-                # 测试通过 - 功能正确
-                solution_entry["pass"] = "true"
+            if status == "true":
                 module_results[module_name]["passed"] += 1
-            else:
-                # 测试失败，记录详细错误信息
-                if error_log and error_log.strip() and "超时" not in error_log:
-                    solution_entry["pass"] = f"仿真错误: {error_log.strip()}"
-                elif "超时" in output_log or "超时" in error_log:
-                    solution_entry["pass"] = "测试失败: 仿真超时"
-                else:
-                    solution_entry["pass"] = "测试失败: 未通过测试用例"
+            if reuse:
+                # 沿用的判定没有改变结果文件
+                continue
 
             # ================== 保存中间结果 ==================
             # 每测试完一个解决方案就保存结果，防止意外中断导致数据丢失
+            save_start = time.perf_counter()
             try:
-                with open(SOLUTIONS_FILE, "w", encoding="utf-8") as file:
+                with open(output_file, "w", encoding="utf-8") as file:
                     json.dump(solutions_data, file, indent=4, ensure_ascii=False)
+                save_times.append(time.perf_counter() - save_start)
             except IOError as e:
                 print(f"警告: 保存结果文件失败: {str(e)}")
 
+    if stamped:
+        # 只补记了指纹、没有重新测试的样本也需要写回
+        with open(output_file, "w", encoding="utf-8") as file:
+            json.dump(solutions_data, file, indent=4, ensure_ascii=False)
+    if INCREMENTAL or STAMP_FINGERPRINTS:
+        print(f"\n增量测试: 沿用 {reused} 个判定（其中补记指纹 {stamped} 个），重新测试 {len(stage_records)} 个")
+
+    # ================== 资源统计（可选） ==================
+    # 功能测试全部完成后再并行综合通过的样本，结果按代码哈希缓存
+    if RESOURCE_USAGE:
+        from tools.resource_usage import annotate_resources
+
+        synthesis = annotate_resources(solutions_data, module_headers, **RESOURCE_USAGE)
+        if synthesis and synthesis["updated"]:
+            with open(output_file, "w", encoding="utf-8") as file:
+                json.dump(solutions_data, file, indent=4, ensure_ascii=False)
+
     # ================== 清理环境 ==================
     clean_up_simulation()
+    if exporter is not None:
+        exporter.stop()
+    if coordinator is not None:
+        from tools.coordinator import print_wait_stats
+
+        print_wait_stats(coordinator.close())
     
     # ================== 计算和输出统计结果 ==================
     print("\n" + "="*60)
     print("测试完成，正在计算统计结果...")
-    
-    # 确定k值（假设所有模块的解决方案数量相同）
-    first_module = next(iter(module_results.values()), {"total": 0})
-    k_value = first_module["total"]
-    
-    if k_value == 0:
-        print("错误: 没有找到任何解决方案，无法计算pass@k指标")
-        return
-    
-    # 计算各种指标
-    total_modules = 0
-    total_syntax_pass_at_k = 0      # 语法正确性pass@k总和
-    total_functional_pass_at_k = 0   # 功能正确性pass@k总和
-    
-    print(f"\n各模块详细结果 (k={k_value}):")
-    print("-" * 90)
-    print(f"{'模块名':<20} {'编译/总数':<12} {'通过/编译':<12} {'语法pass@k':<12} {'功能pass@k':<12}")
-    print("-" * 90)
-    
-    for module_name, result in sorted(module_results.items()):
-        n = result["total"]          # 总样本数
-        c_syntax = result["compiled"] # 编译成功数（语法正确）
-        c_func = result["passed"]    # 功能测试通过数
-        
-        if n > 0:
-            # 计算语法正确性pass@k（基于编译成功）
-            syntax_pass_at_k = calculate_pass_at_k(n, c_syntax, k_value)
-            
-            # 计算功能正确性pass@k（基于功能测试通过）
-            functional_pass_at_k = calculate_pass_at_k(n, c_func, k_value)
-            
-            total_modules += 1
-            total_syntax_pass_at_k += syntax_pass_at_k
-            total_functional_pass_at_k += functional_pass_at_k
-            
-            print(f"{module_name:<20} {c_syntax}/{n:<11} {c_func}/{c_syntax:<11} {syntax_pass_at_k:<12.4f} {functional_pass_at_k:<12.4f}")
-    
-    # 计算并输出平均指标
-    print("-" * 90)
-    if total_modules > 0:
-        avg_syntax_pass_at_k = total_syntax_pass_at_k / total_modules
-        avg_functional_pass_at_k = total_functional_pass_at_k / total_modules
-        
-        print(f"平均语法pass@{k_value} (共{total_modules}个模块): {avg_syntax_pass_at_k:.4f}")
-        print(f"平均功能pass@{k_value} (共{total_modules}个模块): {avg_functional_pass_at_k:.4f}")
-        
-        # 额外的统计信息
-        total_solutions = sum(result["total"] for result in module_results.values())
-        total_compiled = sum(result["compiled"] for result in module_results.values())
-        total_passed = sum(result["passed"] for result in module_results.values())
-        
-        syntax_success_rate = total_compiled / total_solutions if total_solutions > 0 else 0
-        functional_success_rate = total_passed / total_solutions if total_solutions > 0 else 0
-        conditional_functional_rate = total_passed / total_compiled if total_compiled > 0 else 0
-        
-        print(f"\n总体统计:")
-        print(f"  语法正确率: {total_compiled}/{total_solutions} = {syntax_success_rate:.4f}")
-        print(f"  整体功能正确率: {total_passed}/{total_solutions} = {functional_success_rate:.4f}")
-        # print(f"  条件功能正确率: {total_passed}/{total_compiled} = {conditional_functional_rate:.4f}")
-        # print(f"  (条件功能正确率 = 在编译成功的前提下，功能测试通过的比例)")
+    from tools.passk import is_sequential, print_sequential_metrics
+
+    if is_sequential(solutions_data):
+        # 自适应采样的结果：n是停止时刻，改用前k个样本的估计
+        print_sequential_metrics(solutions_data)
     else:
-        print("没有可用的模块数据，无法计算平均pass@k")
-    
-    print("="*60)
+        print_metrics(module_results)
+    if RESOURCE_USAGE:
+        from tools.resource_usage import print_resource_summary, summarize_resources
+
+        print_resource_summary(summarize_resources(solutions_data))
+    print_stage_summary(stage_records, save_times)
+    if results_db is not None:
+        # 数据库中的汇总由SQL聚合得到，应与上面的结果一致
+        from tools.results_db import print_summary
+
+        results_db.flush()
+        print(f"\n结果已写入 {RESULTS_DB}（运行ID {run_id}）:")
+        print_summary([r for r in results_db.summary() if r["run_id"] == run_id])
+        results_db.close()
     print("所有测试已完成！")
 
 if __name__ == "__main__":
@@ -372,6 +593,8 @@ if __name__ == "__main__":
         6. 程序会在当前目录生成临时文件，测试完成后会自动清理
         7. 新增语法正确性统计，提供syntax pass@1和functional pass@k两个指标
     """
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
     print("ResBench Verilog功能正确性测试程序 (增强版)")
     print("="*60)
     print("本程序将计算以下指标:")
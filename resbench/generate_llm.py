@@ -1,13 +1,11 @@
 import json
 import os
+import random
 import re
-from typing import Dict, Any, List
+import sys
+from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
-from tqdm import tqdm
-from vllm import LLM, SamplingParams
-
-# 设置工作目录为当前文件所在目录
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+from concurrent.futures import ThreadPoolExecutor
 
 @dataclass
 class Problem:
@@ -16,35 +14,245 @@ class Problem:
     module_name: str
 
 
+# The prompt already opens the ```verilog fence and the module header, so the
+# completion is finished as soon as the module or the code fence is closed.
+STOP_SEQUENCES = ["endmodule", "```"]
+
+
 class LocalVerilogGenerator:
-    def __init__(self, model_path: str, max_tokens: int = 2048):
-        """Initialize the generator with local LLM using vllm"""
-        self.model = LLM(model=model_path, gpu_memory_utilization=0.9, max_model_len=4096, trust_remote_code=True)
+    def __init__(self, model_path: str, max_tokens: int = 2048, min_tokens: int = 512,
+                 tokens_per_header_token: int = 16, llm=None, sampling_params_cls=None,
+                 max_model_len: Optional[int] = None, enable_prefix_caching: bool = True):
+        """
+        Initialize the generator with local LLM using vllm
+
+        `llm` / `sampling_params_cls` allow an already-built engine (or a CPU mock
+        such as tools.mock_vllm) to be injected instead of loading `model_path`.
+        Without an injected engine only the tokenizer is loaded here; the vllm
+        engine is built on the first generate call, with max_model_len sized
+        from the measured prompt lengths unless `max_model_len` caps it.
+        """
+        if sampling_params_cls is None:
+            from vllm import SamplingParams as sampling_params_cls
+        self.model_path = model_path
+        self.model = llm
+        self.sampling_params_cls = sampling_params_cls
+        if llm is not None:
+            self.tokenizer = llm.get_tokenizer()
+        else:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
         self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.tokens_per_header_token = tokens_per_header_token
+        self.max_model_len = max_model_len
+        self.enable_prefix_caching = enable_prefix_caching
+        # Prefix-cache statistics, filled when the engine reports num_cached_tokens
+        self.prompt_tokens = 0
+        self.cached_tokens: Optional[int] = None
+
+    def _ensure_model(self, longest_request: int):
+        """Build the vllm engine with max_model_len rounded up from the longest prompt + budget"""
+        if self.model is not None:
+            return
+        from vllm import LLM
+        max_model_len = -(-longest_request // 256) * 256
+        if self.max_model_len is not None:
+            max_model_len = min(max_model_len, self.max_model_len)
+        print(f"Building vllm engine with max_model_len={max_model_len}")
+        self.model = LLM(model=self.model_path, gpu_memory_utilization=0.9,
+                         max_model_len=max_model_len, trust_remote_code=True,
+                         enable_prefix_caching=self.enable_prefix_caching)
+
+    def _token_budget(self, problem: Problem) -> int:
+        """
+        Per-problem max_tokens derived from the module size.
+
+        The datasets ship no reference solutions, so the size of the module
+        header (number of ports and their widths) is the size signal: the
+        budget grows linearly with the header's token count and is clamped to
+        [min_tokens, max_tokens]. The stop sequences end normal completions
+        long before this limit; the budget only bounds runaway generations.
+        """
+        header_tokens = len(self.tokenizer.encode(problem.module_header))
+        budget = self.tokens_per_header_token * header_tokens
+        return max(self.min_tokens, min(self.max_tokens, budget))
 
     def _create_prompt(self, problem: Problem) -> str:
+        # Fixed instruction first, header last: prompts share the longest possible
+        # prefix and the completion continues directly after the header.
         return f"""### Instruct: Please act as a professional Verilog designer and provide Verilog code based on the given instruction. {problem.prompt}
 
 ### Response: ```verilog
 {problem.module_header}
 """
 
-    def generate_solutions(self, problems: List[Problem], k: int) -> List[Dict[str, Any]]:
-        """Generate k solutions for multiple problems using local LLM with vllm"""
+    def generate_solutions(self, problems: List[Problem], k: int, output_file: Optional[str] = None,
+                           chunk_size: int = 64, max_batch_tokens: Optional[int] = None,
+                           resume: bool = False, order: str = "length") -> List[Dict[str, Any]]:
+        """
+        Generate k solutions for multiple problems using local LLM with vllm
+
+        Prompts are tokenized up front, sorted by length and submitted in chunks
+        of at most `chunk_size` prompts (and `max_batch_tokens` prompt+budget
+        tokens, counting all k samples), so each batch holds prompts of similar
+        length. When `output_file` is given, results are written after every
+        chunk; with `resume=True` problems already present in the file are
+        skipped, so an interrupted run continues where it stopped.
+
+        `order="prefix"` sorts prompts lexicographically instead of by length,
+        so prompts sharing a prefix land in the same or adjacent chunks and
+        vllm's prefix cache can reuse their KV blocks.
+        """
+        from tqdm import tqdm
+
         prompts = [self._create_prompt(problem) for problem in problems]
-        temperature = 0 if k == 1 else 0.6
-        # Configure sampling parameters
-        sampling_params = SamplingParams(
-            temperature=temperature,
-            max_tokens=self.max_tokens,
-            n=k  # Generate k samples for each prompt
-        )
+        prompt_lens = [len(self.tokenizer.encode(prompt)) for prompt in prompts]
+        budgets = [self._token_budget(problem) for problem in problems]
+
+        done = {}
+        if resume and output_file and os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8") as f:
+                done = {entry["module_name"]: entry for entry in json.load(f)}
+            print(f"Resuming: {len(done)} problems already in {output_file}")
+
+        pending = [i for i in range(len(problems)) if problems[i].module_name not in done]
+        if pending:
+            self._ensure_model(max(prompt_lens[i] + budgets[i] for i in pending))
+
+        if order == "prefix":
+            sort_key = lambda i: prompts[i]
+        else:
+            sort_key = lambda i: prompt_lens[i]
+        chunks = self._make_chunks(sorted(pending, key=sort_key), prompt_lens, budgets, k,
+                                   chunk_size, max_batch_tokens)
+        for chunk in tqdm(chunks, desc="Generating chunks"):
+            outputs = self._generate_chunk([problems[i] for i in chunk], [prompts[i] for i in chunk],
+                                           [budgets[i] for i in chunk], k)
+            for i, result in zip(chunk, outputs):
+                done[problems[i].module_name] = result
+            if output_file:
+                self._save(output_file, problems, done)
+
+        if self.cached_tokens is not None and self.prompt_tokens:
+            print(f"Prefix cache hits: {self.cached_tokens}/{self.prompt_tokens} prompt tokens "
+                  f"({self.cached_tokens / self.prompt_tokens:.2%})")
+        return [done[problem.module_name] for problem in problems if problem.module_name in done]
+
+    @staticmethod
+    def _make_chunks(indices: List[int], prompt_lens: List[int], budgets: List[int], k: int,
+                     chunk_size: int, max_batch_tokens: Optional[int]) -> List[List[int]]:
+        """Split already-ordered indices into chunks bounded by count and token budget"""
+        chunks, current, current_tokens = [], [], 0
+        for i in indices:
+            cost = (prompt_lens[i] + budgets[i]) * k
+            if current and (len(current) >= chunk_size or
+                            (max_batch_tokens is not None and current_tokens + cost > max_batch_tokens)):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def generate_adaptive(self, problems: List[Problem], testbenches: Dict[str, str], max_samples: int = 10,
+                          total_budget: Optional[int] = None, eval_workers: Optional[int] = None,
+                          chunk_size: int = 64) -> List[Dict[str, Any]]:
+        """
+        Budgeted sampling: interleave generation with evaluation.
+
+        Each round draws one sample for every problem that is still unsolved
+        and below `max_samples`, evaluates the round with the functional
+        correctness checker, and stops when everything is solved, capped, or
+        `total_budget` samples have been drawn. The number of samples drawn per
+        problem is recorded as `n_samples`. Since n is a stopping time rather than
+        a fixed sample count, entries are tagged `"sampling": "sequential"` and
+        pass@k comes from `tools.passk.summarize_sequential`, not the standard estimator.
+        """
+        from functional_correctness import check_solution_isolated
+        from tqdm import tqdm
+
+        if not problems:
+            return []
+        budget = total_budget if total_budget is not None else max_samples * len(problems)
+        states = {
+            problem.module_name: {"module_name": problem.module_name, "sampling": "sequential", "solutions": [],
+                                  "n_samples": 0, "solved_at": None}
+            for problem in problems
+        }
+        prompts = {problem.module_name: self._create_prompt(problem) for problem in problems}
+        budgets = {problem.module_name: self._token_budget(problem) for problem in problems}
+        self._ensure_model(max(len(self.tokenizer.encode(prompts[p.module_name])) + budgets[p.module_name]
+                               for p in problems))
+
+        with ThreadPoolExecutor(max_workers=eval_workers or os.cpu_count() or 1) as executor:
+            round_idx = 0
+            while budget > 0:
+                active = [
+                    problem for problem in problems
+                    if states[problem.module_name]["solved_at"] is None
+                    and states[problem.module_name]["n_samples"] < max_samples
+                ]
+                if not active:
+                    break
+                if len(active) > budget:
+                    # Spread the last partial round randomly instead of starving the tail of the file
+                    picked = {p.module_name for p in random.Random(round_idx).sample(active, budget)}
+                    active = [problem for problem in active if problem.module_name in picked]
+                budget -= len(active)
+                round_idx += 1
+
+                results = []
+                for start in range(0, len(active), chunk_size):
+                    chunk = active[start:start + chunk_size]
+                    # Sample with the k>1 temperature, otherwise repeated draws are identical
+                    results.extend(self._generate_chunk(
+                        chunk, [prompts[p.module_name] for p in chunk],
+                        [budgets[p.module_name] for p in chunk], 1, temperature=0.6,
+                    ))
+                codes = [result["solutions"][0]["solution"] for result in results]
+                verdicts = list(tqdm(
+                    executor.map(lambda args: check_solution_isolated(*args[:2], module_header=args[2]),
+                                 [(code, testbenches.get(p.module_name, ""), p.module_header)
+                                  for code, p in zip(codes, active)]),
+                    total=len(active), desc=f"Round {round_idx}",
+                ))
+                for problem, code, (status, _) in zip(active, codes, verdicts):
+                    state = states[problem.module_name]
+                    if status == "true" and state["solved_at"] is None:
+                        state["solved_at"] = state["n_samples"]
+                    state["n_samples"] += 1
+                    state["solutions"].append({"solution": code, "pass": status})
+
+        return [states[problem.module_name] for problem in problems]
+
+    def _generate_chunk(self, problems: List[Problem], prompts: List[str], budgets: List[int],
+                        k: int, temperature: Optional[float] = None) -> List[Dict[str, Any]]:
+        if temperature is None:
+            temperature = 0 if k == 1 else 0.6
+        # Configure sampling parameters, one per prompt so each problem gets its own token budget
+        sampling_params = [
+            self.sampling_params_cls(
+                temperature=temperature,
+                max_tokens=budget,
+                n=k,  # Generate k samples for each prompt
+                stop=STOP_SEQUENCES,
+                include_stop_str_in_output=True,  # keep "endmodule" for _extract_verilog_code
+            )
+            for budget in budgets
+        ]
 
-        # Generate samples for all prompts at once
         outputs = self.model.generate(
             prompts=prompts,
             sampling_params=sampling_params
         )
+        for output in outputs:
+            self.prompt_tokens += len(getattr(output, "prompt_token_ids", None) or [])
+            cached = getattr(output, "num_cached_tokens", None)
+            if cached is not None:
+                self.cached_tokens = (self.cached_tokens or 0) + cached
+
         all_solutions = []
         # Process each generated output
         for i, output in enumerate(outputs):
@@ -63,6 +271,15 @@ class LocalVerilogGenerator:
 
         return all_solutions
 
+    @staticmethod
+    def _save(output_file: str, problems: List[Problem], done: Dict[str, Dict[str, Any]]):
+        """Write results in problem-file order; the rename keeps the file intact if interrupted"""
+        ordered = [done[problem.module_name] for problem in problems if problem.module_name in done]
+        tmp_file = output_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(ordered, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_file, output_file)
+
     def _extract_verilog_code(self, content: str) -> str:
         if 'endmodule' in content:
             content = content.split('endmodule')[0].strip() + '\nendmodule'
@@ -73,41 +290,88 @@ class LocalVerilogGenerator:
         return result
 
 def generate_solutions(config):
+    # tools/ lives at the repo root (problem index, mock engine)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from tools.problem_index import ProblemIndex
+    from tools.sharding import load_weights, parse_shard, select_shard, shard_path
+
     # Initialize the local model generator
-    generator = LocalVerilogGenerator(model_path=config["model_path"])
-
-    all_problems = []
-    # 加载问题数据
-    with open(config["prompt_file"], "r", encoding="utf-8") as f:
-        for line in f:
-            item = json.loads(line)
-            problem = Problem(
-                prompt=item.get("prompt", ""),
-                module_header=item.get("module_header", ""),
-                module_name=item.get("module_name", ""),
-            )
-            all_problems.append(problem)
+    if config.get("mock_engine", False):
+        # CPU-only dry run with the mock engine from tools/
+        from tools.mock_vllm import MockLLM, MockSamplingParams
+        generator = LocalVerilogGenerator(
+            model_path=config["model_path"], llm=MockLLM(), sampling_params_cls=MockSamplingParams
+        )
+    else:
+        generator = LocalVerilogGenerator(model_path=config["model_path"],
+                                          max_model_len=config.get("max_model_len"))
 
-    print(f"Generating {config['k']} solutions for {len(all_problems)} problems...")
+    # 加载问题数据（通过偏移索引，不解码testbench）
+    with ProblemIndex(config["prompt_file"]) as index:
+        selected = index.select(config.get("problems"))
+        shard = parse_shard(config.get("shard"))
+        if shard is not None:
+            weights = load_weights(config.get("shard_weights"), config["prompt_file"])
+            selected = select_shard(selected, shard, weights)
+            print(f"Shard {shard[0]}/{shard[1]}: {len(selected)} problems")
+        all_problems = [Problem(**index.light(name)) for name in selected]
+        # 只有预算模式需要在生成期间评测
+        if config.get("adaptive_sampling"):
+            testbenches = {name: index.testbench(name) for name in selected}
 
-    # Generate solutions
-    all_solutions = generator.generate_solutions(all_problems, config["k"])
+    if config.get("adaptive_sampling"):
+        settings = config["adaptive_sampling"]
+        max_samples = settings.get("max_samples", 10)
+        all_solutions = generator.generate_adaptive(
+            all_problems, testbenches, max_samples=max_samples,
+            total_budget=settings.get("total_budget"), eval_workers=config.get("eval_workers"),
+            chunk_size=config.get("chunk_size", 64),
+        )
+        output_file_name = shard_path(f"pass{max_samples}_{config['model_name']}_adaptive.json", shard)
+        with open(output_file_name, "w", encoding="utf-8") as f:
+            json.dump(all_solutions, f, ensure_ascii=False, indent=4)
+        drawn = sum(entry["n_samples"] for entry in all_solutions)
+        solved = sum(1 for entry in all_solutions if entry["solved_at"] is not None)
+        print(f"Drew {drawn} samples, solved {solved}/{len(all_solutions)} problems, saved to {output_file_name}")
+        return
+
+    print(f"Generating {config['k']} solutions for {len(all_problems)} problems...")
 
-    # 保存结果
-    output_file_name = f"pass{config['k']}_{config['model_name']}.json"
-    with open(output_file_name, "w", encoding="utf-8") as f:
-        json.dump(all_solutions, f, ensure_ascii=False, indent=4)
+    # Generate solutions, saving after every chunk
+    output_file_name = shard_path(f"pass{config['k']}_{config['model_name']}.json", shard)
+    generator.generate_solutions(
+        all_problems, config["k"], output_file=output_file_name,
+        chunk_size=config.get("chunk_size", 64),
+        max_batch_tokens=config.get("max_batch_tokens"),
+        resume=config.get("resume", False),
+        order=config.get("order", "length"),
+    )
 
     print(f"All solutions generated and saved to {output_file_name}")
 
 
+# Configuration (edit here, or override through verilog_bench.py generate-local)
+DEFAULT_CONFIG = {
+    "model_path": "/media/yg/E/models/Seed-Coder-8B-Instruct",  # Path to your local HF model
+    "model_name": "seed_coder",  # Name to use in the JSON output
+    "prompt_file": "problems_resbench.jsonl",
+    "problems": None,  # Optional subset: module names or globs, e.g. ["mux*", "accu"]
+    "shard": None,  # Multi-node split "i/N" (0-based); output gets a .shard{i}of{N} suffix
+    "shard_weights": None,  # None = hash split, "size" = record size, or JSON {module_name: cost}
+    "k": 1,  # Number of solutions to generate per problem
+    "mock_engine": False,  # Use tools.mock_vllm instead of vllm (CPU dry run)
+    "chunk_size": 64,  # Prompts per vllm generate call (prompts are sorted by length)
+    "max_batch_tokens": None,  # Optional cap on prompt+budget tokens per chunk
+    "max_model_len": None,  # Upper bound for the measured max_model_len, None = no cap
+    "resume": False,  # Skip problems already present in the output file
+    # Budgeted mode: keep sampling only unsolved problems, e.g. {"max_samples": 10, "total_budget": 500}
+    "adaptive_sampling": None,
+    "eval_workers": None,  # Parallel evaluations in adaptive mode, None = CPU count
+    "order": "length",  # "length" buckets by prompt length, "prefix" groups shared prefixes for KV-cache reuse
+}
+
 if __name__ == "__main__":
-    # Configuration
-    config = {
-        "model_path": "/media/yg/E/models/Seed-Coder-8B-Instruct",  # Path to your local HF model
-        "model_name": "seed_coder",  # Name to use in the JSON output
-        "prompt_file": "problems_resbench.jsonl",
-        "k": 1  # Number of solutions to generate per problem
-    }
+    # 设置工作目录为当前文件所在目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
     # Run only the generation part
-    generate_solutions(config)
\ No newline at end of file
+    generate_solutions(DEFAULT_CONFIG)
\ No newline at end of file
@@ -0,0 +1 @@
+"""跨数据集共用的工具：本地模拟服务、压测等"""
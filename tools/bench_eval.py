@@ -0,0 +1,333 @@
+"""
+功能测试（functional_correctness.py）的吞吐基准
+
+从 problems_*.jsonl 构造合成的解决方案，按比例混合以下几类样本:
+    pass             已知能通过的代码，取自已测试结果文件中 pass 为 "true" 的样本
+    compile_error    模块头 + 语法错误
+    functional_fail  只有模块头、输出悬空的空实现
+    infinite_loop    时刻0的零延迟死循环，每个都会跑满仿真超时
+    log_flood        仿真开始时输出大量日志
+    wrong_interface  模块名与 module_header 不一致，--precheck 时由接口预检查直接判定（默认比例中不含）
+在不同的并发数和缓存设置下用 check_solution_isolated 并发测试，报告 solutions/s、
+各阶段耗时（见 tools/procstats.py）和峰值内存，结果保存为JSON，便于在版本之间对比。
+
+评测器本身没有结果缓存，这里的缓存指对 (数据集, 模块, 代码) 完全相同的样本只仿真
+一次，模拟模型重复输出同一代码的情况；合成样本中同一模块的同类样本代码相同。
+
+使用方法:
+    python -m tools.bench_eval --samples 200 --workers 1,4,8 --output bench_eval.json
+    python -m tools.bench_eval --datasets rtllm_v2 --mix pass=0.5,compile_error=0.5 --cache off,on
+    python -m tools.bench_eval --baseline bench_eval_old.json --output bench_eval.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from tools.datasets import DATASETS, ROOT_DIR, load_dataset_module
+from tools.problem_index import ProblemIndex
+from tools.procstats import summarize_stages
+from tools.results_db import classify_status
+
+CATEGORIES = ("pass", "compile_error", "functional_fail", "infinite_loop", "log_flood", "wrong_interface")
+DEFAULT_MIX = "pass=0.4,compile_error=0.2,functional_fail=0.3,infinite_loop=0.05,log_flood=0.05"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"pass=0.4,compile_error=0.2,..." -> 归一化后的比例"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in CATEGORIES:
+            raise ValueError(f"未知的样本类别 {name!r}，可选: {', '.join(CATEGORIES)}")
+        mix[name] = float(value)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("样本比例之和必须大于0")
+    return {name: value / total for name, value in mix.items()}
+
+
+def split_counts(total: int, mix: Dict[str, float]) -> Dict[str, int]:
+    """按比例分配样本数（最大余数法），各类之和恰好为total"""
+    exact = {name: total * share for name, share in mix.items()}
+    counts = {name: int(value) for name, value in exact.items()}
+    remainder = sorted(exact, key=lambda name: counts[name] - exact[name])
+    for name in remainder[:total - sum(counts.values())]:
+        counts[name] += 1
+    return counts
+
+
+def load_known_pass(dataset: str, paths: Optional[Sequence[str]] = None) -> Dict[str, List[str]]:
+    """从已测试结果文件中收集通过的代码，默认读取数据集目录下的 pass*.json"""
+    if paths is None:
+        paths = sorted(glob.glob(os.path.join(ROOT_DIR, dataset, "pass*.json")))
+    known: Dict[str, List[str]] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            solutions_data = json.load(f)
+        for entry in solutions_data:
+            for solution in entry.get("solutions", []):
+                if solution.get("pass") == "true" and solution.get("solution"):
+                    codes = known.setdefault(entry["module_name"], [])
+                    if solution["solution"] not in codes:
+                        codes.append(solution["solution"])
+    return known
+
+
+def synthesize(category: str, header: str, flood_lines: int = 100000) -> str:
+    """根据模块头构造某一类的合成代码（pass类不在这里构造）"""
+    header = header.rstrip()
+    if category == "compile_error":
+        body = "    // synthetic compile_error candidate\n    wire syntax_error = ;\n"
+    elif category == "functional_fail":
+        body = "    // synthetic functional_fail candidate: outputs left undriven\n"
+    elif category == "infinite_loop":
+        body = ("    // synthetic infinite_loop candidate: zero-delay loop at time 0\n"
+                "    integer spin;\n"
+                "    initial begin\n"
+                "        spin = 0;\n"
+                "        while (1) spin = spin + 1;\n"
+                "    end\n")
+    elif category == "wrong_interface":
+        header = re.sub(r"\bmodule\s+(\w+)", r"module \1_impl", header, count=1)
+        body = "    // synthetic wrong_interface candidate: module renamed\n"
+    elif category == "log_flood":
+        body = ("    // synthetic log_flood candidate\n"
+                "    integer flood_i;\n"
+                f"    initial for (flood_i = 0; flood_i < {flood_lines}; flood_i = flood_i + 1)\n"
+                '        $display("flood line %0d: 0123456789abcdef0123456789abcdef", flood_i);\n')
+    else:
+        raise ValueError(f"无法合成类别 {category!r}")
+    return f"{header}\n{body}endmodule\n"
+
+
+def build_workload(datasets: Sequence[str], samples: int, mix: Dict[str, float], seed: int = 0,
+                   pass_from: Optional[Sequence[str]] = None, flood_lines: int = 100000) -> Dict[str, Any]:
+    """
+    返回 {"candidates": [...], "testbenches": {(dataset, module): testbench},
+          "headers": {(dataset, module): module_header}, "counts": {...}}
+
+    每个候选为 {"dataset", "module_name", "category", "solution"}。没有任何已知通过的
+    代码时，pass类的份额并入 functional_fail 并给出提示。
+    """
+    rng = random.Random(seed)
+    headers: Dict[tuple, str] = {}
+    testbenches: Dict[tuple, str] = {}
+    known: Dict[tuple, List[str]] = {}
+    for dataset in datasets:
+        with ProblemIndex(os.path.join(ROOT_DIR, dataset, f"problems_{dataset}.jsonl")) as index:
+            for name in index.names():
+                headers[(dataset, name)] = index.light(name)["module_header"]
+                testbenches[(dataset, name)] = index.testbench(name)
+        paths = [p for p in pass_from if os.path.basename(os.path.dirname(os.path.abspath(p))) == dataset] \
+            if pass_from else None
+        if pass_from and not paths:
+            continue
+        for name, codes in load_known_pass(dataset, paths).items():
+            if (dataset, name) in testbenches:
+                known[(dataset, name)] = codes
+
+    mix = dict(mix)
+    if mix.get("pass") and not known:
+        print("警告: 没有找到已知通过的样本（pass*.json），pass 类样本改为 functional_fail")
+        mix["functional_fail"] = mix.get("functional_fail", 0.0) + mix.pop("pass")
+    counts = split_counts(samples, mix)
+
+    problems = sorted(headers)
+    known_keys = sorted(known)
+    candidates = []
+    for category, count in counts.items():
+        for _ in range(count):
+            if category == "pass":
+                key = rng.choice(known_keys)
+                code = rng.choice(known[key])
+            else:
+                key = rng.choice(problems)
+                code = synthesize(category, headers[key], flood_lines)
+            candidates.append({"dataset": key[0], "module_name": key[1], "category": category, "solution": code})
+    rng.shuffle(candidates)
+    return {"candidates": candidates, "testbenches": testbenches, "headers": headers, "counts": counts}
+
+
+def write_solutions(candidates: List[Dict[str, Any]], out_dir: str) -> List[str]:
+    """按数据集写出 functional_correctness.py 可直接测试的解决方案文件"""
+    os.makedirs(out_dir, exist_ok=True)
+    grouped: Dict[str, Dict[str, List[Dict[str, str]]]] = {}
+    for candidate in candidates:
+        modules = grouped.setdefault(candidate["dataset"], {})
+        modules.setdefault(candidate["module_name"], []).append({"solution": candidate["solution"], "pass": ""})
+    paths = []
+    for dataset, modules in grouped.items():
+        path = os.path.join(out_dir, f"pass1_synthetic_{dataset}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{"module_name": name, "solutions": solutions} for name, solutions in modules.items()],
+                      f, indent=4, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def run_config(workload: Dict[str, Any], evaluators: Dict[str, Any], workers: int, cache: bool,
+               timeout: float) -> Dict[str, Any]:
+    """用 workers 个线程测试全部候选；cache 为True时相同代码只测试一次"""
+    candidates = workload["candidates"]
+    keys = [(c["dataset"], c["module_name"], c["solution"]) for c in candidates]
+    unique = list(dict.fromkeys(keys)) if cache else keys
+
+    def evaluate(key):
+        dataset, module_name, code = key
+        stats = {}
+        status, _ = evaluators[dataset].check_solution_isolated(
+            code, workload["testbenches"][(dataset, module_name)], timeout=timeout, stats=stats,
+            module_header=workload["headers"][(dataset, module_name)])
+        return status, stats
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(evaluate, unique))
+    wall = time.perf_counter() - start
+
+    records = [{"module_name": f"{key[0]}/{key[1]}", **stats} for key, (_, stats) in zip(unique, outcomes)]
+    if cache:
+        by_key = dict(zip(unique, outcomes))
+        outcomes = [by_key[key] for key in keys]
+
+    observed: Dict[str, Dict[str, int]] = {}
+    for candidate, (status, _) in zip(candidates, outcomes):
+        per_category = observed.setdefault(candidate["category"], {})
+        label = classify_status(status)[0]
+        per_category[label] = per_category.get(label, 0) + 1
+
+    summary = summarize_stages(records)
+    child_peak = max(summary["modules"].values(), key=lambda m: m["max_rss_kb"], default=None)
+    return {
+        "workers": workers,
+        "cache": cache,
+        "solutions": len(candidates),
+        "evaluated": len(unique),
+        "wall_time": wall,
+        "solutions_per_s": len(candidates) / wall if wall > 0 else 0.0,
+        "stages": summary["stages"],
+        "child_max_rss_kb": child_peak["max_rss_kb"] if child_peak else 0,
+        # False 表示子进程峰值没有超过本进程的RSS，只是上限（见 tools/procstats.py）
+        "child_rss_exact": child_peak["rss_exact"] if child_peak else False,
+        "parent_max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "observed": observed,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """记录Python、平台、iverilog版本和代码版本，便于比较不同版本的结果"""
+    env = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    try:
+        env["iverilog"] = subprocess.run(["iverilog", "-V"], capture_output=True, text=True,
+                                         timeout=10).stdout.splitlines()[0]
+    except (OSError, IndexError, subprocess.SubprocessError):
+        env["iverilog"] = None
+    try:
+        env["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                       cwd=ROOT_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        env["commit"] = None
+    return env
+
+
+def print_table(results: List[Dict[str, Any]], baseline: Optional[List[Dict[str, Any]]] = None):
+    previous = {(r["workers"], r["cache"]): r for r in baseline or []}
+    header = (f"{'并发':<6} {'缓存':<6} {'样本数':<8} {'实际测试':<10} {'耗时(s)':<10} {'sol/s':<9} "
+              f"{'编译p50':<10} {'仿真p50':<10} {'仿真p95':<10} {'子进程峰值RSS':<16}")
+    if previous:
+        header += f" {'相对基准':<8}"
+    print(header)
+    print("-" * len(header.encode("gbk")))
+    for r in results:
+        stages = r["stages"]
+        compile_p50 = stages.get("compile", {}).get("p50", 0.0)
+        sim = stages.get("simulate", {})
+        bound = "" if r["child_rss_exact"] else "≤"
+        rss = f"{bound}{r['child_max_rss_kb'] / 1024:.1f} MB"
+        line = (f"{r['workers']:<6} {'on' if r['cache'] else 'off':<6} {r['solutions']:<8} {r['evaluated']:<10} "
+                f"{r['wall_time']:<10.2f} {r['solutions_per_s']:<9.2f} {compile_p50:<10.4f} "
+                f"{sim.get('p50', 0.0):<10.4f} {sim.get('p95', 0.0):<10.4f} {rss:<16}")
+        base = previous.get((r["workers"], r["cache"]))
+        if base and base["solutions_per_s"] > 0:
+            line += f" {r['solutions_per_s'] / base['solutions_per_s'] - 1:+.1%}"
+        print(line)
+
+    if results:
+        print("\n各类样本的实际判定:")
+        observed = results[0]["observed"]
+        for category in (c for c in CATEGORIES if c in observed):
+            statuses = observed[category]
+            detail = ", ".join(f"{status} {count}" for status, count in sorted(statuses.items()))
+            print(f"  {category:<16} {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="功能测试吞吐基准（合成样本）")
+    parser.add_argument("--datasets", default=",".join(DATASETS), help="逗号分隔的数据集")
+    parser.add_argument("--samples", type=int, default=200, help="合成样本总数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="各类样本的比例，如 pass=0.4,compile_error=0.2")
+    parser.add_argument("--pass-from", nargs="+", help="已知通过样本的来源文件，默认为各数据集目录下的 pass*.json")
+    parser.add_argument("--flood-lines", type=int, default=100000, help="log_flood 样本输出的行数")
+    parser.add_argument("--workers", default="1,4", help="逗号分隔的并发数")
+    parser.add_argument("--cache", default="off,on", help="逗号分隔的缓存设置（off / on）")
+    parser.add_argument("--timeout", type=float, default=5, help="仿真超时（秒），决定 infinite_loop 样本的代价")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precheck", action="store_true", help="开启编译前的模块接口预检查")
+    parser.add_argument("--solutions-out", help="把合成样本按数据集写成解决方案文件到该目录")
+    parser.add_argument("--baseline", help="之前保存的结果JSON，输出相对吞吐变化")
+    parser.add_argument("--output", help="结果保存为JSON")
+    args = parser.parse_args()
+
+    datasets = [d.strip() for d in args.datasets.split(",") if d.strip()]
+    unknown = [d for d in datasets if d not in DATASETS]
+    if unknown:
+        parser.error(f"未知的数据集: {', '.join(unknown)}")
+    mix = parse_mix(args.mix)
+    workload = build_workload(datasets, args.samples, mix, args.seed, args.pass_from, args.flood_lines)
+    counts = ", ".join(f"{name} {count}" for name, count in workload["counts"].items())
+    print(f"合成样本 {len(workload['candidates'])} 个（{counts}），数据集: {', '.join(datasets)}")
+    if args.solutions_out:
+        for path in write_solutions(workload["candidates"], args.solutions_out):
+            print(f"解决方案文件: {path}")
+
+    evaluators = {dataset: load_dataset_module(dataset, "functional_correctness") for dataset in datasets}
+    for module in evaluators.values():
+        module.INTERFACE_PRECHECK = args.precheck
+    results = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for cache in [c.strip() == "on" for c in args.cache.split(",")]:
+            print(f"运行: 并发 {workers}, 缓存 {'on' if cache else 'off'} ...", file=sys.stderr)
+            results.append(run_config(workload, evaluators, workers, cache, args.timeout))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results")
+    print()
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            "environment": environment(),
+            "workload": {"datasets": datasets, "samples": args.samples, "mix": mix, "counts": workload["counts"],
+                         "seed": args.seed, "timeout": args.timeout, "flood_lines": args.flood_lines},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"\n结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+多个测试结果文件的横向对比报告
+
+一次加载任意多个已测试的 pass{k}_{model}.json，输出 模型 × 数据集 × 指标 的矩阵，
+以及相对基准模型的逐题胜负（功能pass@1之差）。每个文件解析出的逐模块计数
+（样本数、编译数、通过数）以列式格式缓存在 .npz 旁路文件中，按文件大小和修改时间
+判断是否失效；新增一个运行后再次生成报告只需解析新文件。
+
+数据集由文件所在目录名推断（resbench / rtllm_v2 / verilogeval_v2），否则使用 --dataset；
+模型名取自文件名 pass{k}_{model}.json。
+
+使用方法:
+    python -m tools.compare resbench/pass*.json rtllm_v2/pass*.json --baseline gpt-4o
+    python -m tools.compare */pass5_*.json --ks 1,5 --csv matrix.csv --json report.json
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tools.compare_args import add_compare_arguments
+from tools.datasets import DATASETS, load_dataset_module
+from tools.passk import is_sequential, pass_at_k, summarize
+
+CACHE_VERSION = 1
+FILE_COLUMNS = ("path", "size", "mtime_ns", "dataset", "model")
+ROW_COLUMNS = ("file", "module", "n", "compiled", "passed")
+RESULT_NAME = re.compile(r"^pass(\d+)_(.+?)(\.shard\d+of\d+)?$")
+
+_counters: Dict[str, Any] = {}
+
+
+def infer_run(path: str, default_dataset: Optional[str] = None) -> Dict[str, str]:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = RESULT_NAME.match(stem)
+    model = match.group(2) if match else stem
+    dataset = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    if dataset not in DATASETS:
+        dataset = default_dataset or "unknown"
+    return {"dataset": dataset, "model": model}
+
+
+def count_file(path: str, dataset: str) -> Optional[Dict[str, Dict[str, int]]]:
+    """用对应数据集的 collect_module_results 统计逐模块计数；自适应采样的结果返回None"""
+    script_dataset = dataset if dataset in DATASETS else DATASETS[0]
+    if script_dataset not in _counters:
+        _counters[script_dataset] = load_dataset_module(script_dataset, "functional_correctness")
+    with open(path, "r", encoding="utf-8") as f:
+        solutions_data = json.load(f)
+    if is_sequential(solutions_data):
+        return None
+    return dict(_counters[script_dataset].collect_module_results(solutions_data))
+
+
+class CountCache:
+    """逐模块计数的列式缓存：文件表 + 行表，存为单个 .npz"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.rows: Dict[str, Dict[str, np.ndarray]] = {}
+        self.parsed: List[str] = []
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data["version"]) != CACHE_VERSION:
+                    return
+                columns = {name: data[f"file_{name}"] for name in FILE_COLUMNS}
+                rows = {name: data[f"row_{name}"] for name in ROW_COLUMNS}
+        except (OSError, KeyError, ValueError):
+            return
+        for i, path in enumerate(columns["path"].tolist()):
+            self.files[path] = {name: columns[name][i].item() for name in FILE_COLUMNS}
+            mask = rows["file"] == i
+            self.rows[path] = {name: rows[name][mask] for name in ROW_COLUMNS if name != "file"}
+
+    def save(self):
+        if not self.path:
+            return
+        paths = list(self.files)
+        arrays = {"version": np.array(CACHE_VERSION)}
+        for name in FILE_COLUMNS:
+            arrays[f"file_{name}"] = np.array([self.files[p][name] for p in paths])
+        arrays["row_file"] = np.concatenate(
+            [np.full(len(self.rows[p]["module"]), i, dtype=np.int32) for i, p in enumerate(paths)]
+        ) if paths else np.zeros(0, dtype=np.int32)
+        for name in ROW_COLUMNS[1:]:
+            parts = [self.rows[p][name] for p in paths]
+            arrays[f"row_{name}"] = np.concatenate(parts) if parts else np.zeros(0)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def get(self, path: str, dataset: str, model: str) -> Optional[Dict[str, np.ndarray]]:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if (cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns
+                and cached["dataset"] == dataset):
+            return self.rows[path]
+
+        counts = count_file(path, dataset)
+        if counts is None:
+            return None
+        modules = sorted(counts)
+        self.files[path] = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                            "dataset": dataset, "model": model}
+        self.rows[path] = {
+            "module": np.array(modules, dtype=str),
+            "n": np.array([counts[m]["total"] for m in modules], dtype=np.int32),
+            "compiled": np.array([counts[m]["compiled"] for m in modules], dtype=np.int32),
+            "passed": np.array([counts[m]["passed"] for m in modules], dtype=np.int32),
+        }
+        self.parsed.append(path)
+        return self.rows[path]
+
+
+def load_runs(paths: Sequence[str], cache: CountCache, default_dataset: Optional[str] = None) -> List[Dict[str, Any]]:
+    runs = []
+    labels = set()
+    for path in paths:
+        run = infer_run(path, default_dataset)
+        run["path"] = os.path.abspath(path)
+        rows = cache.get(path, run["dataset"], run["model"])
+        if rows is None:
+            # 首次通过即停止的结果不能用标准的pass@k估计，与固定样本数的运行放在一起没有可比性
+            print(f"跳过自适应采样的结果 {path}（用 report 查看其前k个样本的pass@k）")
+            continue
+        run.update(rows)
+        # 同一数据集下同名模型（如pass1与pass5）用文件名区分
+        label = run["model"]
+        if (run["dataset"], label) in labels:
+            label = f"{label}@{os.path.splitext(os.path.basename(path))[0]}"
+        labels.add((run["dataset"], label))
+        run["label"] = label
+        runs.append(run)
+    return runs
+
+
+def build_matrix(runs: List[Dict[str, Any]], ks=None, n_boot: int = 1000) -> List[Dict[str, Any]]:
+    """每个 (模型, 数据集, 指标, k) 一行"""
+    rows = []
+    for run in runs:
+        for metric, counts in (("syntax", run["compiled"]), ("functional", run["passed"])):
+            for k, stats in summarize(run["n"], counts, ks, n_boot=n_boot).items():
+                rows.append({"model": run["label"], "dataset": run["dataset"], "metric": metric, "k": k,
+                             "mean": stats["mean"], "low": stats["low"], "high": stats["high"],
+                             "modules": stats["modules"]})
+    return rows
+
+
+def per_problem_deltas(runs: List[Dict[str, Any]], baseline: str) -> Dict[str, Any]:
+    """各模型相对基准模型的逐题功能pass@1之差（同一数据集、双方都有的模块）"""
+    deltas: Dict[str, Any] = {}
+    base_runs = {run["dataset"]: run for run in runs if run["label"] == baseline}
+    for run in runs:
+        base = base_runs.get(run["dataset"])
+        if base is None or run is base:
+            continue
+        common, i, j = np.intersect1d(run["module"], base["module"], return_indices=True)
+        diff = (pass_at_k(run["n"][i], run["passed"][i], 1)
+                - pass_at_k(base["n"][j], base["passed"][j], 1))
+        order = np.argsort(-np.abs(diff), kind="stable")
+        deltas.setdefault(run["label"], {})[run["dataset"]] = {
+            "wins": int((diff > 0).sum()),
+            "losses": int((diff < 0).sum()),
+            "ties": int((diff == 0).sum()),
+            "modules": {str(common[x]): float(diff[x]) for x in order if diff[x] != 0},
+        }
+    return deltas
+
+
+def print_report(matrix: List[Dict[str, Any]], deltas: Dict[str, Any], baseline: Optional[str], top: int = 5):
+    datasets = sorted({row["dataset"] for row in matrix})
+    columns = sorted({(row["metric"], row["k"]) for row in matrix}, key=lambda c: (c[0] != "functional", c[1]))
+    cells = {(row["model"], row["dataset"], row["metric"], row["k"]): row for row in matrix}
+    models = list(dict.fromkeys(row["model"] for row in matrix))
+
+    for dataset in datasets:
+        print(f"\n数据集 {dataset}")
+        header = f"{'模型':<28}" + "".join(f"{metric[:4]}@{k:<7}" for metric, k in columns)
+        print(header)
+        print("-" * len(header))
+        for model in models:
+            if not any((model, dataset, m, k) in cells for m, k in columns):
+                continue
+            values = [cells.get((model, dataset, m, k)) for m, k in columns]
+            print(f"{model:<28}" + "".join(f"{v['mean']:<12.4f}" if v else f"{'-':<12}" for v in values))
+
+    if deltas:
+        print(f"\n相对 {baseline} 的逐题功能pass@1差异:")
+        for model, per_dataset in deltas.items():
+            for dataset, result in per_dataset.items():
+                changed = list(result["modules"].items())[:top]
+                detail = ", ".join(f"{name} {delta:+.2f}" for name, delta in changed)
+                print(f"  {model:<28} {dataset:<16} 胜 {result['wins']:>3}  负 {result['losses']:>3}  "
+                      f"平 {result['ties']:>3}  {detail}")
+
+
+def write_csv(matrix: List[Dict[str, Any]], path: str):
+    fields = ["model", "dataset", "metric", "k", "mean", "low", "high", "modules"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(matrix)
+
+
+def expand_paths(patterns: Sequence[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def run_compare(args) -> Dict[str, Any]:
+    paths = expand_paths(args.files)
+    cache = CountCache(None if args.no_cache else args.cache)
+    runs = load_runs(paths, cache, args.dataset)
+    cache.save()
+    print(f"共 {len(runs)} 个结果文件，本次解析 {len(cache.parsed)} 个，其余来自缓存 {args.cache}"
+          if not args.no_cache else f"共 {len(runs)} 个结果文件")
+
+    ks = [int(k) for k in args.ks.split(",")] if args.ks else None
+    matrix = build_matrix(runs, ks, n_boot=args.bootstrap)
+    baseline = args.baseline or (runs[0]["label"] if runs else None)
+    deltas = per_problem_deltas(runs, baseline) if baseline else {}
+    print_report(matrix, deltas, baseline, top=args.top)
+
+    report = {"files": [run["path"] for run in runs], "baseline": baseline, "matrix": matrix, "deltas": deltas}
+    if args.csv:
+        write_csv(matrix, args.csv)
+        print(f"\n矩阵已导出到 {args.csv}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"报告已导出到 {args.json}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多个测试结果文件的横向对比")
+    add_compare_arguments(parser)
+    run_compare(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+tools/compare.py 的命令行参数
+
+只依赖标准库，verilog_bench.py 构建 compare 子命令时导入，不加载numpy等依赖；
+两个入口共用同一份参数定义。
+"""
+import argparse
+
+from tools.datasets import DATASETS
+
+
+def add_compare_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("files", nargs="+", help="已测试的结果文件（支持通配符）")
+    parser.add_argument("--dataset", choices=DATASETS, help="文件不在数据集目录下时使用的数据集")
+    parser.add_argument("--ks", help="逗号分隔的k值，默认1,5,10,...中不超过样本数的值")
+    parser.add_argument("--baseline", help="逐题对比的基准模型，默认为第一个文件的模型")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="置信区间的重采样次数，0表示不计算")
+    parser.add_argument("--top", type=int, default=5, help="每个模型显示差异最大的题目数")
+    parser.add_argument("--cache", default="compare_cache.npz", help="逐模块计数的缓存文件")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--csv", help="矩阵导出为CSV")
+    parser.add_argument("--json", help="矩阵和逐题差异导出为JSON")
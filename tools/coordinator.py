@@ -0,0 +1,330 @@
+"""
+单机上多个测试任务之间的公平调度
+
+同一台机器上同时运行多个测试任务时，各自按整机资源并发会互相抢占，大任务会让小任务
+排队很久。协调器是一个本机常驻进程，管理固定数量的仿真槽位；测试任务启动时向它
+注册（名称、权重、优先级、样本数），每次编译仿真前申请一个槽位，结束后归还。
+
+调度规则:
+    1. 优先级高的任务先分配；
+    2. 同一优先级内按加权公平份额：每个任务累计占用的槽位时间除以权重（虚拟时间），
+       空出的槽位给虚拟时间最小的任务。新任务的虚拟时间从当前活动任务的最小值开始，
+       不会因为之前没有运行而积累额度；
+    3. 样本数不超过 --small-job 的任务权重乘以 --small-boost，小任务很快完成。
+占用时间在分配时按该任务的平均占用时长预估计入，归还时按实际时长修正。
+连接断开（任务退出或崩溃）时自动归还槽位并注销任务。
+
+协议为Unix套接字上逐行的JSON消息；注销时返回该任务的排队等待统计。
+
+使用方法:
+    python -m tools.coordinator serve --slots 32
+    python -m tools.coordinator status
+    python verilog_bench.py evaluate --dataset rtllm_v2 --solutions pass5_x.json --coordinator /tmp/verilog_eval_coordinator.sock
+
+    client = CoordinatorClient.connect(path, name="sweep", weight=1, total=10000)
+    with client.slot():
+        check_solution(...)
+    print(client.close())      # {"granted": ..., "wait_p50": ..., "wait_p95": ..., ...}
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SOCKET = "/tmp/verilog_eval_coordinator.sock"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+class _Job:
+    def __init__(self, job_id: int, name: str, weight: float, priority: int, total: Optional[int], vtime: float):
+        self.job_id = job_id
+        self.name = name
+        self.weight = weight
+        self.priority = priority
+        self.total = total
+        self.vtime = vtime
+        self.pending: List[Any] = []        # [(future, 申请时间)]，先到先得
+        self.running = 0
+        self.granted = 0
+        self.busy = 0.0                     # 实际占用的槽位时间（秒）
+        self.waits: List[float] = []
+        self.registered_at = time.monotonic()
+
+    def estimate(self, default: float) -> float:
+        return self.busy / self.granted if self.granted and self.busy > 0 else default
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id, "name": self.name, "weight": self.weight, "priority": self.priority,
+            "total": self.total, "granted": self.granted, "running": self.running, "queued": len(self.pending),
+            "busy_seconds": round(self.busy, 3),
+            "wait_mean": sum(self.waits) / len(self.waits) if self.waits else 0.0,
+            "wait_p50": _percentile(self.waits, 0.5), "wait_p95": _percentile(self.waits, 0.95),
+            "wait_max": max(self.waits, default=0.0),
+            "age": time.monotonic() - self.registered_at,
+        }
+
+
+class Coordinator:
+    def __init__(self, slots: int, small_job: int = 100, small_boost: float = 4.0):
+        self.slots = slots
+        self.free = slots
+        self.small_job = small_job
+        self.small_boost = small_boost
+        self.jobs: Dict[int, _Job] = {}
+        self._ids = itertools.count(1)
+        self._mean_busy = 1.0               # 所有任务的平均占用时长，新任务的预估值
+
+    def register(self, name: str, weight: float = 1.0, priority: int = 0, total: Optional[int] = None) -> _Job:
+        if weight <= 0:
+            raise ValueError("权重必须大于0")
+        if total is not None and total <= self.small_job:
+            weight *= self.small_boost
+        vtime = min((job.vtime for job in self.jobs.values()), default=0.0)
+        job = _Job(next(self._ids), name, weight, priority, total, vtime)
+        self.jobs[job.job_id] = job
+        return job
+
+    def unregister(self, job: _Job) -> Dict[str, Any]:
+        self.jobs.pop(job.job_id, None)
+        for future, _ in job.pending:
+            if not future.done():
+                future.cancel()
+        job.pending.clear()
+        return job.stats()
+
+    def acquire(self, job: _Job) -> "asyncio.Future":
+        future = asyncio.get_running_loop().create_future()
+        job.pending.append((future, time.monotonic()))
+        self._dispatch()
+        return future
+
+    def release(self, job: _Job, started: float, estimate: float):
+        held = time.monotonic() - started
+        job.running -= 1
+        job.busy += held
+        job.vtime += (held - estimate) / job.weight
+        self._mean_busy = 0.9 * self._mean_busy + 0.1 * held
+        self.free += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.free > 0:
+            waiting = [job for job in self.jobs.values() if job.pending]
+            if not waiting:
+                return
+            job = min(waiting, key=lambda j: (-j.priority, j.vtime, j.job_id))
+            future, requested = job.pending.pop(0)
+            if future.done():
+                continue
+            estimate = job.estimate(self._mean_busy)
+            job.vtime += estimate / job.weight
+            job.running += 1
+            job.granted += 1
+            wait = time.monotonic() - requested
+            job.waits.append(wait)
+            self.free -= 1
+            future.set_result({"wait": wait, "estimate": estimate})
+
+    def status(self) -> Dict[str, Any]:
+        return {"slots": self.slots, "free": self.free, "jobs": [job.stats() for job in self.jobs.values()]}
+
+
+# ---------------- 服务端 ----------------
+async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def _handle(coordinator: Coordinator, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """一个连接要么是任务的控制连接（register），要么是某个工作线程的槽位连接（acquire/release）"""
+    owned: Optional[_Job] = None
+    holding = None                          # (job, 分配时间, 预估占用)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            op = message.get("op")
+            if op == "register":
+                owned = coordinator.register(message.get("name", "job"), float(message.get("weight", 1.0)),
+                                             int(message.get("priority", 0)), message.get("total"))
+                await _send(writer, {"ok": True, "job_id": owned.job_id})
+            elif op == "acquire":
+                job = coordinator.jobs.get(message.get("job_id"))
+                if job is None or holding is not None:
+                    await _send(writer, {"ok": False, "error": "未注册的任务或已持有槽位"})
+                    continue
+                grant = await coordinator.acquire(job)
+                holding = (job, time.monotonic(), grant["estimate"])
+                await _send(writer, {"ok": True, "wait": grant["wait"]})
+            elif op == "release":
+                if holding is not None:
+                    coordinator.release(*holding)
+                    holding = None
+                await _send(writer, {"ok": True})
+            elif op == "unregister" and owned is not None:
+                await _send(writer, {"ok": True, "stats": coordinator.unregister(owned)})
+                owned = None
+            elif op == "status":
+                await _send(writer, {"ok": True, **coordinator.status()})
+            else:
+                await _send(writer, {"ok": False, "error": f"未知操作 {op}"})
+    except (ConnectionError, asyncio.CancelledError, json.JSONDecodeError, ValueError):
+        pass
+    finally:
+        # 连接断开：归还持有的槽位，注销该连接注册的任务
+        if holding is not None:
+            coordinator.release(*holding)
+        if owned is not None:
+            coordinator.unregister(owned)
+        writer.close()
+
+
+async def serve(socket_path: str, coordinator: Coordinator):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(lambda r, w: _handle(coordinator, r, w), path=socket_path)
+    print(f"调度协调器: {socket_path}，{coordinator.slots} 个仿真槽位")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# ---------------- 客户端 ----------------
+class _Connection:
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rwb")
+
+    def call(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        self.file.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("协调器连接已断开")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "协调器返回错误"))
+        return reply
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.sock.close()
+
+
+class CoordinatorClient:
+    """任务端：一个控制连接 + 每个工作线程一个槽位连接，线程安全"""
+
+    def __init__(self, path: str, name: str, weight: float = 1.0, priority: int = 0, total: Optional[int] = None):
+        self.path = path
+        self._control = _Connection(path)
+        self.job_id = self._control.call({"op": "register", "name": name, "weight": weight,
+                                          "priority": priority, "total": total})["job_id"]
+        self._local = threading.local()
+        self._connections: List[_Connection] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, path: Optional[str], name: str, **kwargs) -> Optional["CoordinatorClient"]:
+        """协调器未运行时给出警告并返回None（不限制并发）"""
+        if not path:
+            return None
+        try:
+            return cls(path, name, **kwargs)
+        except OSError as e:
+            print(f"警告: 无法连接调度协调器 {path}（{e}），按不受限的并发运行")
+            return None
+
+    def _connection(self) -> _Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _Connection(self.path)
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def slot(self):
+        """在协调器分配的槽位内执行；返回值为本次排队等待的秒数"""
+        connection = self._connection()
+        wait = connection.call({"op": "acquire", "job_id": self.job_id})["wait"]
+        try:
+            yield wait
+        finally:
+            connection.call({"op": "release"})
+
+    def close(self) -> Dict[str, Any]:
+        """注销任务，返回该任务的槽位与排队等待统计"""
+        try:
+            stats = self._control.call({"op": "unregister"})["stats"]
+        finally:
+            self._control.close()
+            with self._lock:
+                for connection in self._connections:
+                    connection.close()
+                self._connections.clear()
+        return stats
+
+
+def print_wait_stats(stats: Dict[str, Any]):
+    print(f"\n调度协调器: 获得槽位 {stats['granted']} 次，占用 {stats['busy_seconds']:.1f}s，"
+          f"排队等待 均值 {stats['wait_mean']:.3f}s p50 {stats['wait_p50']:.3f}s "
+          f"p95 {stats['wait_p95']:.3f}s 最长 {stats['wait_max']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单机测试任务的公平调度协调器")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="启动协调器")
+    p.add_argument("--slots", type=int, default=os.cpu_count() or 1, help="同时运行的仿真数，默认为CPU核数")
+    p.add_argument("--small-job", type=int, default=100, help="样本数不超过该值的任务视为小任务")
+    p.add_argument("--small-boost", type=float, default=4.0, help="小任务的权重倍数")
+
+    sub.add_parser("status", help="查看活动任务、槽位占用和排队等待")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        coordinator = Coordinator(args.slots, small_job=args.small_job, small_boost=args.small_boost)
+        try:
+            asyncio.run(serve(args.socket, coordinator))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    connection = _Connection(args.socket)
+    try:
+        status = connection.call({"op": "status"})
+    finally:
+        connection.close()
+    print(f"槽位 {status['slots'] - status['free']}/{status['slots']} 使用中")
+    print(f"{'ID':<5} {'任务':<24} {'优先级':<7} {'权重':<7} {'运行':<6} {'排队':<6} {'已分配':<8} "
+          f"{'等待p50':<9} {'等待p95':<9}")
+    for job in status["jobs"]:
+        print(f"{job['job_id']:<5} {job['name']:<24} {job['priority']:<7} {job['weight']:<7g} {job['running']:<6} "
+              f"{job['queued']:<6} {job['granted']:<8} {job['wait_p50']:<9.3f} {job['wait_p95']:<9.3f}")
+
+
+if __name__ == "__main__":
+    main()
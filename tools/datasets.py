@@ -0,0 +1,19 @@
+"""
+数据集列表与按路径加载数据集脚本
+
+只依赖标准库，供测试服务、基准、对比报告等工具共用，导入时不加载压测或模拟服务。
+"""
+import importlib.util
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS = ["resbench", "rtllm_v2", "verilogeval_v2"]
+
+
+def load_dataset_module(dataset: str, script: str):
+    """按文件路径加载某个数据集目录下的脚本，避免三个同名模块互相覆盖"""
+    path = os.path.join(ROOT_DIR, dataset, f"{script}.py")
+    spec = importlib.util.spec_from_file_location(f"{dataset}_{script}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,231 @@
+"""
+常驻的功能测试服务，供强化学习训练中的奖励计算调用
+
+启动时加载各数据集的测试台（一次），并预先创建固定数量的工作线程，每个线程有自己
+常驻的临时目录（沙箱），之后的请求直接在这些目录中编译仿真，不再为每个批次启动
+functional_correctness.py、重新读取 problems_*.jsonl 或重写结果文件。测试逻辑在
+tools/evaluator.py 中，同一进程内调用时直接使用 tools.evaluator.evaluate。
+
+接口（HTTP，监听本地端口或Unix套接字）:
+    POST /evaluate  {"dataset": "rtllm_v2", "samples": [{"module_name": ..., "solution": ...}, ...],
+                     "deadline": 30, "request_id": "step-12"}
+                    -> {"request_id", "elapsed", "verdicts": [{"module_name", "status", "category",
+                        "compiled", "passed", "cancelled", "elapsed", "timing"}, ...]}
+    POST /cancel    {"request_id": "step-12"}   取消尚未开始的样本
+    GET  /health    已加载的数据集、工作线程数和进行中的请求
+    GET  /metrics   Prometheus文本格式的指标（见 tools/metrics.py）
+
+deadline 为从收到请求起的秒数：到期或被取消时尚未开始的样本直接返回 cancelled；
+已开始的样本仿真超时取 min(--timeout, 剩余时间)，因此整个请求在截止时间附近返回；
+超时若是被截止时间缩短的，该样本也返回 cancelled，而不是"仿真超时"的失败判定。
+同一批次中 (模块, 代码) 相同的样本只测试一次。
+
+使用方法:
+    python -m tools.eval_server --port 8765 --workers 16
+    python -m tools.eval_server --socket /tmp/verilog_eval.sock --datasets verilogeval_v2
+
+    from tools.eval_server import evaluate_remote
+    result = evaluate_remote("unix:/tmp/verilog_eval.sock", "verilogeval_v2", samples, deadline=30)
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+from tools.coordinator import CoordinatorClient
+from tools.evaluator import Evaluator
+from tools.datasets import DATASETS
+from tools.metrics import Registry
+
+
+class EvalService:
+    """HTTP接口背后的状态：预先加载全部数据集的 Evaluator 及其指标"""
+
+    def __init__(self, datasets: Sequence[str] = DATASETS, workers: Optional[int] = None, timeout: float = 5,
+                 coordinator=None):
+        self.datasets = list(datasets)
+        self.registry = Registry()
+        self.evaluator = Evaluator(self.datasets, workers=workers, timeout=timeout, registry=self.registry,
+                                   coordinator=coordinator)
+
+    def evaluate_batch(self, dataset: str, samples: List[Dict[str, str]], deadline: Optional[float] = None,
+                       request_id: Optional[str] = None) -> Dict[str, Any]:
+        if dataset not in self.datasets:
+            raise ValueError(f"未加载的数据集: {dataset}")
+        request_id = request_id or uuid.uuid4().hex
+        start = time.perf_counter()
+        verdicts = self.evaluator.evaluate(samples, dataset, deadline=deadline, request_id=request_id)
+        return {"request_id": request_id, "elapsed": time.perf_counter() - start,
+                "verdicts": [asdict(verdict) for verdict in verdicts]}
+
+    def cancel(self, request_id: str) -> bool:
+        return self.evaluator.cancel(request_id)
+
+    def health(self) -> Dict[str, Any]:
+        return {"datasets": {name: len(self.evaluator.testbenches[name]) for name in self.datasets},
+                "workers": self.evaluator.workers, "timeout": self.evaluator.timeout,
+                "in_flight": self.evaluator.in_flight()}
+
+    def close(self):
+        self.evaluator.close()
+
+
+# ---------------- HTTP接口 ----------------
+def _make_handler(service: EvalService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, code: int, payload: Any, content_type: str = "application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, service.health())
+            elif self.path == "/metrics":
+                self._reply(200, service.registry.render().encode("utf-8"), "text/plain; version=0.0.4")
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/evaluate":
+                    self._reply(200, service.evaluate_batch(
+                        payload["dataset"], payload.get("samples", []),
+                        deadline=payload.get("deadline"), request_id=payload.get("request_id")))
+                elif self.path == "/cancel":
+                    self._reply(200, {"cancelled": service.cancel(payload["request_id"])})
+                else:
+                    self._reply(404, {"error": "not found"})
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler 需要 (host, port) 形式的客户端地址
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(service: EvalService, port: Optional[int] = None, host: str = "127.0.0.1",
+                socket_path: Optional[str] = None):
+    handler = _make_handler(service)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port or 0), handler)
+    server.daemon_threads = True
+    return server
+
+
+# ---------------- 客户端 ----------------
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+def _connection(address: str, timeout: Optional[float]) -> http.client.HTTPConnection:
+    """address 为 "unix:/path/to.sock" 或 "http://host:port" """
+    if address.startswith("unix:"):
+        return _UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    return http.client.HTTPConnection(address.split("://", 1)[-1].rstrip("/"), timeout=timeout)
+
+
+def _request(address: str, method: str, path: str, payload: Any = None, timeout: Optional[float] = None):
+    connection = _connection(address, timeout)
+    try:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} 失败 ({response.status}): {data.get('error')}")
+        return data
+    finally:
+        connection.close()
+
+
+def evaluate_remote(address: str, dataset: str, samples: List[Dict[str, str]], deadline: Optional[float] = None,
+                    request_id: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """向服务提交一个批次并等待结果；timeout 为连接超时，默认比deadline多留30秒"""
+    if timeout is None and deadline:
+        timeout = deadline + 30
+    return _request(address, "POST", "/evaluate", {"dataset": dataset, "samples": samples,
+                                                    "deadline": deadline, "request_id": request_id}, timeout)
+
+
+def cancel_remote(address: str, request_id: str) -> bool:
+    return _request(address, "POST", "/cancel", {"request_id": request_id}, timeout=10)["cancelled"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻的功能测试服务")
+    parser.add_argument("--datasets", default=",".join(DATASETS), help="逗号分隔的数据集")
+    parser.add_argument("--workers", type=int, default=None, help="工作线程数，默认为CPU核数")
+    parser.add_argument("--timeout", type=float, default=5, help="仿真超时（秒）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="监听Unix套接字而不是TCP端口")
+    parser.add_argument("--coordinator", help="向该调度协调器申请仿真槽位（见 tools/coordinator.py）")
+    parser.add_argument("--job-weight", type=float, default=1.0)
+    parser.add_argument("--job-priority", type=int, default=0)
+    args = parser.parse_args()
+
+    datasets = [d.strip() for d in args.datasets.split(",") if d.strip()]
+    coordinator = CoordinatorClient.connect(args.coordinator, name="eval_server", weight=args.job_weight,
+                                            priority=args.job_priority)
+    start = time.perf_counter()
+    service = EvalService(datasets, workers=args.workers, timeout=args.timeout, coordinator=coordinator)
+    loaded = ", ".join(f"{name} {count}题" for name, count in service.health()["datasets"].items())
+    print(f"已加载 {loaded}，{service.evaluator.workers} 个工作线程就绪（{time.perf_counter() - start:.2f}s）")
+
+    server = make_server(service, port=args.port, host=args.host, socket_path=args.socket)
+    address = f"unix:{args.socket}" if args.socket else f"http://{args.host}:{server.server_address[1]}"
+    print(f"测试服务: {address}")
+    # SIGTERM 与 Ctrl-C 一样正常退出，清理套接字文件和沙箱目录
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在关闭...")
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        service.close()
+        if coordinator is not None:
+            coordinator.close()
+
+
+if __name__ == "__main__":
+    main()
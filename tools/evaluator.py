@@ -0,0 +1,257 @@
+"""
+进程内的批量功能测试接口
+
+evaluate(batch, dataset=..., workers=...) 直接测试内存中的 (模块名, 代码) 对并返回
+结构化的判定，不读写解决方案JSON，也不切换工作目录。测试台在首次使用某数据集时
+加载一次；线程池和每个工作线程常驻的临时目录在多次调用之间复用，适合放在训练循环
+内部调用。tools/eval_server.py 在此基础上提供HTTP / Unix套接字服务。
+
+使用方法:
+    from tools.evaluator import evaluate
+    verdicts = evaluate([("Prob001_zero", code1), ("Prob002_m2014_q4i", code2)],
+                        dataset="verilogeval_v2", workers=16)
+    rewards = [1.0 if v.passed else 0.0 for v in verdicts]
+
+    # 需要多个独立的线程池或截止时间/取消时直接使用 Evaluator
+    with Evaluator(workers=8, timeout=2) as evaluator:
+        verdicts = evaluator.evaluate(batch, "rtllm_v2", deadline=30, request_id="step-12")
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from tools.datasets import ROOT_DIR, load_dataset_module
+from tools.problem_index import ProblemIndex
+from tools.results_db import classify_status
+
+Sample = Union[Tuple[str, str], Dict[str, str]]
+
+
+@dataclass
+class Verdict:
+    module_name: str
+    status: str                 # 原始判定，与解决方案文件中的pass字段一致
+    category: str               # 归类状态，见 tools.results_db.STATUSES
+    compiled: bool
+    passed: bool
+    cancelled: bool = False     # 因截止时间或取消而未测试，或仿真因截止时间被提前终止
+    elapsed: float = 0.0
+    timing: Dict[str, float] = field(default_factory=dict)
+
+
+class _Job:
+    def __init__(self, deadline: Optional[float]):
+        self.deadline_at = time.monotonic() + deadline if deadline else None
+        self.cancelled = threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline_at is None else self.deadline_at - time.monotonic()
+
+
+def _normalize(sample: Sample) -> Tuple[str, str]:
+    if isinstance(sample, dict):
+        return sample.get("module_name"), sample.get("solution") or ""
+    module_name, code = sample
+    return module_name, code or ""
+
+
+class Evaluator:
+    """
+    常驻的线程池 + 每个线程一个临时目录，evaluate 可被多个线程并发调用
+
+    datasets 为启动时预先加载的数据集，其余数据集在首次使用时加载；registry 不为None时
+    为每个数据集注册 tools.metrics.EvaluationMetrics；coordinator 为
+    tools.coordinator.CoordinatorClient 时每次编译仿真前向协调器申请槽位。
+    """
+
+    def __init__(self, datasets: Sequence[str] = (), workers: Optional[int] = None, timeout: float = 5,
+                 registry=None, coordinator=None):
+        self.timeout = timeout
+        self.workers = workers or os.cpu_count() or 1
+        self.registry = registry
+        self.coordinator = coordinator
+        self.modules: Dict[str, Any] = {}
+        self.testbenches: Dict[str, Dict[str, str]] = {}
+        self.headers: Dict[str, Dict[str, str]] = {}
+        self.metrics: Dict[str, Any] = {}
+        self._load_lock = threading.Lock()
+        self._jobs: Dict[str, _Job] = {}
+        self._jobs_lock = threading.Lock()
+        self._local = threading.local()
+        self._sandboxes: List[str] = []
+        self._sandboxes_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="eval-worker")
+        for dataset in datasets:
+            self.load(dataset)
+        self._warm_up()
+
+    def load(self, dataset: str):
+        """加载数据集的测试脚本和全部测试台（只加载一次）"""
+        with self._load_lock:
+            if dataset in self.modules:
+                return
+            path = os.path.join(ROOT_DIR, dataset, f"problems_{dataset}.jsonl")
+            if not os.path.exists(path):
+                raise ValueError(f"未知的数据集: {dataset}")
+            with ProblemIndex(path) as index:
+                self.testbenches[dataset] = {name: index.testbench(name) for name in index.names()}
+                self.headers[dataset] = {name: index.light(name)["module_header"] for name in index.names()}
+            if self.registry is not None:
+                from tools.metrics import EvaluationMetrics
+
+                self.metrics[dataset] = EvaluationMetrics(self.registry, dataset)
+            self.modules[dataset] = load_dataset_module(dataset, "functional_correctness")
+
+    def _sandbox(self) -> str:
+        """当前工作线程的常驻临时目录，首次使用时创建"""
+        work_dir = getattr(self._local, "work_dir", None)
+        if work_dir is None:
+            work_dir = self._local.work_dir = tempfile.mkdtemp(prefix="verilog_eval_worker_")
+            with self._sandboxes_lock:
+                self._sandboxes.append(work_dir)
+        return work_dir
+
+    def _warm_up(self):
+        # 线程池按需创建线程：提交与线程数相同、互相等待的任务，确保所有线程和沙箱就绪
+        barrier = threading.Barrier(self.workers)
+
+        def ready():
+            self._sandbox()
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+
+        for future in [self._executor.submit(ready) for _ in range(self.workers)]:
+            future.result()
+
+    def _run_one(self, job: _Job, dataset: str, module_name: str, code: str) -> Verdict:
+        metrics = self.metrics.get(dataset)
+        remaining = job.remaining()
+        if job.cancelled.is_set() or (remaining is not None and remaining <= 0):
+            if metrics is not None:
+                metrics.remaining.dec(dataset=dataset)
+            reason = "请求已取消" if job.cancelled.is_set() else "超过截止时间"
+            return Verdict(module_name, f"错误: {reason}", "error", False, False, cancelled=True)
+
+        timeout = self.timeout if remaining is None else max(0.1, min(self.timeout, remaining))
+        stats = {}
+        start = time.perf_counter()
+        with self.coordinator.slot() if self.coordinator is not None else nullcontext():
+            status, compiled = self.modules[dataset].check_solution(
+                code, self.testbenches[dataset][module_name], work_dir=self._sandbox(), timeout=timeout,
+                stats=stats, module_header=self.headers[dataset][module_name])
+        elapsed = time.perf_counter() - start
+        if metrics is not None:
+            metrics.record_solution(status, compiled, stats)
+        category, _, passed = classify_status(status)
+        if category == "timeout" and timeout < self.timeout:
+            # 仿真超时由截止时间缩短所致，并不说明设计本身会超时，不能作为判定返回
+            return Verdict(module_name, "错误: 超过截止时间（仿真未完成）", "error", compiled, False, cancelled=True,
+                           elapsed=elapsed, timing=stats["timing"])
+        return Verdict(module_name, status, category, compiled, passed, elapsed=elapsed, timing=stats["timing"])
+
+    def evaluate(self, batch: Iterable[Sample], dataset: str, deadline: Optional[float] = None,
+                 request_id: Optional[str] = None) -> List[Verdict]:
+        """
+        测试一个批次，按输入顺序返回判定
+
+        batch 的元素为 (module_name, code) 或 {"module_name", "solution"}；批次中相同的
+        (模块, 代码) 只测试一次。deadline 为秒数：到期或 cancel(request_id) 后尚未开始的
+        样本返回 cancelled，已开始的样本仿真超时不超过剩余时间；仿真因此被提前终止的样本
+        同样返回 cancelled，而不是仿真超时的判定。
+        """
+        self.load(dataset)
+        samples = [_normalize(sample) for sample in batch]
+        job = _Job(deadline)
+        if request_id is not None:
+            with self._jobs_lock:
+                if request_id in self._jobs:
+                    raise ValueError(f"请求ID重复: {request_id}")
+                self._jobs[request_id] = job
+
+        testbenches = self.testbenches[dataset]
+        metrics = self.metrics.get(dataset)
+        futures = {}
+        try:
+            for module_name, code in dict.fromkeys(samples):
+                if module_name not in testbenches:
+                    continue
+                if metrics is not None:
+                    metrics.remaining.inc(dataset=dataset)
+                futures[(module_name, code)] = self._executor.submit(self._run_one, job, dataset, module_name, code)
+
+            verdicts = []
+            for module_name, code in samples:
+                future = futures.get((module_name, code))
+                if future is None:
+                    verdicts.append(Verdict(module_name, f"错误: 未知模块 {module_name}", "error", False, False))
+                else:
+                    verdicts.append(future.result())
+            return verdicts
+        finally:
+            # 调用方被中断时，尚未开始的样本不再执行
+            job.cancelled.set()
+            if request_id is not None:
+                with self._jobs_lock:
+                    self._jobs.pop(request_id, None)
+
+    def cancel(self, request_id: str) -> bool:
+        with self._jobs_lock:
+            job = self._jobs.get(request_id)
+        if job is None:
+            return False
+        job.cancelled.set()
+        return True
+
+    def in_flight(self) -> List[str]:
+        with self._jobs_lock:
+            return list(self._jobs)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._sandboxes_lock:
+            for work_dir in self._sandboxes:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            self._sandboxes.clear()
+
+    def __enter__(self) -> "Evaluator":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default: Optional[Evaluator] = None
+_default_lock = threading.Lock()
+
+
+def get_evaluator(workers: Optional[int] = None, timeout: float = 5) -> Evaluator:
+    """进程内共用的 Evaluator；workers / timeout 改变时关闭旧的线程池并重新创建"""
+    global _default
+    with _default_lock:
+        wanted = workers or os.cpu_count() or 1
+        if _default is None or _default.workers != wanted or _default.timeout != timeout:
+            if _default is not None:
+                _default.close()
+            _default = Evaluator(workers=wanted, timeout=timeout)
+        return _default
+
+
+def evaluate(batch: Iterable[Sample], dataset: str, workers: Optional[int] = None, timeout: float = 5,
+             deadline: Optional[float] = None) -> List[Verdict]:
+    """用共用的 Evaluator 测试一个批次，见 Evaluator.evaluate"""
+    return get_evaluator(workers, timeout).evaluate(batch, dataset, deadline=deadline)
+
+
+@atexit.register
+def _close_default():
+    if _default is not None:
+        _default.close()
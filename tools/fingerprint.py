@@ -0,0 +1,74 @@
+"""
+增量测试使用的判定指纹
+
+每个判定记录三个指纹:
+    testbench  该题测试台内容及其在仿真时读取的数据文件（如 rtllm_v2/test_file/ 下的参考数据）的sha256
+    solution   解决方案代码的sha256（与 tools/results_db.py 中 solutions 表的键相同）
+    toolchain  iverilog / vvp 的版本、仿真超时和其他影响判定的设置（如接口预检查）的sha256
+三者都与当前一致时，已有的判定仍然有效；修正某道题的测试台或参考数据后只有该题的解决方案
+需要重新仿真，升级iverilog或修改超时等设置后全部重新仿真。
+
+使用方法:
+    toolchain = toolchain_fingerprint(5, interface_precheck=True)
+    fingerprint = make_fingerprint(testbench_fingerprint(testbench, data_dir), code, toolchain)
+    if is_current(solution_entry, fingerprint):
+        ...   # 沿用 solution_entry["pass"]
+"""
+import hashlib
+import os
+import subprocess
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _tool_version(cmd) -> str:
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return "missing"
+    lines = (process.stdout or process.stderr).strip().splitlines()
+    return lines[0] if lines else ""
+
+
+def testbench_fingerprint(testbench: str, data_dir: Optional[str] = None) -> str:
+    """
+    测试台内容 + data_dir 中被该测试台引用（文件名出现在测试台中）的数据文件内容
+
+    data_dir 为None时等于 text_hash(testbench)。
+    """
+    if not data_dir or not os.path.isdir(data_dir):
+        return text_hash(testbench)
+    digest = hashlib.sha256((testbench or "").encode("utf-8"))
+    for name in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, name)
+        if name in (testbench or "") and os.path.isfile(path):
+            digest.update(f"\0{name}\0".encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=8)
+def toolchain_fingerprint(timeout: float, **settings) -> str:
+    """
+    iverilog / vvp 版本行 + 仿真超时 + 影响判定的其他设置，进程内只查询一次
+
+    取默认值（False / None）的设置不计入，新增的可选设置不会使已有判定失效。
+    """
+    parts = [_tool_version(["iverilog", "-V"]), _tool_version(["vvp", "-V"]), f"timeout={timeout}"]
+    parts += [f"{name}={value}" for name, value in sorted(settings.items()) if value not in (False, None)]
+    return text_hash("\n".join(parts))
+
+
+def make_fingerprint(testbench_hash: str, code: str, toolchain: str) -> Dict[str, str]:
+    """testbench_hash 为 testbench_fingerprint(测试台, 数据目录)，同一题的多个样本只需计算一次"""
+    return {"testbench": testbench_hash, "solution": text_hash(code), "toolchain": toolchain}
+
+
+def is_current(solution_entry: Dict[str, Any], fingerprint: Dict[str, str]) -> bool:
+    """已有判定（pass字段非空）且记录的指纹与当前一致"""
+    return bool(solution_entry.get("pass")) and solution_entry.get("fingerprint") == fingerprint
@@ -0,0 +1,147 @@
+"""
+generate_api.py 压测工具
+
+启动本地模拟服务（或指向已有的OpenAI兼容端点），在不同并发设置下运行
+VerilogGenerator，报告吞吐（requests/s）、p50/p95/p99延迟和事件循环开销。
+
+使用方法:
+    python -m tools.load_test --dataset verilogeval_v2 --concurrency 5,20,50 --capacity 32
+    python -m tools.load_test --adaptive --concurrency 4 --capacity 40 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from tools.datasets import DATASETS, ROOT_DIR, load_dataset_module
+from tools.mock_server import MockOpenAIServer, add_mock_arguments, mock_config_from_args
+
+
+async def _monitor_loop_lag(interval: float, lags: List[float], stop: asyncio.Event):
+    """定时睡眠interval，实际醒来时间与预期之差即事件循环被占用的时间"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_once(gen_module, base_url: str, problems, concurrency: int, args) -> Dict[str, Any]:
+    if args.adaptive:
+        limiter = gen_module.AIMDConcurrencyLimiter(
+            concurrency, max_limit=args.max_concurrent_limit, log=print if args.verbose else None
+        )
+        max_workers = args.max_concurrent_limit
+    else:
+        limiter = gen_module.ConcurrencyLimiter(concurrency)
+        max_workers = concurrency
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers + 4))
+
+    generator = gen_module.VerilogGenerator(
+        args.api_key, base_url, args.model_name, stream=args.stream, limiter=limiter,
+        hedge_percentile=args.hedge_percentile,
+    )
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(_monitor_loop_lag(0.005, lags, stop))
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*[generator.process_problem(problem, args.k) for problem in problems])
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await monitor
+
+    latencies = [s["latency"] for s in generator.request_stats]
+    ttfts = [s["ttft"] for s in generator.request_stats]
+    pct = gen_module._percentile
+    result = {
+        "concurrency": concurrency,
+        "adaptive": args.adaptive,
+        "final_limit": int(limiter.limit),
+        "requests": len(latencies),
+        "wall_time": wall,
+        "requests_per_s": len(latencies) / wall if wall > 0 else 0.0,
+        "latency_p50": pct(latencies, 0.5),
+        "latency_p95": pct(latencies, 0.95),
+        "latency_p99": pct(latencies, 0.99),
+        "ttft_p50": pct(ttfts, 0.5),
+        "loop_lag_mean_ms": 1000 * sum(lags) / len(lags) if lags else 0.0,
+        "loop_lag_max_ms": 1000 * max(lags) if lags else 0.0,
+        "cpu_per_request_ms": 1000 * cpu / len(latencies) if latencies else 0.0,
+    }
+    if args.adaptive:
+        result["aimd_decisions"] = len(limiter.decisions)
+    if args.hedge_percentile is not None:
+        result["hedge"] = dict(generator.hedge_stats)
+    return result
+
+
+def print_table(results: List[Dict[str, Any]]):
+    header = f"{'并发':<6} {'最终上限':<8} {'请求数':<8} {'req/s':<9} {'p50(s)':<8} {'p95(s)':<8} {'p99(s)':<8} {'循环延迟均值/最大(ms)':<22} {'429':<6}"
+    print(header)
+    print("-" * len(header.encode("gbk")))
+    for r in results:
+        lag = f"{r['loop_lag_mean_ms']:.2f}/{r['loop_lag_max_ms']:.2f}"
+        print(f"{r['concurrency']:<6} {r['final_limit']:<8} {r['requests']:<8} {r['requests_per_s']:<9.2f} "
+              f"{r['latency_p50']:<8.3f} {r['latency_p95']:<8.3f} {r['latency_p99']:<8.3f} {lag:<22} "
+              f"{r.get('server', {}).get('rate_limited', '-'):<6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate_api.py 压测")
+    parser.add_argument("--dataset", choices=DATASETS, default="verilogeval_v2")
+    parser.add_argument("--concurrency", default="5,10,20,50", help="逗号分隔的并发设置")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None, help="只使用前N个问题")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--adaptive", action="store_true", help="使用AIMD自适应并发，--concurrency为初始值")
+    parser.add_argument("--max-concurrent-limit", type=int, default=256)
+    parser.add_argument("--hedge-percentile", type=float, default=None)
+    parser.add_argument("--base-url", default=None, help="压测已有端点；不指定则启动本地模拟服务")
+    parser.add_argument("--api-key", default="mock")
+    parser.add_argument("--model-name", default="mock-model")
+    parser.add_argument("--output", default=None, help="结果保存为JSON")
+    parser.add_argument("--verbose", action="store_true")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    gen_module = load_dataset_module(args.dataset, "generate_api")
+    problems = gen_module.load_problems(
+        os.path.join(ROOT_DIR, args.dataset, f"problems_{args.dataset}.jsonl")
+    )
+    if args.limit:
+        problems = problems[:args.limit]
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOpenAIServer(mock_config_from_args(args)).start()
+        base_url = server.url
+
+    results = []
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            if server is not None:
+                server.reset_stats()
+            result = asyncio.run(run_once(gen_module, base_url, problems, concurrency, args))
+            if server is not None:
+                result["server"] = dict(server.stats)
+            results.append(result)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
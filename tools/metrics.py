@@ -0,0 +1,333 @@
+"""
+Prometheus文本格式的运行指标
+
+不依赖 prometheus_client：Registry 管理计数器、仪表和直方图，render() 生成
+Prometheus 文本格式。导出方式二选一（也可同时使用）:
+    textfile  定期原子写入 .prom 文件，供 node_exporter 的 textfile collector 采集
+    http      本地HTTP服务，GET /metrics 返回当前指标
+
+GenerationMetrics / EvaluationMetrics 定义生成和测试两类任务的指标，
+吞吐（completions/s、compiles/s 等）由 Prometheus 对计数器取 rate() 得到。
+
+使用方法:
+    registry = Registry()
+    metrics = EvaluationMetrics(registry, dataset="rtllm_v2")
+    exporter = start_exporter(registry, {"textfile": "eval.prom", "interval": 5})
+    ...
+    exporter.stop()
+"""
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = registry.lock
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labelnames=(), callback: Optional[Callable[[], Dict]] = None):
+        super().__init__(registry, name, help_text, labelnames)
+        # callback() 返回 {标签值元组: 数值}，在导出时求值
+        self._callbacks: List[Callable[[], Dict[Tuple[str, ...], float]]] = [callback] if callback else []
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, value: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value: float = 1, **labels):
+        self.inc(-value, **labels)
+
+    def add_callback(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self._callbacks.append(callback)
+
+    def render(self) -> List[str]:
+        for callback in self._callbacks:
+            for key, value in callback().items():
+                with self._lock:
+                    self._values[tuple(str(v) for v in key)] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]})
+                           for key, s in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # 同名指标只注册一次，多个生成目标共用同一个指标对象（以标签区分）
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ---------------- 导出 ----------------
+class Exporter:
+    def __init__(self, registry: Registry, textfile: Optional[str] = None, interval: float = 5.0,
+                 http_port: Optional[int] = None, http_host: str = "127.0.0.1"):
+        self.registry = registry
+        self.textfile = textfile
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        if textfile:
+            self._thread = threading.Thread(target=self._write_loop, name="metrics-textfile", daemon=True)
+            self._thread.start()
+        if http_port is not None:
+            self._server = ThreadingHTTPServer((http_host, http_port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"指标服务: http://{http_host}:{self._server.server_address[1]}/metrics")
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("/metrics", ""):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def write(self):
+        tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.textfile)
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"警告: 写入指标文件失败: {e}")
+
+    def stop(self):
+        """停止导出；textfile模式下最后写入一次最终值"""
+        self._stop.set()
+        if self.textfile:
+            try:
+                self.write()
+            except OSError as e:
+                print(f"警告: 写入指标文件失败: {e}")
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def start_exporter(registry: Registry, settings: Optional[Dict[str, Any]]) -> Optional[Exporter]:
+    """settings: {"textfile": 路径, "interval": 秒} 和/或 {"http_port": 端口, "http_host": 地址}"""
+    if not settings or not (settings.get("textfile") or settings.get("http_port") is not None):
+        return None
+    return Exporter(registry, textfile=settings.get("textfile"), interval=settings.get("interval", 5.0),
+                    http_port=settings.get("http_port"), http_host=settings.get("http_host", "127.0.0.1"))
+
+
+# ---------------- 任务指标 ----------------
+class GenerationMetrics:
+    """generate_api.py 的指标，按 model 标签区分多个生成目标"""
+
+    def __init__(self, registry: Registry):
+        self.requests = registry.counter(
+            "verilog_gen_requests_total", "API requests by outcome (ok / overload / error)", ("model", "outcome"))
+        self.in_flight = registry.gauge("verilog_gen_requests_in_flight", "API requests in flight", ("model",))
+        self.latency = registry.histogram(
+            "verilog_gen_request_seconds", "API request latency", ("model",), LATENCY_BUCKETS)
+        self.ttft = registry.histogram(
+            "verilog_gen_ttft_seconds", "Time to first token", ("model",), LATENCY_BUCKETS)
+        self.tokens = registry.counter(
+            "verilog_gen_tokens_total", "Tokens reported by the server (prompt / completion / cached)",
+            ("model", "kind"))
+        self.completions = registry.counter(
+            "verilog_gen_completions_total", "Completions returned by the API", ("model",))
+        self.cache = registry.counter(
+            "verilog_gen_cache_lookups_total", "Response cache lookups (hit / miss)", ("model", "result"))
+        self.hedges = registry.counter("verilog_gen_hedged_requests_total", "Hedged duplicate requests", ("model",))
+        self.limit = registry.gauge("verilog_gen_concurrency_limit", "Current concurrency limit", ("model",))
+        self.remaining = registry.gauge(
+            "verilog_gen_problems_remaining", "Problems not yet finished (queue depth)", ("model",))
+
+    def track_limiter(self, model: str, limiter):
+        if limiter is not None:
+            self.limit.add_callback(lambda: {(model,): float(limiter.limit)})
+
+    def record_request(self, model: str, stats: Dict[str, Any]):
+        self.requests.inc(model=model, outcome="ok")
+        self.completions.inc(model=model)
+        self.latency.observe(stats["latency"], model=model)
+        self.ttft.observe(stats["ttft"], model=model)
+        for kind in ("prompt", "completion", "cached"):
+            if stats.get(f"{kind}_tokens"):
+                self.tokens.inc(stats[f"{kind}_tokens"], model=model, kind=kind)
+
+
+class EvaluationMetrics:
+    """functional_correctness.py 的指标，按 dataset 标签区分"""
+
+    def __init__(self, registry: Registry, dataset: str):
+        self.dataset = dataset
+        self.solutions = registry.counter(
+            "verilog_eval_solutions_total", "Solutions evaluated", ("dataset",))
+        self.compiles = registry.counter(
+            "verilog_eval_compiles_total", "iverilog runs by result (ok / fail)", ("dataset", "result"))
+        self.precheck_rejects = registry.counter(
+            "verilog_eval_precheck_rejects_total", "Solutions rejected by the interface precheck before iverilog",
+            ("dataset",))
+        self.simulations = registry.counter(
+            "verilog_eval_simulations_total", "vvp runs by result (pass / fail / timeout / error)",
+            ("dataset", "result"))
+        self.timeouts = registry.counter("verilog_eval_timeouts_total", "Simulation timeouts", ("dataset",))
+        self.stage_seconds = registry.histogram(
+            "verilog_eval_stage_seconds", "Per-solution stage duration", ("dataset", "stage"), STAGE_BUCKETS)
+        self.child_cpu = registry.counter(
+            "verilog_eval_child_cpu_seconds_total", "CPU time of iverilog/vvp children", ("dataset", "stage"))
+        self.remaining = registry.gauge(
+            "verilog_eval_queue_depth", "Solutions not yet evaluated", ("dataset",))
+        self.last_progress = registry.gauge(
+            "verilog_eval_last_progress_timestamp_seconds", "Unix time of the last finished solution", ("dataset",))
+
+    def record_solution(self, status: str, compiled: bool, stats: Dict[str, Any]):
+        dataset = self.dataset
+        self.solutions.inc(dataset=dataset)
+        timing = stats.get("timing", {})
+        if "compile" in timing:
+            self.compiles.inc(dataset=dataset, result="ok" if compiled else "fail")
+        elif status.startswith("接口检查失败"):
+            self.precheck_rejects.inc(dataset=dataset)
+        if "simulate" in timing:
+            if status == "true":
+                result = "pass"
+            elif "仿真超时" in status:
+                result = "timeout"
+                self.timeouts.inc(dataset=dataset)
+            elif status.startswith("仿真错误"):
+                result = "error"
+            else:
+                result = "fail"
+            self.simulations.inc(dataset=dataset, result=result)
+        for stage, seconds in timing.items():
+            self.stage_seconds.observe(seconds, dataset=dataset, stage=stage)
+        for stage, usage in stats.get("resources", {}).items():
+            self.child_cpu.inc(usage.get("cpu_user", 0.0) + usage.get("cpu_sys", 0.0), dataset=dataset, stage=stage)
+        self.remaining.dec(dataset=dataset)
+        self.last_progress.set(time.time(), dataset=dataset)
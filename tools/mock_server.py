@@ -0,0 +1,301 @@
+"""
+本地OpenAI兼容模拟服务
+
+为 problems_*.jsonl 中的题目返回固定的Verilog回复，可配置延迟分布、错误率、
+并发容量和每秒请求数限制，用于在不调用真实API的情况下测试 generate_api.py。
+
+使用方法:
+    python -m tools.mock_server --port 8000 --latency-mean 0.5 --capacity 32
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PROBLEM_FILES = [
+    os.path.join(ROOT_DIR, "resbench", "problems_resbench.jsonl"),
+    os.path.join(ROOT_DIR, "rtllm_v2", "problems_rtllm_v2.jsonl"),
+    os.path.join(ROOT_DIR, "verilogeval_v2", "problems_verilogeval_v2.jsonl"),
+]
+
+EXPLANATION = (
+    "This implementation follows the specification directly. The combinational "
+    "logic is written with continuous assignments and the sequential logic uses "
+    "non-blocking assignments inside a clocked always block. "
+)
+
+
+class MockConfig:
+    def __init__(self, latency_dist: str = "lognormal", latency_mean: float = 0.5,
+                 latency_sigma: float = 0.5, token_rate: float = 200.0,
+                 error_rate: float = 0.0, capacity: Optional[int] = None,
+                 rps: Optional[float] = None, explanation_repeat: int = 4,
+                 seed: Optional[int] = None):
+        self.latency_dist = latency_dist        # fixed / uniform / lognormal
+        self.latency_mean = latency_mean        # 首token延迟均值（秒）
+        self.latency_sigma = latency_sigma      # lognormal的sigma；uniform时为相对半宽
+        self.token_rate = token_rate            # 每秒输出token数（按空白分词近似）
+        self.error_rate = error_rate            # 返回500的比例
+        self.capacity = capacity                # 同时处理的请求上限，超出返回429
+        self.rps = rps                          # 每秒请求数上限（令牌桶），超出返回429
+        self.explanation_repeat = explanation_repeat  # 代码块之后附加的解释文字段数
+        self.rng = random.Random(seed)
+
+
+class MockOpenAIServer:
+    """在后台线程中运行的模拟服务，url 属性即 OpenAI 客户端的 base_url"""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1",
+                 port: int = 0, problem_files: Optional[List[str]] = None):
+        self.config = config or MockConfig()
+        self.headers = _load_headers(problem_files or DEFAULT_PROBLEM_FILES)
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "disconnects": 0}
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._tokens = float(self.config.rps or 0)
+        self._last_refill = time.monotonic()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    # ---------------- 请求准入 ----------------
+    def admit(self) -> Optional[int]:
+        """返回None表示接受请求，否则返回应答的HTTP错误码"""
+        config = self.config
+        with self._lock:
+            self.stats["requests"] += 1
+            if config.rps:
+                now = time.monotonic()
+                self._tokens = min(config.rps, self._tokens + (now - self._last_refill) * config.rps)
+                self._last_refill = now
+                if self._tokens < 1:
+                    self.stats["rate_limited"] += 1
+                    return 429
+                self._tokens -= 1
+            if config.capacity is not None and self.in_flight >= config.capacity:
+                self.stats["rate_limited"] += 1
+                return 429
+            if config.error_rate and config.rng.random() < config.error_rate:
+                self.stats["errors"] += 1
+                return 500
+            self.in_flight += 1
+            return None
+
+    def finish(self, ok: bool):
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.stats["ok"] += 1
+            else:
+                self.stats["disconnects"] += 1
+
+    def sample_latency(self) -> float:
+        config = self.config
+        with self._lock:
+            if config.latency_dist == "fixed":
+                return config.latency_mean
+            if config.latency_dist == "uniform":
+                half = config.latency_mean * config.latency_sigma
+                return max(0.0, config.rng.uniform(config.latency_mean - half, config.latency_mean + half))
+            # lognormal: 使均值等于 latency_mean
+            mu = math.log(max(config.latency_mean, 1e-6)) - config.latency_sigma ** 2 / 2
+            return config.rng.lognormvariate(mu, config.latency_sigma)
+
+    def completion_for(self, prompt: str) -> str:
+        header = None
+        for candidate in self.headers:
+            if candidate in prompt:
+                header = candidate
+                break
+        if header is None:
+            header = "module mock_module();\n"
+        code = f"{header.rstrip()}\n    // mock implementation\nendmodule"
+        return f"```verilog\n{code}\n```\n\n" + EXPLANATION * self.config.explanation_repeat
+
+
+def _load_headers(problem_files: List[str]) -> List[str]:
+    headers = []
+    for path in problem_files:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                header = json.loads(line).get("module_header", "").strip()
+                if header:
+                    headers.append(header)
+    # 长的header优先匹配，避免一个header是另一个的前缀
+    return sorted(set(headers), key=len, reverse=True)
+
+
+def _split_tokens(text: str) -> List[str]:
+    pieces, current = [], ""
+    for ch in text:
+        current += ch
+        if ch in " \n":
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _make_handler(server: MockOpenAIServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, dict(server.stats, in_flight=server.in_flight))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            status = server.admit()
+            if status is not None:
+                message = "Rate limit exceeded" if status == 429 else "Internal server error"
+                self._send_json(status, {"error": {"message": message, "type": "mock_error"}})
+                return
+
+            ok = False
+            try:
+                prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+                content = server.completion_for(prompt)
+                model = body.get("model", "mock")
+                if body.get("stream"):
+                    ok = self._stream(model, content)
+                else:
+                    tokens = _split_tokens(content)
+                    time.sleep(server.sample_latency() + len(tokens) / server.config.token_rate)
+                    self._send_json(200, _completion_payload(model, content, prompt, len(tokens)))
+                    ok = True
+            except (BrokenPipeError, ConnectionResetError):
+                ok = False
+            finally:
+                server.finish(ok)
+
+        def _stream(self, model: str, content: str) -> bool:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            time.sleep(server.sample_latency())
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+            delay = 1.0 / server.config.token_rate
+            for token in _split_tokens(content):
+                payload = {
+                    "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(delay)
+            final = {
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+            return True
+
+        def _send_json(self, status: int, payload: Dict):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def _completion_payload(model: str, content: str, prompt: str, completion_tokens: int) -> Dict:
+    prompt_tokens = len(_split_tokens(prompt))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.5, help="首token延迟均值（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--token-rate", type=float, default=200.0, help="每秒输出token数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--capacity", type=int, default=None, help="并发容量，超出返回429")
+    parser.add_argument("--rps", type=float, default=None, help="每秒请求数上限，超出返回429")
+    parser.add_argument("--explanation-repeat", type=int, default=4, help="代码块后附加的解释段数")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def mock_config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency_dist=args.latency_dist, latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma, token_rate=args.token_rate,
+        error_rate=args.error_rate, capacity=args.capacity, rps=args.rps,
+        explanation_repeat=args.explanation_repeat, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(mock_config_from_args(args), host=args.host, port=args.port)
+    print(f"模拟服务已启动: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,145 @@
+"""
+vLLM的CPU模拟引擎
+
+实现 generate_llm.py 用到的 LLM.generate / LLM.get_tokenizer 接口和 SamplingParams，
+按 stop / include_stop_str_in_output / max_tokens 的语义截断固定回复，
+用于在没有GPU和vllm的环境下检查采样配置与结果处理。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+DEFAULT_BODY = (
+    "\n    // mock implementation\n"
+    "endmodule\n"
+    "```\n\n"
+    "The module above implements the requested behaviour. "
+    "It uses continuous assignments for the combinational paths and "
+    "a clocked always block for the registers.\n"
+)
+
+
+@dataclass
+class MockSamplingParams:
+    temperature: float = 1.0
+    max_tokens: int = 16
+    n: int = 1
+    stop: Optional[List[str]] = None
+    include_stop_str_in_output: bool = False
+
+
+class MockTokenizer:
+    """
+    按空白切分的近似分词器：每个词连同前后的空白为一个token，decode(encode(text)) == text
+
+    token数等于 text.split() 的词数（全为空白的文本为1个token）。
+    """
+
+    _TOKEN = re.compile(r"\s*\S+\s*|\s+")
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._pieces: List[str] = []
+
+    def tokenize(self, text: str) -> List[str]:
+        return self._TOKEN.findall(text)
+
+    def encode(self, text: str) -> List[int]:
+        ids = []
+        for piece in self.tokenize(text):
+            if piece not in self._vocab:
+                self._vocab[piece] = len(self._pieces)
+                self._pieces.append(piece)
+            ids.append(self._vocab[piece])
+        return ids
+
+    def decode(self, ids: Sequence[int]) -> str:
+        return "".join(self._pieces[i] for i in ids)
+
+
+@dataclass
+class MockCompletionOutput:
+    index: int
+    text: str
+    token_ids: List[int]
+    finish_reason: str
+
+
+@dataclass
+class MockRequestOutput:
+    prompt: str
+    prompt_token_ids: List[int]
+    outputs: List[MockCompletionOutput] = field(default_factory=list)
+    num_cached_tokens: int = 0
+
+
+class MockLLM:
+    """
+    模拟前缀缓存：与最近 cache_window 个prompt的最长公共前缀（按block_size取整）
+    记为 num_cached_tokens，用来比较不同请求顺序的缓存复用效果
+    """
+
+    def __init__(self, body: str = DEFAULT_BODY, block_size: int = 16, cache_window: int = 16):
+        self.body = body
+        self.tokenizer = MockTokenizer()
+        self.generated_tokens = 0
+        self.block_size = block_size
+        self._recent_prompts: List[List[str]] = []
+        self._cache_window = cache_window
+
+    def get_tokenizer(self) -> MockTokenizer:
+        return self.tokenizer
+
+    def generate(self, prompts: Union[str, List[str]],
+                 sampling_params: Union[MockSamplingParams, List[MockSamplingParams], None] = None,
+                 use_tqdm: bool = False) -> List[MockRequestOutput]:
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        if sampling_params is None:
+            sampling_params = MockSamplingParams()
+        if not isinstance(sampling_params, list):
+            sampling_params = [sampling_params] * len(prompts)
+        if len(sampling_params) != len(prompts):
+            raise ValueError("The lengths of prompts and sampling_params must be the same.")
+
+        results = []
+        for prompt, params in zip(prompts, sampling_params):
+            text, finish_reason = self._apply_stop(self.body, params)
+            outputs = []
+            for i in range(params.n):
+                token_ids = self.tokenizer.encode(text)
+                self.generated_tokens += len(token_ids)
+                outputs.append(MockCompletionOutput(i, text, token_ids, finish_reason))
+            results.append(MockRequestOutput(
+                prompt, self.tokenizer.encode(prompt), outputs, self._cached_prefix(self.tokenizer.tokenize(prompt))
+            ))
+        return results
+
+    def _cached_prefix(self, words: List[str]) -> int:
+        best = 0
+        for previous in self._recent_prompts:
+            common = 0
+            for a, b in zip(previous, words):
+                if a != b:
+                    break
+                common += 1
+            best = max(best, common)
+        self._recent_prompts = (self._recent_prompts + [words])[-self._cache_window:]
+        return best // self.block_size * self.block_size
+
+    def _apply_stop(self, text: str, params: MockSamplingParams):
+        cut, stop_str = None, None
+        for stop in params.stop or []:
+            pos = text.find(stop)
+            if pos != -1 and (cut is None or pos < cut):
+                cut, stop_str = pos, stop
+        finish_reason = "length"
+        if cut is not None:
+            text = text[:cut + len(stop_str)] if params.include_stop_str_in_output else text[:cut]
+            finish_reason = "stop"
+        # 与 encode 使用同一切分，截断后的token数恰好为max_tokens
+        tokens = self.tokenizer.tokenize(text)
+        if len(tokens) > params.max_tokens:
+            text = "".join(tokens[:params.max_tokens])
+            finish_reason = "length"
+        return text, finish_reason
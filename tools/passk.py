@@ -0,0 +1,210 @@
+"""
+向量化的pass@k估计与bootstrap置信区间
+
+每个模块使用自己的样本数n，一次计算所有模块、多个k值。无偏估计
+    pass@k = 1 - C(n-c, k) / C(n, k) = 1 - prod_{i=n-c+1}^{n} (1 - k/i)
+用乘积形式在对数域计算：预先对 log(1 - k/i) 做前缀和，每个模块的乘积就是两个前缀和
+之差，避免组合数溢出，也不需要逐模块循环。n < k 的模块无法估计pass@k，结果为NaN，
+在平均值中不计入。
+
+上面的估计要求每个模块的n事先固定。自适应采样（首次通过即停止）的结果中n是停止时刻、
+c至多为1，代入该公式会高估pass@k；这类结果文件的模块带有 "sampling": "sequential"，
+改用前k个样本的估计（sequential_pass_at_k）：前k个样本与停止规则无关，
+"前k个中是否有通过的样本"就是pass@k的无偏估计；未通过且抽取不足k个的模块不计入。
+
+使用方法:
+    n = np.array([10, 10, 5]); c = np.array([3, 0, 5])
+    summary = summarize(n, c)          # {1: {"mean":..., "low":..., "high":..., "modules": 3}, 5: ..., 10: ...}
+
+    if is_sequential(solutions_data):
+        first, n = first_pass_indices(solutions_data)
+        summary = summarize_sequential(first, n)
+"""
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_KS = (1, 5, 10, 20, 50, 100)
+
+
+def pass_at_k(n, c, k: int) -> np.ndarray:
+    """逐模块的pass@k，n < k 的位置为NaN"""
+    n = np.asarray(n, dtype=np.int64)
+    c = np.asarray(c, dtype=np.int64)
+    result = np.full(n.shape, np.nan)
+    valid = n >= k
+    if not valid.any():
+        return result
+
+    # log_terms[i] = log(1 - k/i)，只在 i > k 时有定义；i <= k 时不会被用到
+    max_n = int(n[valid].max())
+    i = np.arange(1, max_n + 1, dtype=np.float64)
+    log_terms = np.zeros(max_n + 1)
+    log_terms[1:] = np.where(i > k, np.log1p(-k / np.maximum(i, k + 1)), 0.0)
+    prefix = np.cumsum(log_terms)
+
+    nv, cv = n[valid], c[valid]
+    fail_all = nv - cv
+    # n-c < k 时任取k个必含通过的样本
+    estimate = np.where(fail_all < k, 1.0, 1.0 - np.exp(prefix[nv] - prefix[np.maximum(fail_all, 0)]))
+    estimate = np.where(cv == 0, 0.0, estimate)
+    result[valid] = estimate
+    return result
+
+
+def select_ks(n, ks: Optional[Iterable[int]] = None) -> list:
+    """默认取 DEFAULT_KS 中不超过最大样本数的k值"""
+    max_n = int(np.max(n)) if np.size(n) else 0
+    ks = DEFAULT_KS if ks is None else ks
+    return sorted({int(k) for k in ks if 1 <= k <= max_n})
+
+
+@lru_cache(maxsize=16)
+def bootstrap_weights(modules: int, n_boot: int = 1000, seed: int = 0) -> np.ndarray:
+    """
+    (n_boot, modules) 的重采样次数矩阵，每行是一次有放回抽取中各模块被抽中的次数
+
+    结果只取决于参数，缓存后同样规模的多个运行共用同一组重采样（只读）。
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, modules, size=(n_boot, modules))
+    draws += modules * np.arange(n_boot)[:, None]
+    weights = np.bincount(draws.ravel(), minlength=n_boot * modules).reshape(n_boot, modules).astype(np.float64)
+    weights.flags.writeable = False
+    return weights
+
+
+def bootstrap_ci(values, n_boot: int = 1000, alpha: float = 0.05, seed: int = 0,
+                 weights: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """
+    对模块重采样，返回平均值的 (1-alpha) 百分位置信区间
+
+    values 可以是多列（每列一个k值），此时返回每列的区间数组；NaN模块在该列中不计入。
+    weights 为 bootstrap_weights 的结果，多个指标共用同一组重采样。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    column = values.ndim == 1
+    values = values.reshape(len(values), -1)
+    if len(values) == 0:
+        nan = np.full(values.shape[1], np.nan)
+        return (float("nan"), float("nan")) if column else (nan, nan)
+    if weights is None:
+        weights = bootstrap_weights(len(values), n_boot, seed)
+    valid = ~np.isnan(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        samples = (weights @ np.where(valid, values, 0.0)) / (weights @ valid)
+    low, high = np.nanquantile(samples, [alpha / 2, 1 - alpha / 2], axis=0)
+    if column:
+        return float(low[0]), float(high[0])
+    return low, high
+
+
+def summarize(n, c, ks: Optional[Iterable[int]] = None, n_boot: int = 1000,
+              alpha: float = 0.05, seed: int = 0) -> Dict[int, Dict[str, float]]:
+    """
+    各k值下的模块平均pass@k及置信区间
+
+    返回 {k: {"mean", "low", "high", "modules"}}，modules 为样本数足够（n >= k）、
+    参与平均的模块数。n_boot=0 时不计算置信区间。
+    """
+    n = np.asarray(n, dtype=np.int64)
+    c = np.asarray(c, dtype=np.int64)
+    ks = select_ks(n, ks)
+    if not ks:
+        return {}
+    values = np.column_stack([pass_at_k(n, c, k) for k in ks])
+    return _summarize_values(values, ks, n_boot, alpha, seed)
+
+
+def _summarize_values(values: np.ndarray, ks: list, n_boot: int, alpha: float, seed: int) -> Dict[int, Dict[str, float]]:
+    """values 为 (模块数, k值数) 的逐模块估计，NaN不计入"""
+    counted = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counted > 0, np.nansum(values, axis=0) / np.maximum(counted, 1), np.nan)
+    if n_boot:
+        # 所有k共用同一组重采样
+        low, high = bootstrap_ci(values, alpha=alpha, weights=bootstrap_weights(len(values), n_boot, seed))
+    else:
+        low = high = np.full(len(ks), np.nan)
+    return {
+        k: {"mean": float(means[i]), "low": float(low[i]), "high": float(high[i]), "modules": int(counted[i])}
+        for i, k in enumerate(ks)
+    }
+
+
+# ---------------- 自适应（序贯）采样 ----------------
+def is_sequential(solutions_data: List[Dict[str, Any]]) -> bool:
+    """结果文件是否来自自适应采样（首次通过即停止）"""
+    return any(entry.get("sampling") == "sequential" or "solved_at" in entry for entry in solutions_data)
+
+
+def first_pass_indices(solutions_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各模块第一个通过的样本序号（没有通过的为-1）和样本数
+
+    按测试结果（pass字段）而不是生成时记录的 solved_at 计算，重新测试后同样适用。
+    """
+    first, n = [], []
+    for entry in solutions_data:
+        solutions = entry.get("solutions", [])
+        first.append(next((i for i, s in enumerate(solutions) if s.get("pass") == "true"), -1))
+        n.append(len(solutions))
+    return np.array(first, dtype=np.int64), np.array(n, dtype=np.int64)
+
+
+def sequential_pass_at_k(first, n, k: int) -> np.ndarray:
+    """
+    前k个样本中是否有通过的样本
+
+    未通过且样本数不足k的模块（预算用完时被截断的难题）按未通过计，结果是pass@k的下界；
+    如果排除它们，剩下的恰好是较容易的模块，估计会偏高。
+    """
+    first = np.asarray(first, dtype=np.int64)
+    return ((first >= 0) & (first < k)).astype(np.float64)
+
+
+def censored_modules(first, n, k: int) -> int:
+    """未通过且样本数不足k、在 sequential_pass_at_k 中按未通过计的模块数"""
+    first = np.asarray(first, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    return int(((first < 0) & (n < k)).sum())
+
+
+def summarize_sequential(first, n, ks: Optional[Iterable[int]] = None, n_boot: int = 1000,
+                         alpha: float = 0.05, seed: int = 0) -> Dict[int, Dict[str, float]]:
+    """自适应采样结果的模块平均pass@k及置信区间，返回格式与 summarize 相同"""
+    n = np.asarray(n, dtype=np.int64)
+    ks = select_ks(n, ks)
+    if not ks:
+        return {}
+    values = np.column_stack([sequential_pass_at_k(first, n, k) for k in ks])
+    return _summarize_values(values, ks, n_boot, alpha, seed)
+
+
+def print_sequential_metrics(solutions_data: List[Dict[str, Any]], ks: Optional[Iterable[int]] = None):
+    """
+    输出自适应采样结果的指标
+
+    语法pass@1取每个模块的第一个样本（总会被抽取）；功能pass@k用前k个样本估计。
+    样本总数和通过数取决于停止规则，不输出整体通过率。
+    """
+    first, n = first_pass_indices(solutions_data)
+    if not len(n):
+        print("错误: 没有找到任何解决方案，无法计算pass@k指标")
+        return
+    print(f"\n自适应采样结果（首次通过即停止，共{len(n)}个模块，抽取{int(n.sum())}个样本）:")
+    from tools.results_db import classify_status
+
+    first_compiled = np.array([
+        1.0 if entry.get("solutions") and classify_status(entry["solutions"][0].get("pass", ""))[1] else 0.0
+        for entry in solutions_data
+    ])
+    low, high = bootstrap_ci(first_compiled)
+    print(f"平均语法pass@1 (共{len(n)}个模块): {first_compiled.mean():.4f} [95% CI {low:.4f}, {high:.4f}]")
+    for k, stats in summarize_sequential(first, n, ks).items():
+        censored = censored_modules(first, n, k)
+        note = f"，其中{censored}个模块不足{k}个样本按未通过计，为下界" if censored else ""
+        print(f"平均功能pass@{k} (共{stats['modules']}个模块{note}): {stats['mean']:.4f} "
+              f"[95% CI {stats['low']:.4f}, {stats['high']:.4f}]")
+    print("注意: 按前k个样本估计；未通过且抽取不足k个样本的模块按未通过计")
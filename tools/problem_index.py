@@ -0,0 +1,131 @@
+"""
+problems_*.jsonl 的字节偏移索引
+
+首次打开时扫描一遍文件，记录每条记录的 module_name、字节偏移和长度，以及
+prompt / module_header 两个轻量字段，保存为同目录下的 <文件名>.idx；之后按文件
+大小和修改时间判断索引是否有效。数据文件以 mmap 方式打开，按名称查询时只解码
+需要的记录，生成阶段完全不需要解码体积最大的 testbench 字段。
+
+使用方法:
+    index = ProblemIndex("problems_verilogeval_v2.jsonl")
+    names = index.select(["Prob0*", "2012_q1g"])   # 名称或通配符
+    header = index.light("2012_q1g")["module_header"]
+    testbench = index.testbench("2012_q1g")
+"""
+import fnmatch
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+INDEX_VERSION = 1
+LIGHT_FIELDS = ("module_name", "prompt", "module_header")
+
+
+class ProblemIndex:
+    def __init__(self, path: str, rebuild: bool = False):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # 空文件无法mmap
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        index = None if rebuild else self._load_index()
+        if index is None:
+            index = self._build_index()
+            self._save_index(index)
+        self._records: List[Dict[str, Any]] = index["records"]
+        self._by_name: Dict[str, Dict[str, Any]] = {r["module_name"]: r for r in self._records}
+
+    # ---------------- 索引构建与持久化 ----------------
+    def _fingerprint(self) -> Dict[str, int]:
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != INDEX_VERSION or index.get("source") != self._fingerprint():
+            return None
+        return index
+
+    def _build_index(self) -> Dict[str, Any]:
+        records = []
+        offset = 0
+        mm = self._mm
+        end = len(mm)
+        while offset < end:
+            newline = mm.find(b"\n", offset)
+            line_end = end if newline == -1 else newline
+            if mm[offset:line_end].strip():
+                item = json.loads(mm[offset:line_end])
+                record = {field: item.get(field, "") for field in LIGHT_FIELDS}
+                record["offset"] = offset
+                record["length"] = line_end - offset
+                records.append(record)
+            offset = line_end + 1
+        return {"version": INDEX_VERSION, "source": self._fingerprint(), "records": records}
+
+    def _save_index(self, index: Dict[str, Any]):
+        # 数据目录只读时只在内存中使用索引
+        try:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+    # ---------------- 查询 ----------------
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def names(self) -> List[str]:
+        return [r["module_name"] for r in self._records]
+
+    def select(self, patterns: Union[None, str, Iterable[str]] = None) -> List[str]:
+        """按名称或通配符选择问题，保持文件中的顺序；patterns为None时返回全部"""
+        if patterns is None:
+            return self.names()
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        patterns = list(patterns)
+        return [
+            name for name in self.names()
+            if any(name == p or fnmatch.fnmatchcase(name, p) for p in patterns)
+        ]
+
+    def light(self, name: str) -> Dict[str, str]:
+        """prompt/module_header/module_name，直接取自索引，不读取数据文件"""
+        record = self._by_name[name]
+        return {field: record[field] for field in LIGHT_FIELDS}
+
+    def get(self, name: str) -> Dict[str, Any]:
+        """解码完整记录（含testbench）"""
+        record = self._by_name[name]
+        return json.loads(self._mm[record["offset"]:record["offset"] + record["length"]])
+
+    def size(self, name: str) -> int:
+        """记录的字节数，可作为评测代价的近似"""
+        return self._by_name[name]["length"]
+
+    def testbench(self, name: str) -> str:
+        return self.get(name).get("testbench", "")
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "ProblemIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
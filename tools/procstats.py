@@ -0,0 +1,147 @@
+"""
+子进程资源统计与评测阶段耗时汇总
+
+run_measured 是 subprocess.run(cmd, capture_output=True, text=True) 的替代：子进程由
+os.wait4 回收，同时得到它的CPU时间和峰值RSS。wait4 返回的用量包含子进程已回收的
+后代进程（iverilog 会调用 ivlpp / ivl），因此编译阶段的统计覆盖整个工具链。
+不支持 os.wait4 的平台退回 subprocess.run，只记录墙钟时间。
+
+注意：Linux 在 exec 时保留原进程的RSS峰值，子进程的 ru_maxrss 至少等于启动它时
+本进程的峰值RSS。因此同时记录 rss_floor_kb：max_rss_kb 大于它时是子进程的准确峰值，
+等于它时只说明子进程峰值不超过该值。
+
+使用方法:
+    usage = {}
+    process = run_measured(["vvp", "-n", "test.vvp"], cwd=work_dir, timeout=5, usage=usage)
+    # usage == {"wall": 0.41, "cpu_user": 0.38, "cpu_sys": 0.01, "max_rss_kb": 51200, "rss_floor_kb": 41028}
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+STAGES = ("precheck", "write", "compile", "simulate", "parse")
+
+
+def _max_rss_kb(usage) -> int:
+    # Linux 的 ru_maxrss 单位为KB，macOS 为字节
+    return int(usage.ru_maxrss // 1024) if sys.platform == "darwin" else int(usage.ru_maxrss)
+
+
+def run_measured(cmd: Sequence[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+                 usage: Optional[Dict[str, Any]] = None) -> subprocess.CompletedProcess:
+    """
+    运行命令并捕获文本输出，超时时杀死进程并抛出 subprocess.TimeoutExpired
+
+    usage 不为None时写入 wall / cpu_user / cpu_sys（秒）和 max_rss_kb，超时时同样记录。
+    """
+    usage = {} if usage is None else usage
+    start = time.perf_counter()
+    if not hasattr(os, "wait4"):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True, cwd=cwd, timeout=timeout)
+        finally:
+            usage["wall"] = time.perf_counter() - start
+
+    import resource
+
+    rss_floor_kb = _max_rss_kb(resource.getrusage(resource.RUSAGE_SELF))
+    # 输出写入临时文件而不是管道，等待子进程时不需要同时读取管道
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        process = subprocess.Popen(cmd, stdout=out, stderr=err, cwd=cwd)
+        lock = threading.Lock()
+        timed_out = []
+
+        def kill():
+            with lock:
+                if process.returncode is None:
+                    timed_out.append(True)
+                    process.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout is not None else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        with lock:
+            # 已由wait4回收，告知Popen不要再次等待
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+        usage["wall"] = time.perf_counter() - start
+        usage["cpu_user"] = rusage.ru_utime
+        usage["cpu_sys"] = rusage.ru_stime
+        usage["max_rss_kb"] = _max_rss_kb(rusage)
+        usage["rss_floor_kb"] = rss_floor_kb
+
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode("utf-8", errors="replace")
+        stderr = err.read().decode("utf-8", errors="replace")
+
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize_stages(records: List[Dict[str, Any]], save_times: Optional[List[float]] = None) -> Dict[str, Any]:
+    """
+    records 为 {"module_name", "timing", "resources"} 列表（timing / resources 即
+    check_solution 写入 stats 的内容），返回各阶段 p50/p95/max 及按模块累计的耗时
+    """
+    stages = {}
+    for stage in STAGES:
+        values = [r["timing"][stage] for r in records if stage in r.get("timing", {})]
+        if values:
+            stages[stage] = {"count": len(values), "p50": _percentile(values, 0.5),
+                             "p95": _percentile(values, 0.95), "max": max(values), "total": sum(values)}
+    if save_times:
+        stages["save"] = {"count": len(save_times), "p50": _percentile(save_times, 0.5),
+                          "p95": _percentile(save_times, 0.95), "max": max(save_times), "total": sum(save_times)}
+
+    per_module: Dict[str, Dict[str, float]] = {}
+    for record in records:
+        module = per_module.setdefault(record["module_name"],
+                                       {"total": 0.0, "cpu": 0.0, "max_rss_kb": 0, "rss_exact": False})
+        module["total"] += sum(record.get("timing", {}).values())
+        for usage in record.get("resources", {}).values():
+            module["cpu"] += usage.get("cpu_user", 0.0) + usage.get("cpu_sys", 0.0)
+            if usage.get("max_rss_kb", 0) > module["max_rss_kb"]:
+                module["max_rss_kb"] = usage["max_rss_kb"]
+                module["rss_exact"] = usage["max_rss_kb"] > usage.get("rss_floor_kb", 0)
+    return {"stages": stages, "modules": per_module}
+
+
+def print_stage_summary(records: List[Dict[str, Any]], save_times: Optional[List[float]] = None, top: int = 5):
+    summary = summarize_stages(records, save_times)
+    if not summary["stages"]:
+        return
+    print(f"\n各阶段耗时 (秒):")
+    print(f"  {'阶段':<10} {'次数':>6} {'p50':>9} {'p95':>9} {'max':>9} {'合计':>9}")
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<10} {stats['count']:>6} {stats['p50']:>9.4f} {stats['p95']:>9.4f} "
+              f"{stats['max']:>9.4f} {stats['total']:>9.2f}")
+
+    slowest = sorted(summary["modules"].items(), key=lambda item: -item[1]["total"])[:top]
+    print(f"\n最慢的 {len(slowest)} 个模块:")
+    for name, stats in slowest:
+        # 峰值未超过评测进程自身的RSS时只能给出上限
+        bound = "" if stats["rss_exact"] else "≤"
+        print(f"  {name:<28} 耗时 {stats['total']:>8.3f}s  CPU {stats['cpu']:>8.3f}s  "
+              f"峰值RSS {bound}{stats['max_rss_kb'] / 1024:.1f} MB")
+
+    heaviest = max(summary["modules"].items(), key=lambda item: item[1]["max_rss_kb"], default=None)
+    if heaviest and heaviest[1]["rss_exact"]:
+        print(f"  内存峰值最高: {heaviest[0]} {heaviest[1]['max_rss_kb'] / 1024:.1f} MB")
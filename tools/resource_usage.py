@@ -0,0 +1,314 @@
+"""
+ResBench 功能正确样本的硬件资源统计（Yosys综合）
+
+对 pass 为 "true" 的解决方案运行本地Yosys综合，统计LUT / FF / DSP / BRAM / 进位链和
+单元总数，写入解决方案的 resource_usage 字段:
+    {"target": "xilinx", "cells": 41, "lut": 18, "ff": 16, "dsp": 0, "bram": 0, "carry": 2,
+     "cells_by_type": {"LUT4": 10, ...}, "synth_seconds": 0.83, "key": "..."}
+综合失败时为 {"target", "error", "key"}，不计入汇总。
+
+每个样本启动一个yosys子进程，线程池只负责调度，多个综合并行运行在不同的CPU核上。
+结果按 (代码sha256, 顶层模块, 综合设置) 缓存在JSONL文件中，设置包括yosys版本和综合
+脚本；同一代码在不同模型、不同运行之间只综合一次，中断后重新运行也不会重复综合。
+未安装yosys时给出提示并跳过。
+
+使用方法:
+    python -m tools.resource_usage resbench/pass*.json --workers 16
+    python -m tools.resource_usage resbench/pass1_gpt-4o.json --target generic --summary-only
+    python verilog_bench.py evaluate --dataset resbench --solutions pass1_gpt-4o.json --resources
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from tools.fingerprint import text_hash
+from tools.procstats import run_measured
+from tools.verilog_header import parse_header
+
+# 综合脚本，{top} 为 " -top 模块名"（module_header 无法解析时为空并先执行 hierarchy -auto-top）
+TARGETS = {
+    "xilinx": "synth_xilinx -flatten{top}",
+    "ice40": "synth_ice40{top}",
+    "generic": "synth -flatten{top}\nabc -lut 6\nopt_clean",
+}
+METRICS = ("lut", "ff", "dsp", "bram", "carry", "cells")
+DEFAULT_CACHE = "resource_cache.jsonl"
+
+
+def classify_cells(cells_by_type: Dict[str, int]) -> Dict[str, int]:
+    """按单元类型名归类为LUT / FF / DSP / BRAM / 进位链（Xilinx、iCE40和通用单元库）"""
+    counts = {"lut": 0, "ff": 0, "dsp": 0, "bram": 0, "carry": 0}
+    for cell, count in cells_by_type.items():
+        name = cell.lstrip("\\$").upper()
+        if name.startswith(("LUT", "SB_LUT")):
+            counts["lut"] += count
+        elif name.startswith(("FD", "SB_DFF")) or "DFF" in name or "DLATCH" in name:
+            counts["ff"] += count
+        elif name.startswith(("DSP", "SB_MAC")):
+            counts["dsp"] += count
+        elif name.startswith(("RAMB", "SB_RAM", "MEM")):
+            counts["bram"] += count
+        elif "CARRY" in name:
+            counts["carry"] += count
+    return counts
+
+
+@lru_cache(maxsize=8)
+def synth_fingerprint(target: str, yosys: str = "yosys") -> str:
+    """yosys版本行 + 综合脚本，任一变化时缓存失效"""
+    try:
+        process = subprocess.run([yosys, "-V"], capture_output=True, text=True, timeout=10)
+        version = process.stdout.strip().splitlines()[0] if process.stdout.strip() else ""
+    except (OSError, subprocess.SubprocessError):
+        version = "missing"
+    return text_hash(f"{version}\n{TARGETS[target]}")
+
+
+def cache_key(code: str, top: Optional[str], fingerprint: str) -> str:
+    return f"{text_hash(code)}/{top or '-'}/{fingerprint[:16]}"
+
+
+def run_yosys(code: str, top: Optional[str], target: str = "xilinx", timeout: float = 300,
+              yosys: str = "yosys") -> Dict[str, Any]:
+    """在临时目录中综合一个解决方案，返回 resource_usage（不含key）"""
+    script = TARGETS[target].format(top=f" -top {top}" if top else "")
+    if not top:
+        script = f"hierarchy -auto-top\n{script}"
+    with tempfile.TemporaryDirectory(prefix="verilog_synth_") as work_dir:
+        with open(os.path.join(work_dir, "design.v"), "w", encoding="utf-8") as f:
+            f.write(code)
+        with open(os.path.join(work_dir, "synth.ys"), "w", encoding="utf-8") as f:
+            f.write(f"read_verilog -sv design.v\n{script}\ntee -q -o stat.json stat -json\n")
+        usage = {}
+        try:
+            process = run_measured([yosys, "-q", "-s", "synth.ys"], cwd=work_dir, timeout=timeout, usage=usage)
+        except subprocess.TimeoutExpired:
+            return {"target": target, "error": f"综合超时（{timeout}s）"}
+        except OSError as e:
+            return {"target": target, "error": f"无法运行yosys: {e}"}
+        if process.returncode != 0:
+            lines = (process.stderr or process.stdout).strip().splitlines()
+            return {"target": target, "error": f"综合失败: {' '.join(lines[-3:])}"}
+        try:
+            with open(os.path.join(work_dir, "stat.json"), "r", encoding="utf-8") as f:
+                stat = json.load(f)
+        except (OSError, ValueError) as e:
+            return {"target": target, "error": f"无法读取综合统计: {e}"}
+
+    # 展平后只剩顶层模块；未展平的目标（ice40）用 design 汇总整个层次
+    design = stat.get("design") or next(iter(stat.get("modules", {}).values()), {})
+    cells_by_type = {name: int(count) for name, count in design.get("num_cells_by_type", {}).items()}
+    return {"target": target, "cells": int(design.get("num_cells", sum(cells_by_type.values()))),
+            **classify_cells(cells_by_type), "cells_by_type": cells_by_type, "synth_seconds": usage["wall"]}
+
+
+class ResourceCache:
+    """JSONL缓存: 每行 {"key", "usage"}，追加写入，多个进程同时追加也不会损坏已有记录"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue    # 中断时写了一半的行
+                    self.entries[record["key"]] = record["usage"]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def put(self, key: str, usage: Dict[str, Any]):
+        with self._lock:
+            self.entries[key] = usage
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "usage": usage}, ensure_ascii=False) + "\n")
+
+
+def annotate_resources(solutions_data: List[Dict[str, Any]], module_headers: Dict[str, str],
+                       target: str = "xilinx", workers: Optional[int] = None, timeout: float = 300,
+                       cache: Optional[str] = DEFAULT_CACHE, yosys: str = "yosys",
+                       progress: bool = True) -> Optional[Dict[str, int]]:
+    """
+    为功能正确的解决方案填写 resource_usage，返回 {"synthesized", "cached", "failed", "updated"}
+
+    module_headers 为 模块名 -> module_header，用于确定顶层模块。已有当前设置下的
+    resource_usage 的样本跳过；未找到yosys时返回None。
+    """
+    if target not in TARGETS:
+        raise ValueError(f"未知的综合目标 {target!r}，可选: {', '.join(TARGETS)}")
+    if shutil.which(yosys) is None:
+        print(f"警告: 未找到 {yosys}，跳过资源统计")
+        return None
+
+    fingerprint = synth_fingerprint(target, yosys)
+    store = ResourceCache(cache)
+    pending: Dict[str, tuple] = {}
+    targets = []
+    for module_entry in solutions_data:
+        top = parse_header(module_headers.get(module_entry.get("module_name"), ""))[0]
+        for solution_entry in module_entry.get("solutions", []):
+            if solution_entry.get("pass") != "true":
+                continue
+            key = cache_key(solution_entry.get("solution", ""), top, fingerprint)
+            if (solution_entry.get("resource_usage") or {}).get("key") == key:
+                continue
+            targets.append((solution_entry, key))
+            if store.get(key) is None:
+                pending.setdefault(key, (solution_entry["solution"], top))
+
+    result = {"synthesized": len(pending), "cached": len(targets) - len(pending), "failed": 0,
+              "updated": len(targets)}
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        if progress:
+            print(f"Yosys综合 {len(pending)} 个解决方案（{target}，{workers} 个并行），"
+                  f"{result['cached']} 个命中缓存...")
+        start = time.perf_counter()
+
+        def synth(item):
+            key, (code, top) = item
+            usage = run_yosys(code, top, target, timeout, yosys)
+            # 超时与机器负载有关，不写入缓存
+            if not usage.get("error", "").startswith("综合超时"):
+                store.put(key, usage)
+            return key, usage
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            synthesized = dict(executor.map(synth, pending.items()))
+        if progress:
+            print(f"综合完成，耗时 {time.perf_counter() - start:.1f}s")
+    else:
+        synthesized = {}
+
+    for solution_entry, key in targets:
+        usage = synthesized.get(key) or store.get(key)
+        solution_entry["resource_usage"] = {**usage, "key": key}
+        if "error" in usage:
+            result["failed"] += 1
+    return result
+
+
+def summarize_resources(solutions_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    功能正确样本的资源汇总: 各指标的均值/中位数，以及逐题最小LUT数的平均值
+
+    返回 {"passed", "synthesized", "failed", "metrics": {指标: {"mean", "median"}}, "best_lut_mean"}
+    """
+    passed = failed = 0
+    values: Dict[str, List[int]] = {metric: [] for metric in METRICS}
+    best_lut = []
+    for module_entry in solutions_data:
+        module_luts = []
+        for solution_entry in module_entry.get("solutions", []):
+            if solution_entry.get("pass") != "true":
+                continue
+            passed += 1
+            usage = solution_entry.get("resource_usage")
+            if not usage:
+                continue
+            if "error" in usage:
+                failed += 1
+                continue
+            for metric in METRICS:
+                values[metric].append(usage[metric])
+            module_luts.append(usage["lut"])
+        if module_luts:
+            best_lut.append(min(module_luts))
+    return {
+        "passed": passed,
+        "synthesized": len(values["cells"]),
+        "failed": failed,
+        "metrics": {metric: {"mean": statistics.fmean(v), "median": statistics.median(v)}
+                    for metric, v in values.items() if v},
+        "best_lut_mean": statistics.fmean(best_lut) if best_lut else None,
+    }
+
+
+def print_resource_summary(summary: Dict[str, Any]):
+    if not summary["synthesized"] and not summary["failed"]:
+        return
+    print(f"\n资源统计（功能正确的 {summary['passed']} 个样本中综合成功 {summary['synthesized']} 个，"
+          f"失败 {summary['failed']} 个）:")
+    for metric, stats in summary["metrics"].items():
+        print(f"  {metric.upper():<6} 均值 {stats['mean']:>10.1f}  中位数 {stats['median']:>10.1f}")
+    if summary["best_lut_mean"] is not None:
+        print(f"  逐题最小LUT数的平均值: {summary['best_lut_mean']:.1f}")
+
+
+def main():
+    from tools.datasets import ROOT_DIR, load_dataset_module
+    from tools.passk import first_pass_indices, is_sequential, summarize, summarize_sequential
+    from tools.problem_index import ProblemIndex
+    from tools.results_db import model_from_path
+
+    parser = argparse.ArgumentParser(description="ResBench功能正确样本的Yosys资源统计")
+    parser.add_argument("solutions", nargs="+", help="已测试的解决方案文件（结果写回原文件）")
+    parser.add_argument("--target", default="xilinx", choices=sorted(TARGETS))
+    parser.add_argument("--workers", type=int, default=None, help="并行综合数，默认为CPU核数")
+    parser.add_argument("--timeout", type=float, default=300, help="单个样本的综合超时（秒）")
+    parser.add_argument("--cache", default=os.path.join(ROOT_DIR, "resbench", DEFAULT_CACHE),
+                        help="综合结果缓存（JSONL），为空字符串时不缓存")
+    parser.add_argument("--yosys", default="yosys", help="yosys可执行文件")
+    parser.add_argument("--summary-only", action="store_true", help="不综合，只汇总文件中已有的资源统计")
+    parser.add_argument("--json", help="把各模型的汇总导出为JSON")
+    args = parser.parse_args()
+
+    with ProblemIndex(os.path.join(ROOT_DIR, "resbench", "problems_resbench.jsonl")) as index:
+        headers = {name: index.light(name)["module_header"] for name in index.names()}
+    counter = load_dataset_module("resbench", "functional_correctness")
+
+    rows = []
+    for path in args.solutions:
+        with open(path, "r", encoding="utf-8") as f:
+            solutions_data = json.load(f)
+        if not args.summary_only:
+            result = annotate_resources(solutions_data, headers, args.target, args.workers, args.timeout,
+                                        args.cache or None, args.yosys)
+            if result is None:
+                return
+            if result["updated"]:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(solutions_data, f, indent=4, ensure_ascii=False)
+        if is_sequential(solutions_data):
+            pass1 = summarize_sequential(*first_pass_indices(solutions_data), [1]).get(1)
+        else:
+            module_results = counter.collect_module_results(solutions_data)
+            names = sorted(module_results)
+            pass1 = summarize([module_results[n]["total"] for n in names],
+                              [module_results[n]["passed"] for n in names], [1]).get(1) if names else None
+        rows.append({"model": model_from_path(path), "path": path,
+                     "pass@1": pass1["mean"] if pass1 else None, **summarize_resources(solutions_data)})
+
+    def median(row, metric):
+        stats = row["metrics"].get(metric)
+        return f"{stats['median']:.1f}" if stats else "-"
+
+    print(f"\n{'模型':<28} {'功能pass@1':>10} {'通过':>6} {'已综合':>6} "
+          + " ".join(f"{m.upper() + '中位数':>10}" for m in ("lut", "ff", "dsp", "bram")) + f" {'逐题最小LUT':>12}")
+    for row in rows:
+        pass1 = f"{row['pass@1']:.4f}" if row["pass@1"] is not None else "-"
+        best = f"{row['best_lut_mean']:.1f}" if row["best_lut_mean"] is not None else "-"
+        print(f"{row['model']:<28} {pass1:>10} {row['passed']:>6} {row['synthesized']:>6} "
+              + " ".join(f"{median(row, m):>10}" for m in ("lut", "ff", "dsp", "bram")) + f" {best:>12}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=4, ensure_ascii=False)
+        print(f"\n汇总已导出到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+测试结果的SQLite存储
+
+表结构:
+    runs       一次测试运行（数据集 + 解决方案文件），同一文件重新测试时覆盖原有判定
+    problems   (dataset, module_name)
+    solutions  按sha256去重的解决方案代码
+    verdicts   每个样本的判定：status为归类后的状态（pass / compile_error / sim_error /
+               timeout / test_fail / error / untested），message为原始的pass字段，
+               testbench_hash / toolchain_hash 为判定时的指纹（见 tools/fingerprint.py）
+    problem_results
+               按 (run, problem) 汇总的样本数、编译数、通过数和各状态计数，写入判定时
+               同步更新，跨运行查询只需扫描这张表（每个运行每题一行）
+
+module_name、status和run上都有索引，跨运行的查询（如"哪些题对所有模型都超时"）
+直接在数据库中完成，pass@k 由SQL聚合（AVG）在汇总表上计算。
+
+使用方法:
+    python -m tools.results_db --db results.sqlite import --dataset rtllm_v2 rtllm_v2/pass*.json
+    python -m tools.results_db --db results.sqlite summary --ks 1,5
+    python -m tools.results_db --db results.sqlite everywhere --status timeout
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+STATUSES = ("pass", "compile_error", "sim_error", "timeout", "test_fail", "error", "untested")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (dataset, source)
+);
+CREATE TABLE IF NOT EXISTS problems (
+    id INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    module_name TEXT NOT NULL,
+    UNIQUE (dataset, module_name)
+);
+CREATE TABLE IF NOT EXISTS solutions (
+    hash TEXT PRIMARY KEY,
+    code TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS verdicts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    problem_id INTEGER NOT NULL REFERENCES problems(id),
+    sample_idx INTEGER NOT NULL,
+    solution_hash TEXT NOT NULL REFERENCES solutions(hash),
+    status TEXT NOT NULL,
+    compiled INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    message TEXT,
+    testbench_hash TEXT,
+    toolchain_hash TEXT,
+    PRIMARY KEY (run_id, problem_id, sample_idx)
+);
+CREATE TABLE IF NOT EXISTS problem_results (
+    run_id INTEGER NOT NULL,
+    problem_id INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    compiled INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    {status_columns},
+    PRIMARY KEY (run_id, problem_id)
+);
+CREATE INDEX IF NOT EXISTS idx_problem_results_problem ON problem_results(problem_id);
+CREATE INDEX IF NOT EXISTS idx_problems_module ON problems(module_name);
+CREATE INDEX IF NOT EXISTS idx_verdicts_status ON verdicts(status, problem_id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_problem ON verdicts(problem_id, run_id);
+"""
+
+SCHEMA = SCHEMA.replace("{status_columns}", ",\n    ".join(f"n_{status} INTEGER NOT NULL" for status in STATUSES))
+
+RESULT_NAME = re.compile(r"^pass\d+_(.+?)(\.shard\d+of\d+)?$")
+
+
+def classify_status(message: str) -> Tuple[str, bool, bool]:
+    """pass字段 -> (状态归类, 是否编译成功, 是否通过)，与 is_compiled_status 的判断一致"""
+    if message == "true":
+        return "pass", True, True
+    if not message:
+        return "untested", False, False
+    if message.startswith("测试失败: 仿真超时"):
+        return "timeout", True, False
+    if message.startswith("测试失败"):
+        return "test_fail", True, False
+    if message.startswith("仿真错误"):
+        return "sim_error", True, False
+    if message.startswith(("编译失败", "接口检查失败")):
+        # 接口预检查拒绝的样本即使调用iverilog也必然编译失败
+        return "compile_error", False, False
+    return "error", False, False
+
+
+def model_from_path(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = RESULT_NAME.match(stem)
+    return match.group(1) if match else stem
+
+
+@lru_cache(maxsize=65536)
+def _pass_at_k(n: int, c: int, k: int) -> Optional[float]:
+    """SQL中使用的标量函数，n < k 时返回NULL（AVG会忽略）；(n, c, k) 的组合很少，缓存结果"""
+    if n < k:
+        return None
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.prod(1.0 - k / i for i in range(n - c + 1, n + 1))
+
+
+class ResultsDB:
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.create_function("pass_at_k", 3, _pass_at_k, deterministic=True)
+        self.batch_size = batch_size
+        self._problem_ids: Dict[Tuple[str, str], int] = {}
+        self._pending: List[tuple] = []
+        self._pending_code: Dict[str, str] = {}
+
+    def _migrate(self):
+        # 早期版本的数据库没有指纹列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(verdicts)")}
+        for column in ("testbench_hash", "toolchain_hash"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE verdicts ADD COLUMN {column} TEXT")
+        self.conn.commit()
+
+    # ---------------- 写入 ----------------
+    def start_run(self, dataset: str, model: str, source: str, replace: bool = True) -> int:
+        """登记一次运行；同一 (dataset, source) 已存在时复用并清空原有判定"""
+        source = os.path.abspath(source)
+        row = self.conn.execute("SELECT id FROM runs WHERE dataset = ? AND source = ?", (dataset, source)).fetchone()
+        if row is None:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (dataset, model, source, created_at) VALUES (?, ?, ?, ?)",
+                (dataset, model, source, time.time()),
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+        run_id = row[0]
+        if replace:
+            self.conn.execute("DELETE FROM verdicts WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM problem_results WHERE run_id = ?", (run_id,))
+            self.conn.execute("UPDATE runs SET model = ?, created_at = ? WHERE id = ?", (model, time.time(), run_id))
+            self.conn.commit()
+        return run_id
+
+    def _problem_id(self, dataset: str, module_name: str) -> int:
+        key = (dataset, module_name)
+        if key not in self._problem_ids:
+            self.conn.execute("INSERT OR IGNORE INTO problems (dataset, module_name) VALUES (?, ?)", key)
+            self._problem_ids[key] = self.conn.execute(
+                "SELECT id FROM problems WHERE dataset = ? AND module_name = ?", key
+            ).fetchone()[0]
+        return self._problem_ids[key]
+
+    def add_verdict(self, run_id: int, dataset: str, module_name: str, sample_idx: int, code: str, message: str,
+                    fingerprint: Optional[Dict[str, str]] = None):
+        """fingerprint 为 tools.fingerprint.make_fingerprint 的结果，记录判定对应的测试台和工具链"""
+        code = code or ""
+        solution_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        status, compiled, passed = classify_status(message or "")
+        fingerprint = fingerprint or {}
+        self._pending_code[solution_hash] = code
+        self._pending.append((run_id, self._problem_id(dataset, module_name), sample_idx, solution_hash,
+                              status, int(compiled), int(passed), message,
+                              fingerprint.get("testbench"), fingerprint.get("toolchain")))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO solutions (hash, code) VALUES (?, ?)",
+                                  self._pending_code.items())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO verdicts (run_id, problem_id, sample_idx, solution_hash, status, "
+                "compiled, passed, message, testbench_hash, toolchain_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+            # 重新汇总受影响的 (run, problem)
+            touched = sorted({(row[0], row[1]) for row in self._pending})
+            status_sums = ", ".join(f"SUM(status = '{status}')" for status in STATUSES)
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO problem_results "
+                f"SELECT run_id, problem_id, COUNT(*), SUM(compiled), SUM(passed), {status_sums} "
+                f"FROM verdicts WHERE run_id = ? AND problem_id = ? GROUP BY run_id, problem_id",
+                touched,
+            )
+        self._pending = []
+        self._pending_code = {}
+
+    def import_solutions(self, dataset: str, path: str, model: Optional[str] = None) -> int:
+        """导入已测试的解决方案文件，返回导入的样本数"""
+        with open(path, "r", encoding="utf-8") as f:
+            solutions_data = json.load(f)
+        run_id = self.start_run(dataset, model or model_from_path(path), path)
+        count = 0
+        for entry in solutions_data:
+            module_name = entry.get("module_name")
+            if not module_name:
+                continue
+            for sample_idx, solution in enumerate(entry.get("solutions", [])):
+                self.add_verdict(run_id, dataset, module_name, sample_idx,
+                                 solution.get("solution", ""), solution.get("pass", ""), solution.get("fingerprint"))
+                count += 1
+        self.flush()
+        return count
+
+    # ---------------- 查询 ----------------
+    @staticmethod
+    def _pass_at_k_sql(column: str, k: int) -> str:
+        # pass@1 即 c/n，直接用SQL表达式；其余k调用注册的pass_at_k函数
+        if int(k) == 1:
+            return f"AVG(CAST({column} AS REAL) / n)"
+        return f"AVG(pass_at_k(n, {column}, {int(k)}))"
+
+    def summary(self, ks: Iterable[int] = (1,), dataset: Optional[str] = None) -> List[Dict[str, Any]]:
+        """每个运行的样本数、编译率、通过率以及各k的平均pass@k（n < k 的题目不计入）"""
+        ks = list(ks)
+        pass_columns = ", ".join(self._pass_at_k_sql("c", k) for k in ks)
+        syntax_columns = ", ".join(self._pass_at_k_sql("cc", k) for k in ks)
+        sql = f"""
+            SELECT r.id, r.dataset, r.model, COUNT(*), SUM(n), SUM(cc), SUM(c), {syntax_columns}, {pass_columns}
+            FROM (SELECT run_id, n, compiled AS cc, passed AS c FROM problem_results) AS per_problem
+            JOIN runs r ON r.id = per_problem.run_id
+            {"WHERE r.dataset = ?" if dataset else ""}
+            GROUP BY r.id ORDER BY r.dataset, r.model
+        """
+        rows = self.conn.execute(sql, (dataset,) if dataset else ()).fetchall()
+        results = []
+        for row in rows:
+            run_id, run_dataset, model, problems, samples, compiled, passed = row[:7]
+            results.append({
+                "run_id": run_id, "dataset": run_dataset, "model": model, "problems": problems,
+                "samples": samples, "compiled": compiled, "passed": passed,
+                "syntax": dict(zip(ks, row[7:7 + len(ks)])),
+                "functional": dict(zip(ks, row[7 + len(ks):])),
+            })
+        return results
+
+    def problems_everywhere(self, status: str, dataset: Optional[str] = None) -> List[Tuple[str, str]]:
+        """在该题出现过的每个运行中都至少有一个样本为该状态、且没有任何样本通过的题目"""
+        if status not in STATUSES:
+            raise ValueError(f"未知状态 {status!r}，可选: {', '.join(STATUSES)}")
+        sql = f"""
+            SELECT p.dataset, p.module_name
+            FROM problem_results pr
+            JOIN problems p ON p.id = pr.problem_id
+            {"WHERE p.dataset = ?" if dataset else ""}
+            GROUP BY pr.problem_id
+            HAVING SUM(pr.n_{status} > 0) = COUNT(*) AND SUM(pr.passed) = 0
+            ORDER BY p.dataset, p.module_name
+        """
+        return self.conn.execute(sql, (dataset,) if dataset else ()).fetchall()
+
+    def status_counts(self, run_id: Optional[int] = None) -> Dict[str, int]:
+        sums = ", ".join(f"SUM(n_{status})" for status in STATUSES)
+        sql = f"SELECT {sums} FROM problem_results" + (" WHERE run_id = ?" if run_id else "")
+        row = self.conn.execute(sql, (run_id,) if run_id else ()).fetchone()
+        return {status: count or 0 for status, count in zip(STATUSES, row)}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    for result in results:
+        metrics = "  ".join(
+            f"pass@{k} {value:.4f}" for k, value in result["functional"].items() if value is not None
+        )
+        syntax = result["syntax"].get(1)
+        syntax_text = f"  语法pass@1 {syntax:.4f}" if syntax is not None else ""
+        print(f"{result['dataset']:<16} {result['model']:<28} 题目 {result['problems']:>4}  "
+              f"样本 {result['samples']:>6}{syntax_text}  {metrics}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测试结果SQLite存储")
+    parser.add_argument("--db", default="results.sqlite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="导入已测试的解决方案文件")
+    p.add_argument("--dataset", required=True)
+    p.add_argument("--model", help="默认取自文件名 pass{k}_{model}.json")
+    p.add_argument("files", nargs="+")
+
+    p = sub.add_parser("summary", help="按运行汇总pass@k（SQL聚合）")
+    p.add_argument("--dataset")
+    p.add_argument("--ks", default="1", help="逗号分隔的k值")
+
+    p = sub.add_parser("everywhere", help="在所有运行中都处于某状态的题目")
+    p.add_argument("--status", default="timeout", choices=STATUSES)
+    p.add_argument("--dataset")
+    args = parser.parse_args()
+
+    db = ResultsDB(args.db)
+    start = time.perf_counter()
+    if args.command == "import":
+        for path in args.files:
+            count = db.import_solutions(args.dataset, path, args.model)
+            print(f"{path}: 导入 {count} 个样本")
+    elif args.command == "summary":
+        print_summary(db.summary([int(k) for k in args.ks.split(",")], args.dataset))
+    else:
+        rows = db.problems_everywhere(args.status, args.dataset)
+        for dataset, module_name in rows:
+            print(f"{dataset:<16} {module_name}")
+        print(f"共 {len(rows)} 个题目")
+    db.close()
+    print(f"耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
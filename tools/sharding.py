@@ -0,0 +1,146 @@
+"""
+问题/解决方案的确定性分片与合并
+
+分片只依赖 module_name：默认按 sha256(module_name) 取模，与文件顺序、机器和
+Python 的 hash 随机化无关，各节点独立计算得到互不重叠、合起来完整的划分。
+提供每题代价（如testbench大小或上次运行的耗时）时改用贪心均衡：按代价从大到小
+依次放入当前总代价最小的分片，同样是确定性的。贪心均衡总是在代价表覆盖的完整问题集
+上进行，再筛选出本次涉及的模块，因此按不同问题子集（如生成时的 problems 过滤、
+测试时解决方案文件中的模块）计算的分片仍属于同一个划分。
+
+使用方法:
+    index, count = parse_shard("0/4")
+    mine = select_shard(names, (index, count))
+    merged, report = merge_shards(["pass1_m.shard0of4.json", ...], expected=names)
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Shard = Tuple[int, int]
+
+
+def parse_shard(spec) -> Optional[Shard]:
+    """解析 "i/N"（i从0开始）；None或空字符串表示不分片"""
+    if spec is None or spec == "":
+        return None
+    if isinstance(spec, (tuple, list)):
+        index, count = int(spec[0]), int(spec[1])
+    else:
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", str(spec))
+        if not match:
+            raise ValueError(f"分片格式应为 i/N，例如 0/4: {spec!r}")
+        index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片序号应满足 0 <= i < N: {spec!r}")
+    return index, count
+
+
+def shard_key(name: str) -> int:
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big")
+
+
+def assign_shards(names: Iterable[str], count: int,
+                  weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """为每个模块分配分片号；weights中缺失的模块按已知代价的平均值计"""
+    names = list(dict.fromkeys(names))
+    if not weights:
+        return {name: shard_key(name) % count for name in names}
+
+    known = [weights[name] for name in names if name in weights]
+    default = sum(known) / len(known) if known else 1.0
+    cost = {name: float(weights.get(name, default)) for name in names}
+    loads = [0.0] * count
+    assignment = {}
+    # 代价相同时按哈希排序，保证各节点顺序一致
+    for name in sorted(names, key=lambda n: (-cost[n], shard_key(n), n)):
+        target = min(range(count), key=lambda i: (loads[i], i))
+        assignment[name] = target
+        loads[target] += cost[name]
+    return assignment
+
+
+def select_shard(names: Sequence[str], shard: Optional[Shard],
+                 weights: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    返回属于该分片的模块名，保持输入顺序
+
+    有代价表时先为其中的全部模块分配分片再筛选，与 names 是哪个子集无关；
+    代价表中没有的模块按哈希分片。
+    """
+    if shard is None:
+        return list(names)
+    index, count = shard
+    assignment = assign_shards(weights, count, weights) if weights else {}
+    return [name for name in names if assignment.get(name, shard_key(name) % count) == index]
+
+
+def shard_path(path: str, shard: Optional[Shard]) -> str:
+    """pass1_m.json -> pass1_m.shard0of4.json"""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard[0]}of{shard[1]}{ext}"
+
+
+def load_weights(spec: Optional[str], problems_file: Optional[str] = None) -> Optional[Dict[str, float]]:
+    """
+    分片代价来源:
+        None    -- 不加权，按哈希分片
+        "size"  -- 问题记录的字节数（主要是testbench，近似仿真代价）
+        路径    -- JSON文件 {module_name: cost}；给出 problems_file 时，文件中缺失的问题
+                   按已知代价的平均值补齐，使分片总是在完整问题集上计算
+    """
+    if not spec:
+        return None
+    if spec == "size":
+        from tools.problem_index import ProblemIndex
+
+        with ProblemIndex(problems_file) as index:
+            return {name: float(index.size(name)) for name in index.names()}
+    with open(spec, "r", encoding="utf-8") as f:
+        weights = {name: float(cost) for name, cost in json.load(f).items()}
+    if problems_file and os.path.exists(problems_file):
+        from tools.problem_index import ProblemIndex
+
+        default = sum(weights.values()) / len(weights) if weights else 1.0
+        with ProblemIndex(problems_file) as index:
+            for name in index.names():
+                weights.setdefault(name, default)
+    return weights
+
+
+def merge_shards(paths: Sequence[str],
+                 expected: Optional[Sequence[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    合并各分片的输出文件
+
+    返回 (合并后的模块列表, 报告)。报告中 overlaps 记录出现在多个文件中的模块及
+    其来源文件，gaps 记录 expected 中没有任何分片覆盖的模块，unexpected 记录不在
+    expected 中的模块。重复的模块只保留第一次出现的条目。给出 expected 时按其顺序
+    输出，其余模块排在最后。
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    sources: Dict[str, List[str]] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for entry in json.load(f):
+                name = entry.get("module_name")
+                sources.setdefault(name, []).append(path)
+                entries.setdefault(name, entry)
+
+    overlaps = {name: files for name, files in sources.items() if len(files) > 1}
+    order = list(entries)
+    gaps: List[str] = []
+    unexpected: List[str] = []
+    if expected is not None:
+        expected_set = set(expected)
+        gaps = [name for name in expected if name not in entries]
+        unexpected = [name for name in order if name not in expected_set]
+        order = [name for name in expected if name in entries] + unexpected
+
+    report = {"files": list(paths), "modules": len(entries), "overlaps": overlaps,
+              "gaps": gaps, "unexpected": unexpected}
+    return [entries[name] for name in order], report
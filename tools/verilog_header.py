@@ -0,0 +1,248 @@
+"""
+编译前的模块接口预检查
+
+解析候选代码的模块声明，与题目的 module_header 比较模块名、端口名、方向和位宽。
+只有必然导致编译失败的不一致才直接判定（不再调用iverilog）:
+    - 代码中有模块声明，但没有测试台实例化的那个模块名
+    - 测试台按名称连接（.port(sig) 或 .port）的端口在候选模块的端口列表中不存在
+方向、位宽不一致或多出的端口只记录为诊断信息，仍交给编译器判断（iverilog 对位宽
+不匹配只给出警告，测试台也可能只连接部分端口）。解析不了的写法（宏、generate 中的
+端口、预处理指令等）一律视为无法判断，不会误判。
+
+使用方法:
+    result = precheck_interface(code, problem["module_header"], testbench)
+    if result["reason"]:
+        status = f"接口检查失败: {result['reason']}"
+    result["issues"]   # [{"kind": "width", "port": "a", "expected": 8, "found": 4}, ...]
+"""
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+DIRECTIONS = ("input", "output", "inout")
+_NET_TYPES = r"(?:wire|reg|logic|bit|var|signed|unsigned|integer|tri|wand|wor|uwire)"
+_PORT_ITEM = re.compile(
+    rf"^(?:(input|output|inout)\b\s*)?((?:{_NET_TYPES}\b\s*)*)((?:\[[^\]]*\]\s*)*)([A-Za-z_]\w*)\s*"
+    r"((?:\[[^\]]*\]\s*)*)(?:=.*)?$",
+    re.S,
+)
+_DECLARATION = re.compile(
+    rf"\b(input|output|inout)\b\s*((?:{_NET_TYPES}\b\s*)*)((?:\[[^\]]*\]\s*)*)([^;]*);"
+)
+_MODULE = re.compile(r"\b(?:macro)?module\s+([A-Za-z_]\w*)")
+_RANGE = re.compile(r"\[\s*(-?\d+)\s*:\s*(-?\d+)\s*\]")
+_PAIRS = {"(": ")", "[": "]", "{": "}"}
+
+Port = Dict[str, Any]
+
+
+def strip_comments(text: str) -> str:
+    text = re.sub(r"/\*.*?\*/", " ", text or "", flags=re.S)
+    return re.sub(r"//[^\n]*", "", text)
+
+
+def _balanced(text: str, start: int) -> Optional[int]:
+    """text[start] 为左括号，返回匹配的右括号之后的位置"""
+    stack = []
+    for i in range(start, len(text)):
+        char = text[i]
+        if char in _PAIRS:
+            stack.append(_PAIRS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return i + 1
+    return None
+
+
+def _split_top(text: str) -> List[str]:
+    """按不在括号内的逗号切分"""
+    items, depth, current = [], 0, []
+    for char in text:
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char == "," and depth == 0:
+            items.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current).strip())
+    return [item for item in items if item]
+
+
+def _width(types: str, ranges: str) -> Optional[int]:
+    """常数位宽，范围中含参数等表达式时返回None"""
+    dims = re.findall(r"\[[^\]]*\]", ranges)
+    if not dims:
+        return 32 if "integer" in types.split() else 1
+    width = 1
+    for dim in dims:
+        match = _RANGE.fullmatch(dim.strip())
+        if not match:
+            return None
+        width *= abs(int(match.group(1)) - int(match.group(2))) + 1
+    return width
+
+
+def _port(direction: Optional[str], types: str, ranges: str) -> Port:
+    return {"direction": direction, "width": _width(types, ranges)}
+
+
+def _parse_ports(port_list: str, body: str) -> Optional[Dict[str, Port]]:
+    """ANSI 或非ANSI端口列表，无法解析时返回None"""
+    items = _split_top(port_list)
+    parsed = [_PORT_ITEM.match(item) for item in items]
+    if not all(parsed):
+        return None
+    ports: Dict[str, Port] = {}
+
+    if items and parsed[0].group(1) is None:
+        # 非ANSI：端口列表只有名称，方向和位宽在模块体的 input/output 声明中
+        if any(m.group(1) or m.group(2).strip() or m.group(3).strip() for m in parsed):
+            return None
+        ports = {m.group(4): _port(None, "", "") for m in parsed}
+        ports_unknown = set(ports)
+        for declaration in _DECLARATION.finditer(body):
+            direction, types, ranges, names = declaration.groups()
+            for name in _split_top(names):
+                name = re.split(r"[\s=\[]", name.strip(), 1)[0]
+                if name in ports:
+                    ports[name] = _port(direction, types, ranges)
+                    ports_unknown.discard(name)
+        for name in ports_unknown:
+            ports[name]["width"] = None
+        return ports
+
+    # ANSI：省略方向的端口沿用前一个端口的方向，同时省略类型和位宽时也沿用位宽
+    direction = types = ranges = ""
+    for match in parsed:
+        item_direction, item_types, item_ranges, name, _ = match.groups()
+        if item_direction:
+            direction, types, ranges = item_direction, item_types, item_ranges
+        elif item_types.strip() or item_ranges.strip():
+            types, ranges = item_types, item_ranges
+        ports[name] = _port(direction, types, ranges)
+    return ports
+
+
+def parse_modules(code: str) -> Dict[str, Optional[Dict[str, Port]]]:
+    """
+    代码中声明的全部模块 -> 端口表 {名称: {"direction", "width"}}
+
+    端口列表无法解析的模块对应None；缺少 endmodule 时模块体一直到代码末尾，
+    因此也可直接解析只有声明部分的 module_header。
+    """
+    text = strip_comments(code)
+    modules: Dict[str, Optional[Dict[str, Port]]] = {}
+    for match in _MODULE.finditer(text):
+        name, pos = match.group(1), match.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if text.startswith("#", pos):
+            pos = text.find("(", pos)
+            pos = _balanced(text, pos) if pos >= 0 else None
+            if pos is None:
+                modules[name] = None
+                continue
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+        port_list = ""
+        if text.startswith("(", pos):
+            end = _balanced(text, pos)
+            if end is None:
+                modules[name] = None
+                continue
+            port_list, pos = text[pos + 1:end - 1], end
+        end_match = re.search(r"\bendmodule\b", text[pos:])
+        body = text[pos:pos + end_match.start()] if end_match else text[pos:]
+        if not body.lstrip().startswith(";"):
+            modules[name] = None
+            continue
+        modules[name] = _parse_ports(port_list, body)
+    return modules
+
+
+def parse_header(module_header: str) -> Tuple[Optional[str], Optional[Dict[str, Port]]]:
+    """module_header 中的 (模块名, 端口表)"""
+    modules = parse_modules(module_header)
+    if not modules:
+        return None, None
+    name = next(iter(modules))
+    return name, modules[name]
+
+
+def connected_ports(testbench: str, module_name: str) -> Optional[Set[str]]:
+    """
+    测试台实例化 module_name 时按名称连接的端口
+
+    未实例化该模块时返回None；.* 和按位置的连接不计入。
+    """
+    text = strip_comments(testbench)
+    found = False
+    ports: Set[str] = set()
+    for match in re.finditer(rf"\b{re.escape(module_name)}\b\s*", text):
+        pos = match.end()
+        if text.startswith("#", pos):
+            pos = text.find("(", pos)
+            pos = _balanced(text, pos) if pos >= 0 else None
+            if pos is None:
+                continue
+        instance = re.compile(r"\s*[A-Za-z_]\w*\s*(?:\[[^\]]*\]\s*)?\(").match(text, pos)
+        if not instance:
+            continue
+        end = _balanced(text, instance.end() - 1)
+        if end is None:
+            continue
+        found = True
+        for item in _split_top(text[instance.end():end - 1]):
+            named = re.match(r"\.([A-Za-z_]\w*)", item)
+            if named:
+                ports.add(named.group(1))
+    return ports if found else None
+
+
+def precheck_interface(code: str, module_header: str, testbench: str) -> Dict[str, Any]:
+    """
+    比较候选代码与 module_header 的模块接口
+
+    返回 {"reason": 必然编译失败的原因或None, "issues": [诊断, ...]}
+    """
+    result: Dict[str, Any] = {"reason": None, "issues": []}
+    expected_name, expected_ports = parse_header(module_header)
+    # 预处理指令（宏、条件编译、include）可能改变模块声明，交给编译器
+    if not expected_name or re.search(r"`(?!timescale\b)[A-Za-z_]", strip_comments(code)):
+        return result
+    modules = parse_modules(code)
+    required = connected_ports(testbench, expected_name)
+
+    if expected_name not in modules:
+        if modules and required is not None:
+            result["reason"] = f"缺少模块 {expected_name}（代码中的模块: {', '.join(modules)}）"
+        return result
+    ports = modules[expected_name]
+    if ports is None:
+        return result
+
+    missing = sorted(required - set(ports)) if required else []
+    if missing:
+        result["reason"] = f"模块 {expected_name} 缺少端口 {', '.join(missing)}"
+    for name in missing:
+        result["issues"].append({"kind": "missing", "port": name})
+    if expected_ports is None:
+        return result
+
+    for name, expected in expected_ports.items():
+        port = ports.get(name)
+        if port is None:
+            if name not in missing:
+                result["issues"].append({"kind": "missing", "port": name})
+            continue
+        for kind in ("direction", "width"):
+            if expected[kind] is not None and port[kind] is not None and expected[kind] != port[kind]:
+                result["issues"].append({"kind": kind, "port": name, "expected": expected[kind],
+                                         "found": port[kind]})
+    for name in ports:
+        if name not in expected_ports:
+            result["issues"].append({"kind": "extra", "port": name})
+    return result
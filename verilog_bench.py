@@ -0,0 +1,342 @@
+"""
+统一命令行入口
+
+    python verilog_bench.py generate-api   --dataset verilogeval_v2 --model gpt-4o-mini --k 5
+    python verilog_bench.py generate-local --dataset resbench --model-path /path/to/model
+    python verilog_bench.py evaluate       --dataset rtllm_v2 --solutions pass1_gpt-3.5-turbo.json
+    python verilog_bench.py report         --dataset resbench --solutions pass1_gpt-3.5-turbo.json
+    python verilog_bench.py evaluate       --dataset verilogeval_v2 --solutions pass1_m.json --shard 0/4
+    python verilog_bench.py compare        resbench/pass*.json rtllm_v2/pass*.json --csv matrix.csv
+    python verilog_bench.py merge          --dataset verilogeval_v2 --output pass1_m.json pass1_m.shard*of4.json
+    python verilog_bench.py bench-startup
+
+命令在对应数据集目录下执行（与直接运行数据集目录中的脚本等价），相对路径按该目录解析。
+openai、tqdm、vllm 等依赖只在需要它们的子命令内部导入，report 等命令不加载这些库。
+"""
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+from tools.compare_args import add_compare_arguments
+from tools.datasets import DATASETS
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(dataset, script):
+    """
+    加载数据集目录下的脚本模块，并切换到该目录
+
+    数据集目录加入 sys.path，脚本之间的导入（如 generate_api 导入 functional_correctness）
+    会使用同一数据集的版本。generate_llm.py 只在 resbench 中提供，其他数据集共用它。
+    """
+    dataset_dir = os.path.join(ROOT_DIR, dataset)
+    path = os.path.join(dataset_dir, f"{script}.py")
+    if not os.path.exists(path):
+        path = os.path.join(ROOT_DIR, "resbench", f"{script}.py")
+    sys.path.insert(0, dataset_dir)
+    os.chdir(dataset_dir)
+    spec = importlib.util.spec_from_file_location(script, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[script] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_config(defaults, args, overrides):
+    """默认配置 <- --config JSON文件 <- 命令行参数"""
+    config = copy.deepcopy(defaults)
+    if args.config:
+        with open(os.path.abspath(args.config), "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    for key, value in overrides.items():
+        if value is not None:
+            config[key] = value
+    return config
+
+
+def weights_arg(spec):
+    """--shard-weights 的文件路径在切换到数据集目录前转换为绝对路径"""
+    if spec is None or spec == "size":
+        return spec
+    return os.path.abspath(spec)
+
+
+def metrics_arg(args):
+    """--metrics-file / --metrics-port 转换为 tools.metrics.start_exporter 的设置"""
+    settings = {}
+    if args.metrics_file:
+        settings["textfile"] = os.path.abspath(args.metrics_file)
+    if args.metrics_port is not None:
+        settings["http_port"] = args.metrics_port
+    return settings or None
+
+
+def cmd_generate_api(args):
+    import asyncio
+
+    config_path = os.path.abspath(args.config) if args.config else None
+    shard_weights = weights_arg(args.shard_weights)
+    metrics = metrics_arg(args)
+    module = load_script(args.dataset, "generate_api")
+    args.config = config_path
+    config = build_config(module.DEFAULT_CONFIG, args, {
+        "prompt_file": f"problems_{args.dataset}.jsonl",
+        "model_name": args.model,
+        "base_url": args.base_url,
+        "endpoint_tag": args.endpoint_tag,
+        "api_key": args.api_key or os.environ.get("OPENAI_API_KEY"),
+        "k": args.k,
+        "max_concurrent": args.max_concurrent,
+        "shard": args.shard,
+        "shard_weights": shard_weights,
+        "metrics": metrics,
+    })
+    asyncio.run(module.main(config))
+
+
+def cmd_generate_local(args):
+    config_path = os.path.abspath(args.config) if args.config else None
+    shard_weights = weights_arg(args.shard_weights)
+    module = load_script(args.dataset, "generate_llm")
+    args.config = config_path
+    config = build_config(module.DEFAULT_CONFIG, args, {
+        "prompt_file": f"problems_{args.dataset}.jsonl",
+        "model_path": args.model_path,
+        "model_name": args.model_name,
+        "k": args.k,
+        "mock_engine": True if args.mock_engine else None,
+        "shard": args.shard,
+        "shard_weights": shard_weights,
+    })
+    module.generate_solutions(config)
+
+
+def cmd_evaluate(args):
+    solutions = os.path.abspath(args.solutions)
+    shard_weights = weights_arg(args.shard_weights)
+    results_db = os.path.abspath(args.results_db) if args.results_db else None
+    metrics = metrics_arg(args)
+    module = load_script(args.dataset, "functional_correctness")
+    module.SOLUTIONS_FILE = solutions
+    module.RESULTS_DB = results_db
+    module.METRICS = metrics
+    module.COORDINATOR = args.coordinator and os.path.abspath(args.coordinator)
+    module.JOB_WEIGHT = args.job_weight
+    module.JOB_PRIORITY = args.job_priority
+    module.INCREMENTAL = args.incremental
+    module.STAMP_FINGERPRINTS = args.stamp_fingerprints
+    module.INTERFACE_PRECHECK = args.precheck
+    if args.resources:
+        if not hasattr(module, "RESOURCE_USAGE"):
+            print(f"警告: {args.dataset} 不支持资源统计，忽略 --resources")
+        else:
+            module.RESOURCE_USAGE = {"target": args.synth_target, "workers": args.synth_workers}
+    module.SHARD = args.shard
+    module.SHARD_WEIGHTS = shard_weights
+    try:
+        module.run_functional_correctness()
+    except KeyboardInterrupt:
+        print("\n用户中断程序执行")
+        module.clean_up_simulation()
+
+
+def print_results(module, solutions_data):
+    """自适应采样（首次通过即停止）的结果用前k个样本估计pass@k，其余用标准估计"""
+    from tools.passk import is_sequential, print_sequential_metrics
+
+    if is_sequential(solutions_data):
+        print_sequential_metrics(solutions_data)
+    else:
+        module.print_metrics(module.collect_module_results(solutions_data))
+
+
+def cmd_report(args):
+    solutions = os.path.abspath(args.solutions)
+    module = load_script(args.dataset, "functional_correctness")
+    with open(solutions, "r", encoding="utf-8") as f:
+        solutions_data = json.load(f)
+    unevaluated = sum(
+        1 for entry in solutions_data for solution in entry.get("solutions", []) if not solution.get("pass")
+    )
+    if unevaluated:
+        print(f"警告: {unevaluated} 个解决方案尚未测试（pass字段为空），按未通过计算")
+    print_results(module, solutions_data)
+    if any(solution.get("resource_usage") for entry in solutions_data for solution in entry.get("solutions", [])):
+        from tools.resource_usage import print_resource_summary, summarize_resources
+
+        print_resource_summary(summarize_resources(solutions_data))
+
+
+def cmd_merge(args):
+    """合并分片输出，检查重复和遗漏后再计算指标"""
+    shard_files = [os.path.abspath(path) for path in args.shards]
+    output = os.path.abspath(args.output)
+    module = load_script(args.dataset, "functional_correctness")
+    from tools.problem_index import ProblemIndex
+    from tools.sharding import merge_shards
+
+    with ProblemIndex(module.PROBLEMS_FILE) as index:
+        expected = index.select(args.problems)
+    merged, report = merge_shards(shard_files, expected=expected)
+
+    print(f"合并 {len(shard_files)} 个分片文件，共 {report['modules']} 个模块（期望 {len(expected)} 个）")
+    for name, files in report["overlaps"].items():
+        print(f"  重复: {name} 出现在 {', '.join(os.path.basename(f) for f in files)}")
+    if report["gaps"]:
+        print(f"  遗漏 {len(report['gaps'])} 个模块: {', '.join(report['gaps'][:20])}"
+              f"{' ...' if len(report['gaps']) > 20 else ''}")
+    if report["unexpected"]:
+        print(f"  {len(report['unexpected'])} 个模块不在问题集中: {', '.join(report['unexpected'][:20])}")
+    if (report["overlaps"] or report["gaps"]) and not args.allow_incomplete:
+        print("错误: 分片有重复或遗漏，未写出合并结果（使用 --allow-incomplete 强制合并）")
+        sys.exit(1)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False, indent=4)
+    print(f"合并结果保存到 {output}")
+
+    # 分片已经测试过时直接计算最终指标
+    evaluated = any(solution.get("pass") for entry in merged for solution in entry.get("solutions", []))
+    if evaluated:
+        print_results(module, merged)
+
+
+def cmd_compare(args):
+    from tools.compare import run_compare
+
+    run_compare(args)
+
+
+def cmd_bench_startup(args):
+    """测量各子命令的启动时间（新进程执行 --help）以及各脚本的导入时间"""
+    python = sys.executable
+    cases = [
+        ("verilog_bench.py --help", [python, __file__, "--help"]),
+        ("report --help", [python, __file__, "report", "--help"]),
+        ("generate-api --help", [python, __file__, "generate-api", "--help"]),
+    ]
+    for dataset in DATASETS:
+        for script in ("generate_api", "functional_correctness"):
+            code = f"import sys; sys.path.insert(0, {os.path.join(ROOT_DIR, dataset)!r}); import {script}"
+            cases.append((f"import {dataset}/{script}", [python, "-c", code]))
+    baseline_cmd = [python, "-c", "pass"]
+
+    def measure(cmd):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000
+
+    baseline = measure(baseline_cmd)
+    results = [{"case": "python -c pass", "median_ms": baseline}]
+    print(f"{'场景':<45} {'中位数(ms)':>12} {'扣除解释器启动(ms)':>20}")
+    print("-" * 80)
+    print(f"{'python -c pass':<45} {baseline:>12.1f} {0.0:>20.1f}")
+    for name, cmd in cases:
+        median = measure(cmd)
+        results.append({"case": name, "median_ms": median})
+        print(f"{name:<45} {median:>12.1f} {median - baseline:>20.1f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+def add_shard_arguments(parser):
+    parser.add_argument("--shard", help="只处理第i个分片（共N个，i从0开始），格式 i/N")
+    parser.add_argument("--shard-weights",
+                        help="分片代价：size（按问题记录大小）或JSON文件 {模块名: 代价}；默认按模块名哈希")
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-file", help="定期写入Prometheus文本格式指标的文件（textfile collector）")
+    parser.add_argument("--metrics-port", type=int, help="在该端口提供 /metrics HTTP端点")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Verilog代码生成与测试统一入口")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate-api", help="通过API生成解决方案")
+    p.add_argument("--dataset", choices=DATASETS, required=True)
+    p.add_argument("--config", help="JSON配置文件，覆盖generate_api.py中的DEFAULT_CONFIG")
+    p.add_argument("--model", help="模型名称")
+    p.add_argument("--base-url")
+    p.add_argument("--endpoint-tag", help="结果文件名中的端点标识，输出 pass{k}_{model}@{tag}.json，默认不加")
+    p.add_argument("--api-key", help="默认读取环境变量OPENAI_API_KEY")
+    p.add_argument("--k", type=int)
+    p.add_argument("--max-concurrent", type=int)
+    add_shard_arguments(p)
+    add_metrics_arguments(p)
+    p.set_defaults(func=cmd_generate_api)
+
+    p = sub.add_parser("generate-local", help="使用本地vLLM模型生成解决方案")
+    p.add_argument("--dataset", choices=DATASETS, required=True)
+    p.add_argument("--config", help="JSON配置文件，覆盖generate_llm.py中的DEFAULT_CONFIG")
+    p.add_argument("--model-path")
+    p.add_argument("--model-name")
+    p.add_argument("--k", type=int)
+    p.add_argument("--mock-engine", action="store_true", help="使用CPU模拟引擎空跑")
+    add_shard_arguments(p)
+    p.set_defaults(func=cmd_generate_local)
+
+    p = sub.add_parser("evaluate", help="编译仿真并计算pass@k")
+    p.add_argument("--dataset", choices=DATASETS, required=True)
+    p.add_argument("--solutions", required=True, help="解决方案JSON文件")
+    p.add_argument("--results-db", help="同时把判定写入该SQLite结果库（见 tools/results_db.py）")
+    add_shard_arguments(p)
+    add_metrics_arguments(p)
+    p.add_argument("--coordinator", help="向本机的调度协调器注册，公平共享仿真槽位（见 tools/coordinator.py）")
+    p.add_argument("--job-weight", type=float, default=1.0, help="公平份额的权重")
+    p.add_argument("--job-priority", type=int, default=0, help="优先级，越大越先分配槽位")
+    p.add_argument("--incremental", action="store_true",
+                   help="只重新测试测试台、代码或工具链指纹变化的解决方案（结果写回原文件）")
+    p.add_argument("--stamp-fingerprints", action="store_true",
+                   help="为没有指纹的已有判定补记当前指纹并视为有效，用于首次启用增量测试的历史结果")
+    p.add_argument("--precheck", action="store_true",
+                   help="编译前检查模块接口，必然编译失败的样本不再调用iverilog（会改变判定文本和工具链指纹）")
+    p.add_argument("--resources", action="store_true",
+                   help="功能测试后用Yosys综合通过的样本，统计LUT/FF等资源（仅resbench，见 tools/resource_usage.py）")
+    p.add_argument("--synth-target", default="xilinx", choices=["xilinx", "ice40", "generic"], help="综合目标")
+    p.add_argument("--synth-workers", type=int, default=None, help="并行综合数，默认为CPU核数")
+    p.set_defaults(func=cmd_evaluate)
+
+    p = sub.add_parser("merge", help="合并分片输出，检查重复和遗漏后计算指标")
+    p.add_argument("--dataset", choices=DATASETS, required=True)
+    p.add_argument("--output", required=True, help="合并后的JSON文件")
+    p.add_argument("--problems", nargs="+", help="期望覆盖的问题（名称或通配符），默认为全部问题")
+    p.add_argument("--allow-incomplete", action="store_true", help="有重复或遗漏时仍写出合并结果")
+    p.add_argument("shards", nargs="+", help="各分片的输出文件")
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("report", help="根据已测试结果中的pass字段重新计算指标（不运行仿真）")
+    p.add_argument("--dataset", choices=DATASETS, required=True)
+    p.add_argument("--solutions", required=True, help="已测试的解决方案JSON文件")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("compare", help="多个结果文件的横向对比（模型 × 数据集 × 指标）")
+    add_compare_arguments(p)
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser("bench-startup", help="测量各子命令的启动和导入时间")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--output", help="结果保存为JSON")
+    p.set_defaults(func=cmd_bench_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,22 @@ import json
 import os
 import asyncio
 import re
-from typing import Dict, Any, List
-from tqdm.asyncio import tqdm as async_tqdm
-from openai import OpenAI
+import sys
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 
-# 设置工作目录为当前文件所在目录
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+# 仓库根目录，用于导入tools/中的共用模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
 
 @dataclass
 class Problem:
@@ -17,23 +26,383 @@ class Problem:
     module_name: str
 
 
+class ResponseCache:
+    """
+    磁盘上的LLM原始回复缓存（SQLite），按总字节数做LRU淘汰
+
+    命中时只在内存中记录访问时间，每 TOUCH_BATCH 次命中或淘汰、关闭前批量写回；
+    超出容量时一次淘汰到 EVICT_WATERMARK 倍容量以下，而不是每次插入都淘汰一条。
+    """
+
+    TOUCH_BATCH = 256
+    EVICT_WATERMARK = 0.9
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, cache_only: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._touched: Dict[str, float] = {}
+        # 总字节数只在打开时统计一次，之后随插入/删除增量维护
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name: str, base_url: str, prompt: str, params: Dict[str, Any], sample_idx: int) -> str:
+        payload = json.dumps(
+            [model_name, base_url, prompt, params, sample_idx],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str):
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._touched.pop(key, None)
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, content, size, time.time()),
+            )
+            self._total += size - (row[0] if row else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(ts, key) for key, ts in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        # 按最近访问时间从旧到新删除（走last_access索引），一次删到低水位以下
+        self._flush_touched()
+        target = self.max_bytes * self.EVICT_WATERMARK
+        cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        victims = []
+        for key, size in cursor:
+            if self._total <= target:
+                break
+            victims.append((key,))
+            self._total -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+class ConcurrencyLimiter:
+    """固定上限的请求级并发控制，与asyncio.Semaphore等价，但会接收每次请求的结果反馈"""
+
+    def __init__(self, limit: int):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+
+    async def release(self, latency: float, error: Optional[BaseException] = None):
+        async with self._cond:
+            self.in_flight -= 1
+            self._on_result(latency, error)
+            self._cond.notify_all()
+
+    def _on_result(self, latency: float, error: Optional[BaseException]):
+        pass
+
+
+class AIMDConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    加性增/乘性减（AIMD）自适应并发控制
+
+    延迟和错误率正常时，每个成功请求把上限增加 increase/limit（约每轮+increase）；
+    遇到429、超时或近期延迟超过基线的 latency_tolerance 倍时，上限乘以 decrease。
+    两次下调之间至少间隔一个基线延迟，避免同一波错误把上限连续压到最低。
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 256,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_tolerance: float = 2.0, log=print):
+        super().__init__(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.baseline_latency: Optional[float] = None
+        self.recent_latency: Optional[float] = None
+        self.decisions: List[Dict[str, Any]] = []
+        self._log = log
+        self._last_decrease = 0.0
+
+    def _on_result(self, latency: float, error: Optional[BaseException]):
+        now = time.monotonic()
+        if error is not None:
+            if _is_overload_error(error):
+                self._decrease(now, f"{type(error).__name__}")
+            return
+
+        # 短期延迟(快速EWMA)与基线(慢速EWMA)比较，单个长回复不会触发下调
+        if self.baseline_latency is None:
+            self.baseline_latency = self.recent_latency = latency
+        self.recent_latency = 0.8 * self.recent_latency + 0.2 * latency
+        if self.recent_latency > self.latency_tolerance * self.baseline_latency:
+            self._decrease(
+                now, f"延迟尖峰 {self.recent_latency:.2f}s > {self.latency_tolerance}x基线 {self.baseline_latency:.2f}s"
+            )
+            return
+        self.baseline_latency = 0.98 * self.baseline_latency + 0.02 * latency
+        if self.in_flight + 1 >= int(self.limit):
+            # 只有上限被用满时才有必要继续增加
+            self._set_limit(self.limit + self.increase / self.limit, "延迟与错误率正常")
+
+    def _decrease(self, now: float, reason: str):
+        window = self.baseline_latency or 0.0
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self._set_limit(self.limit * self.decrease, reason)
+
+    def _set_limit(self, new_limit: float, reason: str):
+        new_limit = min(float(self.max_limit), max(float(self.min_limit), new_limit))
+        old = int(self.limit)
+        self.limit = new_limit
+        if int(new_limit) != old:
+            decision = {"time": time.time(), "old": old, "new": int(new_limit), "reason": reason}
+            self.decisions.append(decision)
+            if self._log is not None:
+                self._log(f"[AIMD] 并发上限 {old} -> {int(new_limit)} ({reason})")
+
+
+def _is_overload_error(error: BaseException) -> bool:
+    """429限流、超时、连接错误和5xx视为服务端过载"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    if type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def _usage_counts(usage) -> Dict[str, Optional[int]]:
+    """从usage中取prompt token数和缓存命中token数（OpenAI/DeepSeek两种字段）"""
+    if usage is None:
+        return {}
+    cached = None
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and getattr(details, "cached_tokens", None) is not None:
+        cached = details.cached_tokens
+    elif getattr(usage, "prompt_cache_hit_tokens", None) is not None:
+        cached = usage.prompt_cache_hit_tokens
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "cached_tokens": cached,
+    }
+
+
+def _discard_result(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _stream_cut(text: str) -> Optional[int]:
+    """
+    判断流式输出中的第一个代码块是否已经结束，返回截断位置（未结束返回None）
+
+    有```verilog围栏时以闭合围栏为准；没有围栏时，endmodule之后出现
+    非Verilog内容（如解释文字）或单独一行的闭合围栏```即视为代码结束。
+    """
+    fence = re.search(r"```verilog[^\n]*\n", text, re.IGNORECASE)
+    if fence:
+        close = text.find("\n```", fence.end() - 1)
+        return close + len("\n```") if close != -1 else None
+    for m in re.finditer(r"\bendmodule\b", text):
+        # 只检查已经完整接收的行，避免把半行内容误判为解释文字
+        lines = text[m.end():text.rfind("\n") + 1].splitlines(keepends=True)
+        pos = m.end() + (len(lines[0]) if lines else 0)
+        for raw in lines[1:]:
+            line = raw.strip()
+            pos += len(raw)
+            if not line:
+                continue
+            if re.fullmatch(r"```\s*", line):
+                # 无语言标记的代码块在此闭合（必须先于下面的编译指令判断）
+                return pos - len(raw) + len(raw.rstrip())
+            if line.startswith(("module", "//", "/*", "`")):
+                break
+            return m.end()
+    return None
+
+
 class VerilogGenerator:
-    def __init__(self, api_key: str, base_url: str, model_name: str):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(self, api_key: str, base_url: str, model_name: str,
+                 cache: Optional[ResponseCache] = None, stream: bool = False,
+                 limiter: Optional[ConcurrencyLimiter] = None, max_retries: int = 3,
+                 timeout: Optional[float] = None, hedge_percentile: Optional[float] = None,
+                 hedge_budget: float = 0.05, hedge_min_samples: int = 20,
+                 client=None, prompt_layout: str = "default", metrics=None):
+        if client is None:
+            from openai import OpenAI
+
+            # 重试由_limited_call负责，关闭客户端自带的重试，否则429对并发控制不可见
+            client_kwargs = {"api_key": api_key, "base_url": base_url, "max_retries": 0}
+            if timeout is not None:
+                client_kwargs["timeout"] = timeout
+            client = OpenAI(**client_kwargs)
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_url = base_url
         self.model_name = model_name
+        self.cache = cache
+        self.stream = stream
+        # "default": 原始prompt；"prefix": 所有固定说明放在最前面，使各题prompt共享最长前缀，
+        # 便于服务端prompt缓存复用
+        self.prompt_layout = prompt_layout
+        # 每次API请求的耗时记录: ttft(首token时间), latency(总耗时), early_stop,
+        # 以及服务端返回usage时的prompt_tokens/cached_tokens
+        self.request_stats: List[Dict[str, Any]] = []
+        # 对冲请求：请求耗时超过实时延迟分布的hedge_percentile分位数时补发一份，
+        # 额外请求数不超过原始请求数的hedge_budget
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_stats = {"requests": 0, "hedged": 0, "won": 0}
+        self._latencies = deque(maxlen=1000)
+        # 可选的运行指标（tools.metrics.GenerationMetrics），以model_name为标签
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.track_limiter(model_name, limiter)
+
+    def _sampling_params(self, k: int) -> Dict[str, Any]:
+        return {"temperature": 0 if k == 1 else 0.6}
 
     def _agent_call(self, messages, k):
-        temperature = 0 if k == 1 else 0.6
+        if self.stream:
+            return self._agent_call_stream(messages, k)
+        start = time.perf_counter()
         response = self.client.chat.completions.create(
             model=self.model_name,
             messages=messages,
-            temperature=temperature,
+            **self._sampling_params(k),
             stream=False,
         )
         content = response.choices[0].message.content
+        latency = time.perf_counter() - start
+        stats = {"ttft": latency, "latency": latency, "early_stop": False}
+        stats.update(_usage_counts(getattr(response, "usage", None)))
+        self._record_request(stats)
         return content
 
+    def _agent_call_stream(self, messages, k):
+        """流式请求，代码块闭合后立即关闭连接，不再接收后续解释文字"""
+        start = time.perf_counter()
+        ttft = None
+        early_stop = False
+        parts = []
+        usage = None
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            **self._sampling_params(k),
+            stream=True,
+        )
+        try:
+            for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                parts.append(delta)
+                # 代码块只可能在换行或围栏字符到达时闭合，其余片段无需重新扫描
+                if "`" in delta or "\n" in delta:
+                    text = "".join(parts)
+                    cut = _stream_cut(text)
+                    if cut is not None:
+                        parts = [text[:cut]]
+                        early_stop = True
+                        break
+        finally:
+            response.close()
+        latency = time.perf_counter() - start
+        stats = {
+            "ttft": ttft if ttft is not None else latency,
+            "latency": latency,
+            "early_stop": early_stop,
+        }
+        stats.update(_usage_counts(usage))
+        self._record_request(stats)
+        return "".join(parts)
+
+    def _record_request(self, stats: Dict[str, Any]):
+        self.request_stats.append(stats)
+        if self.metrics is not None:
+            self.metrics.record_request(self.model_name, stats)
+
+    def latency_summary(self) -> Dict[str, Any]:
+        ttfts = [s["ttft"] for s in self.request_stats]
+        latencies = [s["latency"] for s in self.request_stats]
+        return {
+            "requests": len(self.request_stats),
+            "early_stops": sum(1 for s in self.request_stats if s["early_stop"]),
+            "ttft_p50": _percentile(ttfts, 0.5),
+            "ttft_p95": _percentile(ttfts, 0.95),
+            "latency_p50": _percentile(latencies, 0.5),
+            "latency_p95": _percentile(latencies, 0.95),
+            "prompt_tokens": sum(s.get("prompt_tokens") or 0 for s in self.request_stats),
+            # None表示服务端没有返回缓存命中信息
+            "cached_tokens": (
+                sum(s["cached_tokens"] for s in self.request_stats if s.get("cached_tokens") is not None)
+                if any(s.get("cached_tokens") is not None for s in self.request_stats) else None
+            ),
+        }
+
     def _create_prompt(self, problem: Problem) -> str:
+        if self.prompt_layout == "prefix":
+            return self._create_prefix_prompt(problem)
         return f"""Here we assume the SystemVerilog is not supported, so don't use the SystemVerilog syntax, such as break statement.
 Please write a Verilog module that solves the following problem efficiently, using the exact module header below:
 
@@ -51,13 +420,118 @@ code_here
 ```
         """
 
-    async def _call_llm(self, prompt: str, k: int) -> str:
+    def _create_prefix_prompt(self, problem: Problem) -> str:
+        return f"""Here we assume the SystemVerilog is not supported, so don't use the SystemVerilog syntax, such as break statement.
+Please write a Verilog module that solves the problem below efficiently, using the exact module header given after it.
+Return only the verilog code, no any explanation.
+
+such as:
+```verilog
+code_here
+```
+
+Problem:
+{problem.prompt}
+
+Module header (must not be changed):
+{problem.module_header}
+"""
+
+    async def _call_llm(self, prompt: str, k: int, sample_idx: int = 0) -> str:
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(
+                self.model_name, self.base_url, prompt, self._sampling_params(k), sample_idx
+            )
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if self.metrics is not None:
+                self.metrics.cache.inc(model=self.model_name, result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+            if self.cache.cache_only:
+                raise RuntimeError(f"缓存未命中（cache_only模式）: model={self.model_name}, sample={sample_idx}")
+
         messages = [{"role": "user", "content": prompt}]
-        output_content = await asyncio.to_thread(
-            self._agent_call, messages, k
-        )
+        output_content = await self._hedged_call(messages, k)
+        if key is not None and output_content is not None:
+            await asyncio.to_thread(self.cache.put, key, output_content)
         return output_content
 
+    async def _hedged_call(self, messages, k: int) -> str:
+        """请求超过延迟分位数阈值仍未返回时补发一份，取先完成的结果"""
+        if self.hedge_percentile is None:
+            return await self._limited_call(messages, k)
+
+        self.hedge_stats["requests"] += 1
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._limited_call(messages, k, started))
+        # 从真正发出请求开始计时，排队等待并发名额的时间不算
+        waiter = asyncio.ensure_future(started.wait())
+        await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if primary.done() or len(self._latencies) < self.hedge_min_samples:
+            return await primary
+
+        delay = _percentile(list(self._latencies), self.hedge_percentile)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        over_budget = self.hedge_stats["hedged"] >= self.hedge_budget * self.hedge_stats["requests"]
+        if done or over_budget:
+            return await primary
+
+        self.hedge_stats["hedged"] += 1
+        if self.metrics is not None:
+            self.metrics.hedges.inc(model=self.model_name)
+        hedge = asyncio.ensure_future(self._limited_call(messages, k))
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        self.hedge_stats["won"] += 1
+                    # 落后的请求在后台跑完并继续占用并发名额，结果丢弃
+                    for other in pending:
+                        other.add_done_callback(_discard_result)
+                    return task.result()
+                first_error = first_error or task.exception()
+        raise first_error
+
+    async def _limited_call(self, messages, k: int, started: Optional[asyncio.Event] = None) -> str:
+        """在并发控制下发起请求，过载类错误按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            if started is not None:
+                started.set()
+            start = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.in_flight.inc(model=self.model_name)
+            error: Optional[BaseException] = None
+            try:
+                output_content = await asyncio.to_thread(self._agent_call, messages, k)
+            except BaseException as e:
+                # 包括对冲/流式请求被取消时的 CancelledError，槽位统一在 finally 中归还
+                error = e
+            finally:
+                latency = time.perf_counter() - start
+                if self.metrics is not None:
+                    self.metrics.in_flight.dec(model=self.model_name)
+                if self.limiter is not None:
+                    # shield：释放过程中再次被取消也不会丢失槽位
+                    await asyncio.shield(self.limiter.release(latency, error))
+            if error is None:
+                self._latencies.append(latency)
+                return output_content
+            if not isinstance(error, Exception):
+                raise error
+            if self.metrics is not None:
+                outcome = "overload" if _is_overload_error(error) else "error"
+                self.metrics.requests.inc(model=self.model_name, outcome=outcome)
+            if attempt == self.max_retries or not _is_overload_error(error):
+                raise error
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
     def _extract_verilog_code(self, content: str) -> str:
         code_block_pattern = r"```verilog\n([\s\S]*?)\n```"
         match = re.search(code_block_pattern, content, re.IGNORECASE)
@@ -69,9 +543,12 @@ code_here
         # verilog_code = self._extract_verilog_code(output_content)
 
         # return {"solution": verilog_code, "pass": "", "resource_usage": ""}
+        # 并发上限由limiter按请求控制，同一问题的k个样本可以同时发出
+        outputs = await asyncio.gather(
+            *[self._call_llm(prompt, k, sample_idx) for sample_idx in range(k)]
+        )
         solutions = []
-        for _ in range(k):
-            output_content = await self._call_llm(prompt, k)
+        for output_content in outputs:
             verilog_code = self._extract_verilog_code(output_content)
             solutions.append({"solution": verilog_code, "pass": ""})
 
@@ -79,56 +556,349 @@ code_here
             "module_name": problem.module_name,
             "solutions": solutions
         }
+        if self.metrics is not None:
+            self.metrics.remaining.dec(model=self.model_name)
 
         return result
 
-async def main(config):
-    # 初始化组件
-    generator = VerilogGenerator(
-        config["api_key"], config["base_url"], config["model_name"]
-    )
+def load_problems(prompt_file: str, names=None) -> List[Problem]:
+    """
+    通过字节偏移索引加载问题，只读取prompt和module_header，不解码testbench
 
-    all_problems = []
-    # 加载问题数据
-    with open(config["prompt_file"], "r", encoding="utf-8") as f:
-        for line in f:
-            item = json.loads(line)
-            problem = Problem(
-                prompt=item.get("prompt", ""),
-                module_header=item.get("module_header", ""),
-                module_name=item.get("module_name", ""),
-            )
-            all_problems.append(problem)
+    names 为模块名或通配符列表（如 ["mux*", "accu"]），None表示全部问题
+    """
+    from tools.problem_index import ProblemIndex
+
+    with ProblemIndex(prompt_file) as index:
+        return [Problem(**index.light(name)) for name in index.select(names)]
+
+
+def load_testbenches(prompt_file: str, names=None) -> Dict[str, str]:
+    from tools.problem_index import ProblemIndex
+
+    with ProblemIndex(prompt_file) as index:
+        return {name: index.testbench(name) for name in index.select(names)}
+
+
+# 决定问题集的参数，所有目标共用
+SHARED_KEYS = ("prompt_file", "problems", "shard", "shard_weights")
+
+
+def resolve_targets(config) -> List[Dict[str, Any]]:
+    """
+    展开生成目标列表
+
+    config["targets"] 中每一项至少包含 model_name，其余参数（base_url、api_key、k、
+    max_concurrent、adaptive_concurrency 等）缺省时沿用顶层配置；没有 targets 时
+    顶层配置本身就是唯一的目标。问题集相关的 SHARED_KEYS 只能在顶层设置。
+    """
+    targets = config.get("targets") or [{}]
+    resolved = []
+    for target in targets:
+        shared = [key for key in SHARED_KEYS if key in target]
+        if shared:
+            # 问题集（含分片）在所有目标之间共享，目标单独设置会与输出文件名不一致
+            raise ValueError(f"{', '.join(shared)} 只能在顶层配置中设置，不能用于单个目标: {target.get('model_name')}")
+        merged = {key: value for key, value in config.items() if key != "targets"}
+        merged.update(target)
+        resolved.append(merged)
+    return resolved
+
+
+def build_limiter(target) -> ConcurrencyLimiter:
+    if target.get("adaptive_concurrency", False):
+        return AIMDConcurrencyLimiter(
+            target["max_concurrent"],
+            min_limit=target.get("min_concurrent", 1),
+            max_limit=target.get("max_concurrent_limit", 256),
+        )
+    return ConcurrencyLimiter(target["max_concurrent"])
+
+
+def output_stem(target) -> str:
+    """结果文件名中的模型标识：model_name，设置了 endpoint_tag 时为 {model_name}@{endpoint_tag}"""
+    tag = re.sub(r"[^\w.-]", "_", target.get("endpoint_tag") or "")
+    return f"{target['model_name']}@{tag}" if tag else target["model_name"]
+
+
+def tag_colliding_targets(targets: List[Dict[str, Any]]):
+    """
+    同一次运行中会写出同名结果文件的目标（同名模型部署在不同端点）自动加上端点标识
+
+    未设置 endpoint_tag 的冲突目标取 base_url 的主机名（含端口），其余目标保持
+    pass{k}_{model_name}.json；加上标识后仍然重名时报错，不覆盖结果。
+    """
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for target in targets:
+        groups.setdefault((target["k"], output_stem(target)), []).append(target)
+    for group in groups.values():
+        if len(group) > 1:
+            for target in group:
+                if not target.get("endpoint_tag"):
+                    target["endpoint_tag"] = urlparse(target.get("base_url") or "").netloc
+    outputs = [(target["k"], output_stem(target)) for target in targets]
+    if len(set(outputs)) < len(outputs):
+        raise RuntimeError("多个目标的结果文件名相同，会互相覆盖，请为它们设置不同的 endpoint_tag")
+
+
+def _per_model_path(path: str, target, multi: bool) -> str:
+    if not multi:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{output_stem(target)}{ext}"
 
-    # 创建信号量限制并发
-    semaphore = asyncio.Semaphore(config["max_concurrent"])
 
-    # 处理问题
-    async def process_with_semaphore(problem: Problem):
-        async with semaphore:
-            return await generator.process_problem(problem, config["k"])
+async def run_target(generator: VerilogGenerator, target, problems: List[Problem],
+                     multi: bool = False, position: int = 0, shard: Optional[Tuple[int, int]] = None):
+    from tqdm.asyncio import tqdm as async_tqdm
+    from tools.sharding import shard_path
 
-    # 并发处理所有问题
-    all_results = await async_tqdm.gather(
-        *[process_with_semaphore(problem) for problem in all_problems],
-        desc="Processing all problems",
+    # 按prompt排序发出请求，共享前缀的请求相邻，提高服务端prompt缓存命中率；结果仍按原顺序保存
+    order = list(range(len(problems)))
+    if target.get("prefix_ordering", False):
+        order.sort(key=lambda i: generator._create_prompt(problems[i]))
+
+    if generator.metrics is not None:
+        generator.metrics.remaining.set(len(problems), model=target["model_name"])
+
+    # 并发处理所有问题（并发数由limiter控制）
+    ordered_results = await async_tqdm.gather(
+        *[generator.process_problem(problems[i], target["k"]) for i in order],
+        desc=target["model_name"] if multi else "Processing all problems",
+        position=position,
     )
+    all_results = [None] * len(problems)
+    for i, result in zip(order, ordered_results):
+        all_results[i] = result
 
     # 保存结果
-    output_file_name = f"pass{config['k']}_{config['model_name']}.json"
+    output_file_name = shard_path(f"pass{target['k']}_{output_stem(target)}.json", shard)
     with open(output_file_name, "w", encoding="utf-8") as f:
         json.dump(all_results, f, ensure_ascii=False, indent=4)
 
-if __name__ == "__main__":
+    prefix = f"[{target['model_name']}] " if multi else ""
+    summary = generator.latency_summary()
+    if summary["requests"]:
+        print(
+            f"{prefix}API请求 {summary['requests']} 次 (提前终止 {summary['early_stops']} 次): "
+            f"TTFT p50={summary['ttft_p50']:.2f}s p95={summary['ttft_p95']:.2f}s, "
+            f"总耗时 p50={summary['latency_p50']:.2f}s p95={summary['latency_p95']:.2f}s"
+        )
+    if summary.get("cached_tokens") is not None and summary["prompt_tokens"]:
+        print(
+            f"{prefix}prompt缓存命中: {summary['cached_tokens']}/{summary['prompt_tokens']} tokens "
+            f"({summary['cached_tokens'] / summary['prompt_tokens']:.2%})"
+        )
+    if generator.hedge_percentile is not None:
+        stats = generator.hedge_stats
+        print(f"{prefix}对冲请求: 原始请求 {stats['requests']} 次, 补发 {stats['hedged']} 次, 补发先完成 {stats['won']} 次")
+    if isinstance(generator.limiter, AIMDConcurrencyLimiter):
+        print(f"{prefix}自适应并发: 最终上限 {int(generator.limiter.limit)}, 共调整 {len(generator.limiter.decisions)} 次")
+    if target.get("timing_file"):
+        with open(_per_model_path(target["timing_file"], target, multi), "w", encoding="utf-8") as f:
+            json.dump(generator.request_stats, f, indent=4)
+
+
+async def run_target_budgeted(generator: VerilogGenerator, target, problems: List[Problem],
+                              testbenches: Dict[str, str], eval_semaphore: asyncio.Semaphore,
+                              multi: bool = False, shard: Optional[Tuple[int, int]] = None):
+    """
+    按预算自适应分配样本：边生成边测试，只继续为尚未通过的问题采样
+
+    每一轮为所有未解决且样本数未达 max_samples 的问题各生成一个样本并立即测试，
+    直到全部解决、达到单题上限或用完 total_budget 个样本。每个问题实际抽取的样本数
+    记录在 n_samples 中。n 是停止时刻而不是固定的样本数，标准的pass@k估计不适用，
+    结果标记为 "sampling": "sequential"，由 tools.passk.summarize_sequential 计算。
+    """
+    # 延迟导入，普通生成不依赖测试脚本
+    from functional_correctness import check_solution_isolated
+    from tqdm.asyncio import tqdm as async_tqdm
+    from tools.sharding import shard_path
 
-    config = {
-        "api_key": "sk-",
-        "base_url": "https://api.openai-proxy.org/v1",
-        "model_name": "gpt-3.5-turbo",
-        "prompt_file": "problems_verilogeval_v2.jsonl",
-        "max_concurrent": 20,
-        "k": 1,
+    settings = target["adaptive_sampling"]
+    max_samples = settings.get("max_samples", 10)
+    budget = settings.get("total_budget", max_samples * len(problems))
+    # 按max_samples设置采样温度，否则单样本时温度为0，重复采样只会得到相同结果
+    sampling_k = max(2, max_samples)
+
+    states = {
+        problem.module_name: {"module_name": problem.module_name, "sampling": "sequential", "solutions": [],
+                              "n_samples": 0, "solved_at": None}
+        for problem in problems
     }
 
-    asyncio.run(main(config))
+    async def sample_once(problem: Problem):
+        state = states[problem.module_name]
+        sample_idx = state["n_samples"]
+        state["n_samples"] += 1
+        output_content = await generator._call_llm(generator._create_prompt(problem), sampling_k, sample_idx)
+        verilog_code = generator._extract_verilog_code(output_content)
+        async with eval_semaphore:
+            status, _ = await asyncio.to_thread(
+                check_solution_isolated, verilog_code, testbenches.get(problem.module_name, ""),
+                module_header=problem.module_header,
+            )
+        state["solutions"].append({"solution": verilog_code, "pass": status})
+        if generator.metrics is not None:
+            generator.metrics.remaining.dec(model=target["model_name"])
+        if status == "true" and state["solved_at"] is None:
+            state["solved_at"] = sample_idx
+
+    prefix = f"[{target['model_name']}] " if multi else ""
+    round_idx = 0
+    while budget > 0:
+        active = [
+            problem for problem in problems
+            if states[problem.module_name]["solved_at"] is None
+            and states[problem.module_name]["n_samples"] < max_samples
+        ]
+        if not active:
+            break
+        if len(active) > budget:
+            # 剩余预算不够一整轮时随机选取，避免每次都是文件靠后的问题抽不到样本
+            picked = {p.module_name for p in random.Random(round_idx).sample(active, budget)}
+            active = [problem for problem in active if problem.module_name in picked]
+        budget -= len(active)
+        round_idx += 1
+        if generator.metrics is not None:
+            generator.metrics.remaining.set(len(active), model=target["model_name"])
+        await async_tqdm.gather(*[sample_once(problem) for problem in active],
+                                desc=f"{prefix}Round {round_idx}")
+
+    all_results = [states[problem.module_name] for problem in problems]
+    output_file_name = shard_path(f"pass{max_samples}_{output_stem(target)}_adaptive.json", shard)
+    with open(output_file_name, "w", encoding="utf-8") as f:
+        json.dump(all_results, f, ensure_ascii=False, indent=4)
+
+    solved = sum(1 for state in all_results if state["solved_at"] is not None)
+    drawn = sum(state["n_samples"] for state in all_results)
+    print(f"{prefix}自适应采样: 共抽取 {drawn} 个样本, 解决 {solved}/{len(all_results)} 个问题, 结果保存到 {output_file_name}")
+
+
+async def main(config):
+    from openai import OpenAI
+    from tools.sharding import load_weights, parse_shard, select_shard
+
+    targets = resolve_targets(config)
+    multi = len(targets) > 1
+    tag_colliding_targets(targets)
+
+    # 可选的运行指标导出（Prometheus文本文件或HTTP端点）
+    metrics = exporter = None
+    if config.get("metrics"):
+        from tools.metrics import GenerationMetrics, Registry, start_exporter
+
+        registry = Registry()
+        metrics = GenerationMetrics(registry)
+        exporter = start_exporter(registry, config["metrics"])
+
+    # 问题集、响应缓存和同一端点的HTTP连接池在所有目标之间共享
+    all_problems = load_problems(config["prompt_file"], config.get("problems"))
+    shard = parse_shard(config.get("shard"))
+    if shard is not None:
+        weights = load_weights(config.get("shard_weights"), config["prompt_file"])
+        selected = set(select_shard([p.module_name for p in all_problems], shard, weights))
+        all_problems = [p for p in all_problems if p.module_name in selected]
+        print(f"分片 {shard[0]}/{shard[1]}: {len(all_problems)} 个问题")
+    cache = None
+    if config.get("cache_only") and not config.get("cache_file"):
+        raise RuntimeError("cache_only 需要同时设置 cache_file")
+    if config.get("cache_file"):
+        cache = ResponseCache(
+            config["cache_file"],
+            max_bytes=config.get("cache_max_bytes", 512 * 1024 * 1024),
+            cache_only=config.get("cache_only", False),
+        )
+
+    clients = {}
+    generators = []
+    for target in targets:
+        client_key = (target["api_key"], target["base_url"], target.get("request_timeout"))
+        if client_key not in clients:
+            client_kwargs = {"api_key": target["api_key"], "base_url": target["base_url"], "max_retries": 0}
+            if target.get("request_timeout") is not None:
+                client_kwargs["timeout"] = target["request_timeout"]
+            clients[client_key] = OpenAI(**client_kwargs)
+        # 每个目标有独立的并发预算
+        generators.append(VerilogGenerator(
+            target["api_key"], target["base_url"], target["model_name"],
+            cache=cache, stream=target.get("stream", False), limiter=build_limiter(target),
+            max_retries=target.get("max_retries", 3),
+            hedge_percentile=target.get("hedge_percentile"),
+            hedge_budget=target.get("hedge_budget", 0.05),
+            client=clients[client_key],
+            prompt_layout=target.get("prompt_layout", "default"),
+            metrics=metrics,
+        ))
+
+    # 请求在线程中执行，默认线程池只有min(32, CPU数+4)个线程，会暗中限制并发
+    max_workers = sum(
+        int(max(generator.limiter.limit, target.get("max_concurrent_limit", 0)))
+        if isinstance(generator.limiter, AIMDConcurrencyLimiter) else int(generator.limiter.limit)
+        for generator, target in zip(generators, targets)
+    )
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers + 4))
+
+    testbenches = None
+    if any(target.get("adaptive_sampling") for target in targets):
+        testbenches = load_testbenches(config["prompt_file"], [p.module_name for p in all_problems])
+    eval_semaphore = asyncio.Semaphore(config.get("eval_workers") or os.cpu_count() or 1)
+
+    await asyncio.gather(*[
+        run_target_budgeted(generator, target, all_problems, testbenches, eval_semaphore, multi=multi, shard=shard)
+        if target.get("adaptive_sampling") else
+        run_target(generator, target, all_problems, multi=multi, position=position, shard=shard)
+        for position, (generator, target) in enumerate(zip(generators, targets))
+    ])
+
+    if cache is not None:
+        print(f"响应缓存: 命中 {cache.hits} 次, 未命中 {cache.misses} 次")
+        cache.close()
+    if exporter is not None:
+        exporter.stop()
+
+# 配置参数（可直接修改，也可以通过仓库根目录的 verilog_bench.py generate-api 覆盖）
+DEFAULT_CONFIG = {
+    "api_key": "sk-",
+    "base_url": "https://api.openai-proxy.org/v1",
+    "model_name": "gpt-3.5-turbo",
+    "endpoint_tag": None,                   # 结果文件名中的端点标识 pass{k}_{model}@{tag}.json，None不加
+    "prompt_file": "problems_verilogeval_v2.jsonl",
+    "problems": None,                       # 只生成部分问题：模块名或通配符列表，如 ["mux*"]
+    "shard": None,                          # 多机分片 "i/N"（i从0开始），输出文件名带 .shard{i}of{N}
+    "shard_weights": None,                  # 分片代价：None按哈希，"size"按记录大小，或JSON文件 {模块名: 代价}
+    "max_concurrent": 20,                   # 并发请求数（自适应模式下为初始值）
+    "adaptive_concurrency": False,          # AIMD自适应并发控制
+    "max_concurrent_limit": 256,            # 自适应模式下的并发上限
+    "max_retries": 3,                       # 429/超时等过载错误的重试次数
+    "request_timeout": None,                # 单次请求超时（秒），None使用客户端默认值
+    "hedge_percentile": None,               # 对冲阈值分位数（如0.95），None关闭对冲
+    "hedge_budget": 0.05,                   # 对冲补发请求数占原始请求数的上限
+    "k": 1,
+    # 响应缓存文件（如 "llm_cache.sqlite"），None表示不缓存。缓存按样本序号命中，
+    # 开启后 temperature>0 的重复运行会回放同样的回复，只在重跑测试或离线回放时开启
+    "cache_file": None,
+    "cache_max_bytes": 512 * 1024 * 1024,   # 缓存容量上限（字节）
+    "cache_only": False,                    # 仅使用缓存回放，不调用API
+    "stream": False,                        # 流式请求，代码块结束后提前断开
+    "timing_file": None,                    # 保存每次请求的TTFT/总耗时（JSON）
+    "prompt_layout": "default",             # "prefix": 固定说明放在最前，最大化共享前缀
+    "prefix_ordering": False,               # 按prompt排序发送请求，提高prompt缓存命中率
+    # 运行指标导出（Prometheus文本格式），例如 {"textfile": "gen.prom", "interval": 5}
+    # 或 {"http_port": 9108}；None表示不导出
+    "metrics": None,
+    # 自适应采样：边生成边测试，只为未通过的问题继续采样，例如
+    # {"max_samples": 10, "total_budget": 500}；None表示每题固定生成k个样本
+    "adaptive_sampling": None,
+    "eval_workers": None,                   # 自适应采样时并发测试数，None为CPU核数
+    # 多模型同时生成：每项覆盖上面的同名参数，每个模型输出一个结果文件，例如
+    # [{"model_name": "gpt-4o-mini", "k": 5},
+    #  {"model_name": "deepseek-chat", "base_url": "https://api.deepseek.com/v1", "api_key": "sk-", "max_concurrent": 50}]
+    "targets": None,
+}
+
+if __name__ == "__main__":
+    # 设置工作目录为当前文件所在目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(main(DEFAULT_CONFIG))
 